@@ -0,0 +1,11 @@
+"""Circuit breakers built on pybreaker, with a shared registry, decorators and a stats recorder."""
+
+from .custom_circuit_break_wrapper import CircuitBreakerConfig, CircuitBreakerState, CustomCircuitBreakerWrapper
+from .circuit_breaker_manager import CircuitBreakerManager
+
+__all__ = [
+    "CircuitBreakerConfig",
+    "CircuitBreakerState",
+    "CircuitBreakerManager",
+    "CustomCircuitBreakerWrapper",
+]
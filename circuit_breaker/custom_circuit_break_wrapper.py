@@ -1,10 +1,12 @@
-# custom_circuit_breaker.py
+# custom_circuit_break_wrapper.py
 import pybreaker
 import logging
 import threading
-from typing import Dict, Any, Optional, Callable, Union
+from typing import Dict, Any, Iterator, Optional, Callable, Union
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
+from collections import deque
 import time
 import json
 
@@ -25,6 +27,7 @@ class CircuitBreakerConfig:
     listeners: list = field(default_factory=list)
     state_storage: Optional[Any] = None
     reset_timeout: int = 60
+    latency_window: int = 1024
 
 
 class CustomCircuitBreakerWrapper:
@@ -54,92 +57,90 @@ class CustomCircuitBreakerWrapper:
             'last_success_time': None,
             'state_changes': []
         }
+        # Durations (seconds) of the most recent completed calls
+        self._latencies = deque(maxlen=config.latency_window)
         self._lock = threading.RLock()
 
     def _get_excluded_exceptions(self) -> tuple:
         """Get exceptions that should not trigger circuit breaker"""
-        all_exceptions = (Exception,)
-        return tuple(exc for exc in all_exceptions if exc not in self.config.expected_exception)
+        # Anything that is not an expected exception, including cancellation
+        return (lambda exc: not isinstance(exc, self.config.expected_exception),)
 
     def _setup_listeners(self) -> list:
         """Setup listeners for circuit breaker events"""
         listeners = []
+        wrapper = self
 
         # Add state change listener
-        def state_change_listener(cb, old_state, new_state):
-            with self._lock:
-                self._stats['state_changes'].append({
-                    'from': old_state.name.lower() if hasattr(old_state, 'name') else str(old_state),
-                    'to': new_state.name.lower() if hasattr(new_state, 'name') else str(new_state),
-                    'timestamp': time.time()
-                })
-                self.logger.info(f"Circuit breaker {self.config.name} changed from {old_state} to {new_state}")
-
-        listeners.append(state_change_listener)
+        class StateChangeListener(pybreaker.CircuitBreakerListener):
+            def state_change(self, cb, old_state, new_state):
+                with wrapper._lock:
+                    wrapper._stats['state_changes'].append({
+                        'from': old_state.name.lower() if hasattr(old_state, 'name') else str(old_state),
+                        'to': new_state.name.lower() if hasattr(new_state, 'name') else str(new_state),
+                        'timestamp': time.time()
+                    })
+                    wrapper.logger.info(f"Circuit breaker {wrapper.config.name} changed from {old_state} to {new_state}")
+
+        listeners.append(StateChangeListener())
 
         # Add custom listeners from config
         listeners.extend(self.config.listeners)
 
         return listeners
 
-    def call(self, func: Callable, *args, **kwargs) -> Any:
-        """Execute function with circuit breaker protection"""
+    @contextmanager
+    def calling(self) -> Iterator[None]:
+        """Execute the enclosed block with circuit breaker protection"""
         with self._lock:
             self._stats['total_calls'] += 1
 
+        started = time.perf_counter()
+        entered = False
         try:
-            result = self._breaker(func)(*args, **kwargs)
-
-            with self._lock:
-                self._stats['successful_calls'] += 1
-                self._stats['last_success_time'] = time.time()
-
-            return result
+            # Unlike pybreaker's call(), this does not hold the breaker's lock while the block runs
+            with self._breaker.calling():
+                entered = True
+                yield
 
         except pybreaker.CircuitBreakerError as e:
-            with self._lock:
-                self._stats['blocked_calls'] += 1
-            self.logger.warning(f"Circuit breaker {self.config.name} blocked call: {e}")
+            if not entered:
+                with self._lock:
+                    self._stats['blocked_calls'] += 1
+                self.logger.warning(f"Circuit breaker {self.config.name} blocked call: {e}")
+                raise
+            # The failure that opened the circuit
+            self._record_failure(started)
+            self.logger.error(f"Circuit breaker {self.config.name} recorded failure: {e}")
             raise
 
         except Exception as e:
-            with self._lock:
-                self._stats['failed_calls'] += 1
-                self._stats['last_failure_time'] = time.time()
-
+            self._record_failure(started)
             if isinstance(e, self.config.expected_exception):
                 self.logger.error(f"Circuit breaker {self.config.name} recorded failure: {e}")
             raise
 
-    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
-        """Execute async function with circuit breaker protection"""
-        with self._lock:
-            self._stats['total_calls'] += 1
-
-        try:
-            async_func = self._breaker(func)
-            result = await async_func(*args, **kwargs)
-
+        else:
             with self._lock:
                 self._stats['successful_calls'] += 1
                 self._stats['last_success_time'] = time.time()
+                self._latencies.append(time.perf_counter() - started)
 
-            return result
-
-        except pybreaker.CircuitBreakerError as e:
-            with self._lock:
-                self._stats['blocked_calls'] += 1
-            self.logger.warning(f"Circuit breaker {self.config.name} blocked async call: {e}")
-            raise
+    def _record_failure(self, started: float) -> None:
+        with self._lock:
+            self._stats['failed_calls'] += 1
+            self._stats['last_failure_time'] = time.time()
+            self._latencies.append(time.perf_counter() - started)
 
-        except Exception as e:
-            with self._lock:
-                self._stats['failed_calls'] += 1
-                self._stats['last_failure_time'] = time.time()
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute function with circuit breaker protection"""
+        with self.calling():
+            return func(*args, **kwargs)
 
-            if isinstance(e, self.config.expected_exception):
-                self.logger.error(f"Circuit breaker {self.config.name} recorded async failure: {e}")
-            raise
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute async function with circuit breaker protection"""
+        with self.calling():
+            return await func(*args, **kwargs)
 
     @property
     def current_state(self) -> str:
@@ -152,12 +153,24 @@ class CustomCircuitBreakerWrapper:
     @property
     def failure_count(self) -> int:
         """Get current failure count"""
-        return self._breaker._failure_count
+        return self._breaker.fail_counter
 
     @property
     def last_failure_time(self) -> Optional[float]:
         """Get last failure time"""
-        return self._breaker._last_failure
+        with self._lock:
+            return self._stats['last_failure_time']
+
+    def get_latency_percentiles(self, percentiles=(50, 95, 99)) -> Dict[int, Optional[float]]:
+        """Get latency percentiles (seconds) over the recent call window"""
+        with self._lock:
+            samples = sorted(self._latencies)
+
+        if not samples:
+            return {p: None for p in percentiles}
+
+        last = len(samples) - 1
+        return {p: samples[min(last, int(round(p / 100 * last)))] for p in percentiles}
 
     def get_stats(self) -> Dict[str, Any]:
         """Get detailed statistics"""
@@ -177,11 +190,10 @@ class CustomCircuitBreakerWrapper:
 
     def reset(self):
         """Manually reset the circuit breaker"""
-        self._breaker._reset()
+        self._breaker.close()
         self.logger.info(f"Circuit breaker {self.config.name} manually reset")
 
     def force_open(self):
         """Manually force circuit breaker to open state"""
-        self._breaker._state = pybreaker.STATE_OPEN
-        self._breaker._last_failure = time.time()
+        self._breaker.open()
         self.logger.warning(f"Circuit breaker {self.config.name} manually forced to OPEN state")
\ No newline at end of file
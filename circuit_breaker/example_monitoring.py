@@ -93,14 +93,47 @@ def print_comprehensive_stats(manager: CircuitBreakerManager):
                 print(f"  {change['from']} → {change['to']} at {timestamp.strftime('%H:%M:%S')}")
 
 
-def main():
+def print_recorded_history(recorder):
+    """Print a short summary of the recorded time series"""
+    import numpy as np
+    from .stats_recorder import STATE_NAMES
+
+    print("\n" + "=" * 60)
+    print("RECORDED HISTORY")
+    print("=" * 60)
+
+    for service_name in recorder.manager.get_all_circuit_breakers():
+        history = recorder.query(service_name)
+        if len(history['timestamp']) == 0:
+            continue
+
+        states = [STATE_NAMES[int(code)] for code in np.unique(history['state'])]
+        print(f"\n📈 {service_name.upper()}")
+        print(f"Samples: {len(history['timestamp'])}")
+        print(f"States Seen: {', '.join(states)}")
+        print(f"Peak Call Rate: {np.nanmax(history['call_rate'], initial=0):.2f}/s")
+        print(f"Max p99 Latency: {np.nanmax(history['latency_p99'], initial=0) * 1000:.2f}ms")
+
+
+def main(record_dir: str = None):
     """Main function to demonstrate circuit breaker functionality"""
     manager = setup_circuit_breakers()
 
+    recorder = None
+    if record_dir:
+        from .stats_recorder import CircuitBreakerStatsRecorder
+
+        recorder = CircuitBreakerStatsRecorder(record_dir, manager=manager, interval=0.5)
+        recorder.start()
+
     print("🚀 Starting Circuit Breaker Demo")
     simulate_service_calls(manager)
     print_comprehensive_stats(manager)
 
+    if recorder is not None:
+        recorder.stop()
+        print_recorded_history(recorder)
+
     # Save stats to file
     with open('circuit_breaker_stats.json', 'w') as f:
         json.dump(manager.get_all_stats(), f, indent=2, default=str)
@@ -108,4 +141,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import os
+    main(record_dir=os.getenv("CIRCUIT_BREAKER_STATS_DIR"))
\ No newline at end of file
@@ -0,0 +1,270 @@
+# stats_recorder.py
+import glob
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from .circuit_breaker_manager import CircuitBreakerManager
+
+
+# Numeric codes stored in the 'state' column of a record
+STATE_CODES = {'closed': 0, 'open': 1, 'half-open': 2, 'half_open': 2}
+STATE_NAMES = {0: 'closed', 1: 'open', 2: 'half-open', 255: 'unknown'}
+
+NAME_WIDTH = 48
+
+# One fixed-width (~120 byte) record per breaker per sample. 'name' holds the
+# first NAME_WIDTH bytes for display; records are matched on 'name_hash', a
+# hash of the full name, so long names sharing a prefix stay apart
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('name_hash', '<u8'),
+    ('name', f'S{NAME_WIDTH}'),
+    ('state', 'u1'),
+    ('failure_count', '<u4'),
+    ('total_calls', '<u8'),
+    ('successful_calls', '<u8'),
+    ('failed_calls', '<u8'),
+    ('blocked_calls', '<u8'),
+    ('latency_p50', '<f4'),
+    ('latency_p95', '<f4'),
+    ('latency_p99', '<f4'),
+])
+
+
+def name_hash(name: str) -> int:
+    """64-bit hash of a breaker name, stable across processes"""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class CircuitBreakerStatsRecorder:
+    """Background sampler writing breaker stats into rotating memory-mapped files"""
+
+    FILE_PREFIX = 'breaker_stats_'
+
+    def __init__(
+            self,
+            directory: str,
+            manager: Optional[CircuitBreakerManager] = None,
+            interval: float = 1.0,
+            records_per_file: int = 65536,
+            max_files: int = 8
+    ):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if records_per_file <= 0 or max_files <= 0:
+            raise ValueError("records_per_file and max_files must be positive")
+
+        self.directory = directory
+        self.manager = manager or CircuitBreakerManager()
+        self.interval = interval
+        self.records_per_file = records_per_file
+        self.max_files = max_files
+        self.logger = logging.getLogger("CircuitBreakerStatsRecorder")
+
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._segment: Optional[np.memmap] = None
+        self._segment_seq = -1
+        self._position = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{self.FILE_PREFIX}{seq:08d}.npy")
+
+    def _existing_segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.FILE_PREFIX}*.npy")))
+
+    def _open_next_segment(self):
+        """Rotate to a fresh pre-allocated segment and drop the oldest ones"""
+        if self._segment is not None:
+            self._segment.flush()
+
+        existing = self._existing_segments()
+        if self._segment_seq < 0 and existing:
+            self._segment_seq = int(os.path.basename(existing[-1])[len(self.FILE_PREFIX):-4])
+        self._segment_seq += 1
+
+        # Zero-filled file; unused slots keep timestamp == 0 and are skipped by readers
+        self._segment = np.lib.format.open_memmap(
+            self._segment_path(self._segment_seq),
+            mode='w+',
+            dtype=RECORD_DTYPE,
+            shape=(self.records_per_file,)
+        )
+        self._position = 0
+
+        for path in self._existing_segments()[:-self.max_files]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.logger.warning(f"Could not remove old stats segment {path}: {e}")
+
+    def sample(self, timestamp: Optional[float] = None) -> int:
+        """Write one record for every registered breaker, returns number of records written"""
+        timestamp = time.time() if timestamp is None else timestamp
+        breakers = self.manager.get_all_circuit_breakers()
+
+        with self._lock:
+            for name, cb in breakers.items():
+                if self._segment is None or self._position >= self.records_per_file:
+                    self._open_next_segment()
+
+                stats = cb.get_stats()
+                counters = stats['stats']
+                latency = cb.get_latency_percentiles((50, 95, 99))
+
+                record = self._segment[self._position]
+                record['timestamp'] = timestamp
+                record['name_hash'] = name_hash(name)
+                record['name'] = name.encode('utf-8')[:NAME_WIDTH]
+                record['state'] = STATE_CODES.get(stats['current_state'], 255)
+                record['failure_count'] = stats['failure_count'] or 0
+                record['total_calls'] = counters['total_calls']
+                record['successful_calls'] = counters['successful_calls']
+                record['failed_calls'] = counters['failed_calls']
+                record['blocked_calls'] = counters['blocked_calls']
+                record['latency_p50'] = np.nan if latency[50] is None else latency[50]
+                record['latency_p95'] = np.nan if latency[95] is None else latency[95]
+                record['latency_p99'] = np.nan if latency[99] is None else latency[99]
+                self._position += 1
+
+            return len(breakers)
+
+    def flush(self):
+        """Flush the active segment to disk"""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.error(f"Failed to sample circuit breaker stats: {e}")
+
+            next_tick += self.interval
+            self._stop_event.wait(max(0.0, next_tick - time.monotonic()))
+        self.flush()
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="CircuitBreakerStatsRecorder", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the sampling thread and flush pending records"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def query(self, name: str, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+        """Query recorded history for one breaker (see read_breaker_history)"""
+        self.flush()
+        return read_breaker_history(self.directory, name, start, end)
+
+
+def read_records(directory: str, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """Load all records in [start, end] from a recorder directory, ordered by timestamp"""
+    pattern = os.path.join(directory, f"{CircuitBreakerStatsRecorder.FILE_PREFIX}*.npy")
+    chunks = []
+
+    for path in sorted(glob.glob(pattern)):
+        try:
+            segment = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            # Segment deleted by rotation or still being created
+            continue
+        if segment.dtype != RECORD_DTYPE:
+            # Written with an older record layout
+            continue
+
+        timestamps = segment['timestamp']
+        mask = timestamps > 0
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        if mask.any():
+            chunks.append(np.array(segment[mask]))
+
+    if not chunks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+
+    records = np.concatenate(chunks)
+    return records[np.argsort(records['timestamp'], kind='stable')]
+
+
+def read_breaker_history(
+        directory: str,
+        name: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Return a breaker's history as NumPy arrays.
+
+    Rates are calls per second between consecutive samples, so the first
+    sample in the range has a rate of NaN.
+    """
+    records = read_records(directory, start, end)
+    records = records[records['name_hash'] == name_hash(name)]
+
+    timestamps = records['timestamp']
+    elapsed = np.diff(timestamps)
+
+    def rate(column):
+        counts = records[column].astype(np.float64)
+        rates = np.full(len(records), np.nan)
+        if len(records) > 1:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Counters restart from zero after a process restart
+                rates[1:] = np.where(elapsed > 0, np.maximum(np.diff(counts), 0) / elapsed, np.nan)
+        return rates
+
+    return {
+        'timestamp': timestamps,
+        'state': records['state'],
+        'failure_count': records['failure_count'],
+        'call_rate': rate('total_calls'),
+        'success_rate': rate('successful_calls'),
+        'failure_rate': rate('failed_calls'),
+        'blocked_rate': rate('blocked_calls'),
+        'latency_p50': records['latency_p50'],
+        'latency_p95': records['latency_p95'],
+        'latency_p99': records['latency_p99'],
+    }
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from circuit_breaker import CircuitBreakerConfig, CircuitBreakerManager
+from circuit_breaker.stats_recorder import NAME_WIDTH, STATE_CODES, CircuitBreakerStatsRecorder
+
+PREFIX = "x" * NAME_WIDTH
+
+
+@pytest.fixture
+def manager():
+    """The shared manager with two breakers whose names only differ after NAME_WIDTH bytes."""
+    manager = CircuitBreakerManager()
+    names = [f"{PREFIX}.first", f"{PREFIX}.second"]
+    for name in names:
+        manager.register_circuit_breaker(CircuitBreakerConfig(name=name, failure_threshold=2))
+    yield manager
+    for name in names:
+        manager.remove_circuit_breaker(name)
+
+
+def test_records_and_reads_back_samples(tmp_path, manager):
+    recorder = CircuitBreakerStatsRecorder(str(tmp_path), manager=manager, records_per_file=4)
+    first = manager.get_circuit_breaker(f"{PREFIX}.first")
+
+    # The manager is shared, so other breakers may be sampled too
+    assert recorder.sample(timestamp=100.0) >= 2
+    for _ in range(3):
+        first.call(lambda: None)
+    recorder.sample(timestamp=102.0)
+
+    history = recorder.query(f"{PREFIX}.first")
+    np.testing.assert_array_equal(history["timestamp"], [100.0, 102.0])
+    np.testing.assert_array_equal(history["state"], [STATE_CODES["closed"]] * 2)
+    np.testing.assert_allclose(history["call_rate"], [np.nan, 1.5])
+    assert np.isnan(history["latency_p99"][0]) and history["latency_p99"][1] >= 0
+    # The second sample filled the first segment, so reading spans a rotation
+    assert len(recorder.query(f"{PREFIX}.second")["timestamp"]) == 2
+
+
+def test_records_failures_and_open_state(tmp_path, manager):
+    recorder = CircuitBreakerStatsRecorder(str(tmp_path), manager=manager)
+    second = manager.get_circuit_breaker(f"{PREFIX}.second")
+
+    def fail():
+        raise RuntimeError("down")
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            second.call(fail)
+    recorder.sample(timestamp=100.0)
+
+    history = recorder.query(f"{PREFIX}.second")
+    assert history["state"][0] == STATE_CODES["open"]
+    assert recorder.query(f"{PREFIX}.first")["state"][0] == STATE_CODES["closed"]
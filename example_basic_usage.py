@@ -2,7 +2,7 @@
 import requests
 import time
 from circuit_breaker.circuit_breaker_manager import CircuitBreakerManager
-from circuit_breaker.custom_circuit_breaker import CircuitBreakerConfig
+from circuit_breaker.custom_circuit_break_wrapper import CircuitBreakerConfig
 
 # Initialize manager
 manager = CircuitBreakerManager()
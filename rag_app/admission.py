@@ -0,0 +1,232 @@
+"""Admission control, client deadlines and disconnect cancellation for classification requests."""
+
+import asyncio
+import math
+from collections import deque
+from contextlib import suppress
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+# Weight of the newest request in the running service time estimate
+_SERVICE_TIME_ALPHA = 0.2
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the classifications in flight and waiting in one worker.
+
+    Up to max_in_flight requests run at once and up to max_queue more wait
+    for a slot in arrival order. A request is rejected up front when the queue
+    is full (429), or when its estimated wait plus the recent service time
+    would outlast its deadline (503); a queued request whose deadline passes
+    leaves the queue with a 503. Both carry a Retry-After of the estimated
+    time to drain the queue. max_in_flight <= 0 admits everything.
+
+    All methods run on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.service_time = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._counts = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "expired_in_queue": 0,
+            "cancelled_disconnect": 0,
+            "cancelled_deadline": 0,
+        }
+
+    def count(self, name: str) -> None:
+        self._counts[name] += 1
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the request at a queue position gets a slot."""
+        if self.max_in_flight <= 0:
+            return 0.0
+        return self.service_time * (position + 1) / self.max_in_flight
+
+    def _rejected(self, status_code: int, detail: str, counter: str) -> AdmissionRejected:
+        self.count(counter)
+        return AdmissionRejected(status_code, detail, self.estimated_wait(len(self._waiters)))
+
+    async def acquire(self, timeout: Optional[float]) -> None:
+        """Take an in-flight slot, waiting at most timeout seconds (None: no limit)."""
+        if self.max_in_flight <= 0 or (self.in_flight < self.max_in_flight and not self._waiters):
+            self.in_flight += 1
+            self.count("admitted")
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._rejected(429, "Too many requests queued", "rejected_queue_full")
+        if timeout is not None and self.estimated_wait(len(self._waiters)) + self.service_time > timeout:
+            raise self._rejected(503, "Server overloaded: the request cannot finish before its deadline", "rejected_deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended
+                self.release()
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._rejected(503, "Server overloaded: the request deadline passed while queued", "expired_in_queue")
+            raise
+        self.count("admitted")
+
+    def release(self, elapsed: Optional[float] = None) -> None:
+        """Return a slot, handing it to the longest waiting request, and record its service time."""
+        if elapsed is not None:
+            if self.service_time == 0.0:
+                self.service_time = elapsed
+            else:
+                self.service_time += _SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 6),
+            **self._counts,
+        }
+
+
+def _request_timeout(scope, default: float) -> Optional[float]:
+    """The client's time budget in seconds from X-Request-Timeout, else default (0: none)."""
+    for name, value in scope.get("headers", []):
+        if name == DEADLINE_HEADER:
+            with suppress(ValueError):
+                return max(float(value), 0.0)
+    return default if default > 0 else None
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to requests under a path prefix.
+
+    The request handler runs as a task that is cancelled when the client
+    disconnects or its deadline passes before the response starts, so an
+    in-progress LLM call is abandoned instead of finishing for a response
+    nobody reads; a request cancelled at its deadline gets a 504. The
+    deadline covers admission and the time to the first byte only: a
+    streamed response (/classify/stream, NDJSON /classify/batch) that has
+    started runs to its end, since cutting it would leave the client a
+    truncated body with no terminal event. Handlers blocked in a worker
+    thread finish that call before the cancellation takes effect.
+    """
+
+    def __init__(self, app, controller: AdmissionController, path_prefix: str = "/", default_timeout: float = 0.0):
+        self.app = app
+        self.controller = controller
+        self.path_prefix = path_prefix
+        self.default_timeout = default_timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        timeout = _request_timeout(scope, self.default_timeout)
+        deadline = None if timeout is None else loop.time() + timeout
+        response_started = asyncio.Event()
+        response_complete = False
+
+        async def tracked_send(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.start":
+                response_started.set()
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        # One reader of receive() forwards the body to the handler and watches for a disconnect
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def guarded_receive():
+            if pump.done() and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def serve() -> None:
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                await self.controller.acquire(remaining)
+            except AdmissionRejected as e:
+                response = JSONResponse(
+                    status_code=e.status_code,
+                    content={"detail": e.detail},
+                    headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+                )
+                await response(scope, guarded_receive, tracked_send)
+                return
+            started = loop.time()
+            completed = False
+            try:
+                await self.app(scope, guarded_receive, tracked_send)
+                completed = True
+            finally:
+                # Only completed requests inform the service time estimate
+                self.controller.release(loop.time() - started if completed else None)
+
+        handler = asyncio.create_task(serve())
+
+        async def watch_receive() -> None:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    if not handler.done() and not response_complete:
+                        self.controller.count("cancelled_disconnect")
+                        handler.cancel()
+                    with suppress(asyncio.QueueFull):
+                        messages.put_nowait(message)
+                    return
+                await messages.put(message)
+
+        pump = asyncio.create_task(watch_receive())
+        first_byte = asyncio.create_task(response_started.wait())
+        try:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0.0)
+            done, _ = await asyncio.wait({handler, first_byte}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self.controller.count("cancelled_deadline")
+                handler.cancel()
+                await asyncio.wait({handler})
+                if not response_started.is_set():
+                    response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+                    await response(scope, guarded_receive, send)
+            else:
+                await asyncio.wait({handler})
+                if not handler.cancelled():
+                    handler.result()
+        finally:
+            handler.cancel()
+            first_byte.cancel()
+            pump.cancel()
@@ -1,12 +1,123 @@
 """FastAPI service for the RAG intent classifier."""
 
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import uvicorn
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from rag_app.config import (
+    DEFAULT_TOP_K,
+    MAX_TOP_K,
+    FASTAPI_HOST,
+    FASTAPI_PORT,
+    FASTAPI_RELOAD,
+    BATCH_MAX_SIZE,
+    BATCH_CHUNK_SIZE,
+    ADMIN_TOKEN,
+    CORPUS_WATCH_INTERVAL,
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    DEFAULT_REQUEST_TIMEOUT,
+)
+from rag_app.admission import AdmissionControlMiddleware, AdmissionController
+from rag_app.failover import breaker_stats
+from rag_app.metrics import UPSTREAM_STAGES, ServerTimingMiddleware, render_prometheus
+from rag_app.rag_chain import ClassifierNotReadyError, RAGIntentClassifier, get_classifier, is_classifier_ready
+from rag_app.vector_store import domains_signature
+
+logger = logging.getLogger(__name__)
+
+# Error from the startup initialization, if it failed
+_startup_error: Optional[str] = None
+
+# Seconds a client is told to wait (Retry-After) before retrying while the classifier is not ready
+NOT_READY_RETRY_AFTER = 5
+
+# PID of the rag_app.serve parent when running as one of its workers; the
+# parent then owns reloads, so all workers switch to the same corpus
+prefork_parent_pid: Optional[int] = None
+
+# Bounds the classifications this worker runs and queues
+admission = AdmissionController(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE)
+
+
+def _initialize() -> RAGIntentClassifier:
+    """Initialize the classifier, recording the error for /ready if it fails."""
+    global _startup_error
+    try:
+        classifier = get_classifier()
+    except Exception as e:
+        _startup_error = str(e)
+        raise
+    _startup_error = None
+    return classifier
+
+
+def _ready_classifier() -> RAGIntentClassifier:
+    """
+    The initialized classifier.
+
+    Raises ClassifierNotReadyError instead of initializing it, so requests
+    arriving during startup (or after it failed) get a 503 straight away
+    rather than each waiting on, or retrying, the initialization.
+    """
+    if not is_classifier_ready():
+        if _startup_error is not None:
+            raise ClassifierNotReadyError(f"Classifier failed to initialize: {_startup_error}")
+        raise ClassifierNotReadyError("Classifier is initializing")
+    return get_classifier()
+
+
+async def _warm_up() -> None:
+    """Initialize the classifier in a worker thread so the server can answer /health meanwhile."""
+    try:
+        await run_in_threadpool(_initialize)
+        logger.info("RAG intent classifier ready")
+    except Exception:
+        logger.exception("RAG intent classifier failed to initialize")
+
+
+async def _watch_corpus(interval: float) -> None:
+    """Reload a domain whenever its intent data file changes, checking every interval seconds."""
+    signatures = domains_signature()
+    while True:
+        await asyncio.sleep(interval)
+        current = domains_signature()
+        if current == signatures or None in current.values() or not is_classifier_ready():
+            continue
+        # Wait until the files stop changing, so a reload never reads a partial write
+        await asyncio.sleep(interval)
+        if domains_signature() != current:
+            continue
+        changed = [name for name, signature in current.items() if signatures.get(name) != signature]
+        signatures = current
+        for name in changed:
+            try:
+                await run_in_threadpool(get_classifier().reload, None, name)
+            except Exception:
+                logger.exception("Reloading changed %s intent data failed", name)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(_warm_up())]
+    if CORPUS_WATCH_INTERVAL > 0 and prefork_parent_pid is None:
+        tasks.append(asyncio.create_task(_watch_corpus(CORPUS_WATCH_INTERVAL)))
+    yield
+    for task in tasks:
+        task.cancel()
 
-from rag_app.config import DEFAULT_TOP_K, FASTAPI_HOST, FASTAPI_PORT
-from rag_app.rag_chain import get_classifier
 
 app = FastAPI(
     title="RAG Intent Classifier API",
@@ -15,8 +126,16 @@ app = FastAPI(
         "and BM25 with Gemini Flash / OpenAI GPT."
     ),
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Innermost, so shed requests still get CORS headers and are counted in /metrics
+app.add_middleware(
+    AdmissionControlMiddleware,
+    controller=admission,
+    path_prefix="/classify",
+    default_timeout=DEFAULT_REQUEST_TIMEOUT,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,6 +143,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ServerTimingMiddleware)
 
 
 class QueryRequest(BaseModel):
@@ -31,14 +151,19 @@ class QueryRequest(BaseModel):
     top_k: int = Field(
         default=DEFAULT_TOP_K,
         ge=1,
-        le=20,
+        le=MAX_TOP_K,
         description="Number of top documents to retrieve (default: 1)",
     )
+    domain: Optional[str] = Field(
+        default=None,
+        description="Intent domain to classify against; picked by the domain router if omitted",
+    )
 
 
 class RetrievedUtterance(BaseModel):
     utterance: str
     intent: str
+    score: Optional[float] = Field(default=None, description="Fused hybrid retrieval score")
 
 
 class QueryResponse(BaseModel):
@@ -46,16 +171,245 @@ class QueryResponse(BaseModel):
     predicted_intent: str
     top_k: int
     retrieved_utterances: list[RetrievedUtterance]
+    domain: Optional[str] = Field(default=None, description="Intent domain the query was classified against")
+    route: str = Field(
+        default="llm",
+        description='How the intent was chosen: "local" (local model), "fast_path" (retrieval vote), "llm", '
+        'or "fallback" (retrieval vote because no LLM provider was available)',
+    )
+    confidence: float = Field(
+        default=0.0,
+        description="Vote share of the majority intent among the retrieved utterances, "
+        "or the local model's calibrated probability",
+    )
+    cache: str = Field(
+        default="miss",
+        description='Response cache tier that served the result: "exact", "semantic" or "miss"',
+    )
+
+
+class RetrievalEvent(BaseModel):
+    """First /classify/stream event: a QueryResponse without the predicted intent."""
+    query: str
+    top_k: int
+    retrieved_utterances: list[RetrievedUtterance]
+    domain: Optional[str] = None
+    route: str
+    confidence: float
+    cache: str
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_MAX_SIZE,
+        description="User utterances to classify",
+    )
+    top_k: int = Field(
+        default=DEFAULT_TOP_K,
+        ge=1,
+        le=MAX_TOP_K,
+        description="Number of top documents to retrieve per query",
+    )
+    domain: Optional[str] = Field(
+        default=None,
+        description="Intent domain of all queries; each query is routed separately if omitted",
+    )
+
+
+class ReloadResponse(BaseModel):
+    status: str = Field(
+        ...,
+        description='"reloaded", "unchanged", or "accepted" when the pre-fork parent reloads and restarts workers',
+    )
+    added: int = 0
+    removed: int = 0
+    affected_intents: list[str] = []
+    documents: Optional[int] = None
+    versions: dict[str, int] = Field(default={}, description="Corpus version of each domain")
+
+
+class BatchItem(BaseModel):
+    index: int
+    result: Optional[QueryResponse] = None
+    error: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchItem]
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator reads the request body as it goes.
+
+    The default implementation may watch for client disconnects by consuming
+    receive(), which would steal request body chunks from the iterator.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _http_error(e: Exception) -> HTTPException:
+    """
+    Map a classification failure to an HTTP error.
+
+    503 (with Retry-After) while the classifier is not ready, 422 for invalid
+    arguments, 504 for timeouts, 502 when the embedding or LLM provider failed
+    and 500 otherwise. The failing stage, if known, is named in the detail
+    and X-Failed-Stage.
+    """
+    if isinstance(e, ClassifierNotReadyError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(NOT_READY_RETRY_AFTER)})
+
+    failed_stage = getattr(e, "failed_stage", None)
+    if isinstance(e, TimeoutError):
+        status_code = 504
+    elif failed_stage in UPSTREAM_STAGES:
+        status_code = 502
+    elif isinstance(e, ValueError):
+        status_code = 422
+    else:
+        status_code = 500
+
+    if failed_stage is None:
+        return HTTPException(status_code=status_code, detail=str(e))
+    return HTTPException(
+        status_code=status_code,
+        detail=f"{failed_stage} failed: {e}",
+        headers={"X-Failed-Stage": failed_stage},
+    )
+
+
+def _batch_items(results: list[dict], offset: int = 0) -> list[BatchItem]:
+    return [
+        BatchItem(index=offset + i, error=result["error"])
+        if "error" in result
+        else BatchItem(index=offset + i, result=QueryResponse(**result))
+        for i, result in enumerate(results)
+    ]
 
 
 @app.get("/health")
 def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """
+    Liveness check: the process is up and serving HTTP.
+
+    Also reports the provider circuit breakers; status is "degraded" while any
+    of them is not closed, but the response stays 200 since the service keeps
+    answering through failover and local fallbacks.
+    """
+    breakers = breaker_stats()
+    degraded = any(breaker["state"] != "closed" for breaker in breakers.values())
+    return {"status": "degraded" if degraded else "healthy", "circuit_breakers": breakers}
+
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness check: 200 once the classifier's indexes are loaded, 503 until then."""
+    if is_classifier_ready():
+        return {"status": "ready"}
+    if _startup_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": _startup_error})
+    return JSONResponse(status_code=503, content={"status": "initializing"})
+
+
+@app.get("/stats")
+def classifier_stats():
+    """Cache hit/miss, routing and admission control statistics."""
+    try:
+        classifier = _ready_classifier()
+    except ClassifierNotReadyError as e:
+        raise _http_error(e)
+    return {**classifier.stats(), "admission": admission.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage and request latency histograms, plus routing and cache counters, in Prometheus format."""
+    extra = []
+    if is_classifier_ready():
+        stats = get_classifier().stats()
+        extra.append("# HELP rag_classifications_total Classifications by route")
+        extra.append("# TYPE rag_classifications_total counter")
+        for route in ("local", "fast_path", "llm"):
+            extra.append(f'rag_classifications_total{{route="{route}"}} {stats["routing"][route]}')
+        extra.append("# HELP rag_degraded_classifications_total Classifications answered by a local fallback")
+        extra.append("# TYPE rag_degraded_classifications_total counter")
+        for kind in ("llm_fallback", "lexical_only"):
+            extra.append(f'rag_degraded_classifications_total{{kind="{kind}"}} {stats["routing"][kind]}')
+
+        responses = stats.get("responses")
+        if responses is not None:
+            extra.append("# HELP rag_response_cache_lookups_total Response cache lookups by result")
+            extra.append("# TYPE rag_response_cache_lookups_total counter")
+            for result in ("exact_hits", "semantic_hits", "misses"):
+                extra.append(f'rag_response_cache_lookups_total{{result="{result}"}} {responses[result]}')
+
+    breakers = breaker_stats()
+    if breakers:
+        extra.append("# HELP rag_circuit_breaker_open Whether a provider circuit breaker is open or half-open (1) rather than closed (0)")
+        extra.append("# TYPE rag_circuit_breaker_open gauge")
+        for name, breaker in sorted(breakers.items()):
+            extra.append(f'rag_circuit_breaker_open{{breaker="{name}"}} {int(breaker["state"] != "closed")}')
+
+    admitted = admission.stats()
+    extra.append("# HELP rag_admission_requests Classification requests in flight and queued")
+    extra.append("# TYPE rag_admission_requests gauge")
+    for state in ("in_flight", "queued"):
+        extra.append(f'rag_admission_requests{{state="{state}"}} {admitted[state]}')
+    extra.append("# HELP rag_admission_shed_total Classification requests rejected or cancelled by admission control")
+    extra.append("# TYPE rag_admission_shed_total counter")
+    for reason in ("rejected_queue_full", "rejected_deadline", "expired_in_queue", "cancelled_disconnect", "cancelled_deadline"):
+        extra.append(f'rag_admission_shed_total{{reason="{reason}"}} {admitted[reason]}')
+
+    return PlainTextResponse(render_prometheus(extra), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/admin/reload", response_model=ReloadResponse)
+async def reload_corpus(
+    x_admin_token: str = Header(default=""),
+    domain: Optional[str] = Query(default=None, description="Domain to reload; all domains if omitted"),
+):
+    """
+    Reload the intent data of one or all domains and apply only what changed.
+
+    Requires ADMIN_TOKEN in the X-Admin-Token header; the endpoint is disabled
+    (403) while ADMIN_TOKEN is unset. New utterances are embedded and indexed,
+    removed ones dropped, and cached results for the affected intents
+    invalidated, while requests in flight finish on the previous corpus. Under
+    the pre-fork server the parent reloads and replaces the workers one by
+    one (202).
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid or missing admin token")
+
+    if prefork_parent_pid is not None:
+        os.kill(prefork_parent_pid, signal.SIGHUP)
+        return JSONResponse(status_code=202, content=ReloadResponse(status="accepted").model_dump())
+
+    try:
+        # An explicit reload may also retry a failed startup initialization
+        classifier = get_classifier() if is_classifier_ready() else await run_in_threadpool(_initialize)
+        change = await run_in_threadpool(classifier.reload, None, domain)
+    except Exception as e:
+        raise _http_error(e)
+    return ReloadResponse(
+        status="reloaded" if change else "unchanged",
+        added=len(change.added),
+        removed=len(change.removed),
+        affected_intents=sorted(change.affected_intents),
+        documents=sum(len(snapshot.documents) for snapshot in classifier.snapshots.values()),
+        versions={name: snapshot.version for name, snapshot in classifier.snapshots.items()},
+    )
 
 
 @app.post("/classify", response_model=QueryResponse)
-def classify_intent(request: QueryRequest):
+async def classify_intent(request: QueryRequest):
     """
     Classify the intent of a user utterance using hybrid RAG search.
 
@@ -64,42 +418,208 @@ def classify_intent(request: QueryRequest):
     determine the final intent.
     """
     try:
-        classifier = get_classifier()
-        result = classifier.query(
+        classifier = _ready_classifier()
+        result = await classifier.aquery(
             user_query=request.query,
             top_k=request.top_k,
+            domain=request.domain,
         )
         return QueryResponse(**result)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
 
 
 @app.get("/classify", response_model=QueryResponse)
-def classify_intent_get(
+async def classify_intent_get(
     query: str = Query(..., description="The user utterance to classify"),
     top_k: int = Query(
         default=DEFAULT_TOP_K,
         ge=1,
-        le=20,
+        le=MAX_TOP_K,
         description="Number of top documents to retrieve",
     ),
+    domain: Optional[str] = Query(default=None, description="Intent domain; routed if omitted"),
 ):
     """GET endpoint for intent classification."""
     try:
-        classifier = get_classifier()
-        result = classifier.query(user_query=query, top_k=top_k)
+        classifier = _ready_classifier()
+        result = await classifier.aquery(user_query=query, top_k=top_k, domain=domain)
         return QueryResponse(**result)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _classify_events(classifier, query: str, top_k: int, domain: Optional[str]):
+    """Yield the classifier's stream events as Server-Sent Events."""
+    try:
+        async for event, data in classifier.astream(query, top_k, domain):
+            if event == "retrieval":
+                payload = RetrievalEvent(**data).model_dump_json()
+            elif event == "result":
+                payload = QueryResponse(**data).model_dump_json()
+            else:
+                payload = json.dumps(data)
+            yield _sse(event, payload)
+    except Exception as e:
+        error = _http_error(e)
+        yield _sse("error", json.dumps({"status": error.status_code, "detail": error.detail}))
+
+
+async def _stream_response(query: str, top_k: int, domain: Optional[str]) -> StreamingResponse:
+    try:
+        classifier = _ready_classifier()
+    except ClassifierNotReadyError as e:
+        raise _http_error(e)
+
+    return StreamingResponse(
+        _classify_events(classifier, query, top_k, domain),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/classify/stream")
+async def classify_stream(request: QueryRequest):
+    """
+    Classify an utterance, streaming the result as Server-Sent Events.
+
+    A "retrieval" event with the retrieved utterances and route is sent as
+    soon as retrieval finishes, followed by one "token" event per chunk of
+    the LLM's answer (only when the LLM is used) and a final "result" event
+    with the full QueryResponse. Failures are reported as an "error" event.
+    """
+    return await _stream_response(request.query, request.top_k, request.domain)
+
+
+@app.get("/classify/stream")
+async def classify_stream_get(
+    query: str = Query(..., description="The user utterance to classify"),
+    top_k: int = Query(
+        default=DEFAULT_TOP_K,
+        ge=1,
+        le=MAX_TOP_K,
+        description="Number of top documents to retrieve",
+    ),
+    domain: Optional[str] = Query(default=None, description="Intent domain; routed if omitted"),
+):
+    """GET endpoint for streaming intent classification, e.g. for EventSource clients."""
+    return await _stream_response(query, top_k, domain)
+
+
+@app.post("/classify/batch", response_model=BatchQueryResponse)
+async def classify_batch(
+    request: Request,
+    top_k: int = Query(
+        default=DEFAULT_TOP_K,
+        ge=1,
+        le=MAX_TOP_K,
+        description="Number of top documents to retrieve (NDJSON input only)",
+    ),
+    domain: Optional[str] = Query(default=None, description="Intent domain of all queries (NDJSON input only)"),
+):
+    """
+    Classify many utterances in one request.
+
+    With a JSON body (BatchQueryRequest) the response is a BatchQueryResponse.
+    With Content-Type application/x-ndjson, each input line is a JSON string or
+    an object with a "query" field. Lines are classified in chunks of
+    BATCH_CHUNK_SIZE and results are streamed back as NDJSON BatchItem lines,
+    so batches of any size can be sent.
+    """
+    try:
+        classifier = _ready_classifier()
+    except ClassifierNotReadyError as e:
+        raise _http_error(e)
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        return _DuplexStreamingResponse(
+            _classify_ndjson(classifier, request, top_k, domain),
+            media_type="application/x-ndjson",
+        )
+
+    try:
+        batch = BatchQueryRequest.model_validate(await request.json())
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        results = await run_in_threadpool(classifier.query_batch, batch.queries, batch.top_k, batch.domain)
+        return BatchQueryResponse(results=_batch_items(results))
+    except Exception as e:
+        raise _http_error(e)
+
+
+def _parse_ndjson_query(line: bytes) -> str:
+    """Extract the query from one NDJSON line: a JSON string or {"query": ...}."""
+    item = json.loads(line)
+    query = item if isinstance(item, str) else item["query"]
+    if not isinstance(query, str):
+        raise TypeError("query must be a string")
+    return query
+
+
+async def _classify_ndjson(classifier: RAGIntentClassifier, request: Request, top_k: int, domain: Optional[str]):
+    """Read NDJSON queries from the request body and yield NDJSON results chunk by chunk."""
+    chunk: list[tuple[int, str]] = []
+    items: list[BatchItem] = []
+
+    async def flush() -> str:
+        if chunk:
+            indices, queries = zip(*chunk)
+            chunk.clear()
+            try:
+                results = await run_in_threadpool(classifier.query_batch, list(queries), top_k, domain)
+                items.extend(
+                    item.model_copy(update={"index": index})
+                    for index, item in zip(indices, _batch_items(results))
+                )
+            except Exception as e:
+                items.extend(BatchItem(index=index, error=str(e)) for index in indices)
+
+        lines = "".join(
+            item.model_dump_json(exclude_none=True) + "\n"
+            for item in sorted(items, key=lambda item: item.index)
+        )
+        items.clear()
+        return lines
+
+    def add_line(index: int, line: bytes) -> None:
+        try:
+            chunk.append((index, _parse_ndjson_query(line)))
+        except (ValueError, KeyError, TypeError) as e:
+            items.append(BatchItem(index=index, error=f"Invalid NDJSON line: {e}"))
+
+    index = 0
+    buffer = b""
+    async for body in request.stream():
+        buffer += body
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                add_line(index, line)
+                index += 1
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                yield await flush()
+
+    if buffer.strip():
+        add_line(index, buffer)
+
+    if chunk or items:
+        yield await flush()
 
 
 def main():
-    """Run the FastAPI server."""
+    """Run the FastAPI server in one process (auto-reloading with FASTAPI_RELOAD); see rag_app.serve for production."""
     uvicorn.run(
         "rag_app.api:app",
         host=FASTAPI_HOST,
         port=FASTAPI_PORT,
-        reload=True,
+        reload=FASTAPI_RELOAD,
     )
 
 
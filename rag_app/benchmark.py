@@ -0,0 +1,430 @@
+"""
+Offline latency and accuracy benchmark for the intent classifier.
+
+Embeddings come from LocalEmbeddings and the LLM is a deterministic stand-in
+that answers with the majority intent of the utterances in its prompt, so no
+network access or API key is needed. Results are printed (or written with
+--output) as one JSON document that can be diffed between versions.
+
+    python -m rag_app.benchmark --sizes 0 10000 100000 1000000 --output bench.json
+
+Size 0 benchmarks the bundled intents.json with a held-out split; other sizes
+benchmark synthetic corpora generated from its training part.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Any, Optional
+
+import httpx
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# rag_app modules read the environment when first imported, so they are imported
+# where they are used, after main() has set up the offline environment
+if TYPE_CHECKING:
+    from rag_app.config import ClassifierMode
+    from rag_app.rag_chain import RAGIntentClassifier
+    from rag_app.vector_store import NumpyVectorStore
+
+_PROMPT_INTENT = re.compile(r'^- ".*" -> (.+)$', re.MULTILINE)
+
+
+class MajorityVoteChatModel(BaseChatModel):
+    """Deterministic LLM stand-in: answers with the most common intent among the prompt's utterances."""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "majority-vote"
+
+    def _answer(self, messages: list[BaseMessage]) -> ChatResult:
+        intents = _PROMPT_INTENT.findall(messages[-1].content)
+        answer = Counter(intents).most_common(1)[0][0] if intents else "unknown"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(messages)
+
+
+# ----------------------------------------------------------------------
+# Corpora
+# ----------------------------------------------------------------------
+
+def split_holdout(documents: list[Document], fraction: float, seed: int) -> tuple[list[Document], list[Document]]:
+    """Hold out about `fraction` of each intent's utterances (at least one, never all)."""
+    rng = random.Random(seed)
+    by_intent: dict[str, list[Document]] = defaultdict(list)
+    for doc in documents:
+        by_intent[doc.metadata["intent"]].append(doc)
+
+    train, held_out = [], []
+    for intent in sorted(by_intent):
+        docs = sorted(by_intent[intent], key=lambda doc: doc.id)
+        rng.shuffle(docs)
+        count = min(len(docs) - 1, max(1, round(len(docs) * fraction)))
+        held_out.extend(docs[:count])
+        train.extend(docs[count:])
+    return train, held_out
+
+
+def _filler(rng: random.Random, vocabulary: int) -> str:
+    return f"w{rng.randrange(vocabulary)}"
+
+
+def perturb(text: str, rng: random.Random, vocabulary: int = 50000) -> str:
+    """Drop one word (if there are enough) and insert one filler word."""
+    words = text.split()
+    if len(words) > 3:
+        del words[rng.randrange(len(words))]
+    words.insert(rng.randrange(len(words) + 1), _filler(rng, vocabulary))
+    return " ".join(words)
+
+
+def synthesize_corpus(base: list[Document], size: int, seed: int) -> list[Document]:
+    """`size` unique utterances made by perturbing base utterances, keeping their intents."""
+    from rag_app.vector_store import document_id
+
+    rng = random.Random(seed)
+    documents = []
+    for i in range(size):
+        source = base[i % len(base)]
+        intent = source.metadata["intent"]
+        text = f"{perturb(source.page_content, rng)} ref{i}"
+        documents.append(Document(id=document_id(intent, text), page_content=text, metadata={"intent": intent}))
+    return documents
+
+
+def synthesize_queries(held_out: list[Document], count: int, seed: int) -> list[tuple[str, str]]:
+    """`count` (query, intent) pairs: perturbed held-out utterances."""
+    rng = random.Random(seed)
+    return [
+        (perturb(doc.page_content, rng), doc.metadata["intent"])
+        for doc in (held_out[i % len(held_out)] for i in range(count))
+    ]
+
+
+# ----------------------------------------------------------------------
+# Measurements
+# ----------------------------------------------------------------------
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50_ms": None, "p99_ms": None}
+    p50, p99 = np.percentile(np.asarray(values) * 1000, [50, 99])
+    return {"p50_ms": round(float(p50), 4), "p99_ms": round(float(p99), 4)}
+
+
+def _stage_percentiles(per_query: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    by_stage: dict[str, list[float]] = defaultdict(list)
+    for timings in per_query:
+        for name, seconds in timings.items():
+            by_stage[name].append(seconds)
+    return {name: _percentiles(values) for name, values in sorted(by_stage.items())}
+
+
+def _accuracy(results: list[dict], intents: list[str]) -> dict[str, float]:
+    correct = sum(result.get("predicted_intent") == intent for result, intent in zip(results, intents))
+    retrieved = sum(
+        any(item["intent"] == intent for item in result.get("retrieved_utterances", []))
+        for result, intent in zip(results, intents)
+    )
+    routes = Counter(result.get("route", "error") for result in results)
+    return {
+        "accuracy": round(correct / len(intents), 4),
+        "recall_at_k": round(retrieved / len(intents), 4),
+        "routes": dict(sorted(routes.items())),
+    }
+
+
+def bench_query(classifier: "RAGIntentClassifier", queries: list[tuple[str, str]], top_k: int) -> dict:
+    """Sequential query() calls: accuracy, QPS, end-to-end and per-stage latency."""
+    from rag_app.metrics import collect_timings
+
+    results, latencies, stage_timings = [], [], []
+    started = time.perf_counter()
+    for text, _ in queries:
+        with collect_timings() as timings:
+            start = time.perf_counter()
+            results.append(classifier.query(text, top_k))
+            latencies.append(time.perf_counter() - start)
+        stage_timings.append(timings)
+    elapsed = time.perf_counter() - started
+
+    return {
+        **_accuracy(results, [intent for _, intent in queries]),
+        "qps": round(len(queries) / elapsed, 2),
+        "latency": _percentiles(latencies),
+        "stages": _stage_percentiles(stage_timings),
+    }
+
+
+def bench_batch(classifier: "RAGIntentClassifier", queries: list[tuple[str, str]], top_k: int, chunk: int) -> dict:
+    """query_batch() over all queries in chunks: accuracy and QPS."""
+    texts = [text for text, _ in queries]
+    results = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), chunk):
+        results.extend(classifier.query_batch(texts[i:i + chunk], top_k))
+    elapsed = time.perf_counter() - started
+    return {
+        **_accuracy(results, [intent for _, intent in queries]),
+        "qps": round(len(texts) / elapsed, 2),
+    }
+
+
+def _parse_server_timing(header: Optional[str]) -> dict[str, float]:
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration) / 1000
+    return timings
+
+
+async def _bench_api(queries: list[tuple[str, str]], top_k: int, concurrency: int) -> dict:
+    from rag_app.api import app
+
+    latencies, stage_timings, results = [], [], [None] * len(queries)
+    next_index = 0
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal next_index
+            while next_index < len(queries):
+                index = next_index
+                next_index += 1
+                start = time.perf_counter()
+                response = await client.post("/classify", json={"query": queries[index][0], "top_k": top_k})
+                latencies.append(time.perf_counter() - start)
+                stage_timings.append(_parse_server_timing(response.headers.get("server-timing")))
+                results[index] = response.json() if response.status_code == 200 else {}
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        **_accuracy(results, [intent for _, intent in queries]),
+        "concurrency": concurrency,
+        "qps": round(len(queries) / elapsed, 2),
+        "latency": _percentiles(latencies),
+        "stages": _stage_percentiles(stage_timings),
+    }
+
+
+def bench_api(classifier: "RAGIntentClassifier", queries: list[tuple[str, str]], top_k: int, concurrency: int) -> dict:
+    """POST /classify through the FastAPI app in-process: accuracy, QPS, latency and Server-Timing stages."""
+    from rag_app.rag_chain import set_classifier
+
+    set_classifier(classifier)
+    return asyncio.run(_bench_api(queries, top_k, concurrency))
+
+
+def bench_quantization(
+    vector_store: "NumpyVectorStore", queries: list[tuple[str, str]], top_ks: list[int], modes: list[str]
+) -> dict:
+    """Vector search alone per quantization: bytes scanned, recall@k against exact search and QPS."""
+    from rag_app.config import VectorQuantization
+
+    embeddings = vector_store.embeddings.embed_queries([text for text, _ in queries])
+    report = {}
+    for mode in modes:
+        store = vector_store.quantized(VectorQuantization(mode))
+        entry = store.memory_stats()
+        for top_k in top_ks:
+            started = time.perf_counter()
+            store.search_batch(embeddings, top_k)
+            elapsed = time.perf_counter() - started
+            entry[f"top_{top_k}"] = {
+                "recall": round(store.recall_at_k(embeddings, top_k), 4),
+                "qps": round(len(embeddings) / elapsed, 2),
+            }
+        report[mode] = entry
+    return report
+
+
+def run_corpus(
+    name: str,
+    corpus: list[Document],
+    queries: list[tuple[str, str]],
+    mode: "ClassifierMode",
+    args: argparse.Namespace,
+) -> dict:
+    """Build a classifier over corpus and benchmark it for every requested top_k."""
+    from rag_app.config import NUMPY_INDEX_DIR
+    from rag_app.rag_chain import RAGIntentClassifier
+    from rag_app.vector_store import NumpyVectorStore, query_embedding_cache
+
+    shutil.rmtree(NUMPY_INDEX_DIR, ignore_errors=True)
+    query_embedding_cache.clear()
+    gc.collect()
+
+    rss_before = _rss_mb()
+    classifier = RAGIntentClassifier(mode=mode, llm=MajorityVoteChatModel(latency=args.llm_latency_ms / 1000))
+    started = time.perf_counter()
+    classifier.initialize(corpus)
+    build_seconds = time.perf_counter() - started
+
+    report = {
+        "corpus": name,
+        "mode": mode.value,
+        "documents": len(corpus),
+        "queries": len(queries),
+        "build_seconds": round(build_seconds, 3),
+        "index_memory_mb": round(_rss_mb() - rss_before, 1),
+        "top_k": {},
+    }
+    for top_k in args.top_k:
+        report["top_k"][str(top_k)] = {
+            "query": bench_query(classifier, queries, top_k),
+            "batch": bench_batch(classifier, queries, top_k, args.batch_size),
+            "api": bench_api(classifier, queries, top_k, args.concurrency),
+        }
+        print(f"{name} [{mode.value}] top_k={top_k} done", file=sys.stderr)
+
+    if isinstance(classifier.vector_store, NumpyVectorStore) and args.quantization:
+        report["vector_index"] = bench_quantization(classifier.vector_store, queries, args.top_k, args.quantization)
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _offline_environment(work_dir: str) -> None:
+    """Force the offline stand-ins, with the index in work_dir, before rag_app.config reads the environment."""
+    if "rag_app.config" in sys.modules:
+        raise RuntimeError("The benchmark must run in a fresh process: python -m rag_app.benchmark")
+    os.environ["OPENAI_API_KEY"] = ""
+    os.environ["GOOGLE_API_KEY"] = ""
+    os.environ["CLASSIFIER_MODE"] = "local"
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["INDEX_LOAD_MODE"] = "sync"
+    os.environ["NUMPY_INDEX_DIR"] = os.path.join(work_dir, "index")
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmark and print or write the JSON report."""
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        _offline_environment(work_dir)
+        _run(argv)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run(argv: list[str] | None) -> None:
+    from rag_app.config import ClassifierMode, VectorQuantization
+    from rag_app.vector_store import load_intent_data
+
+    parser = argparse.ArgumentParser(description="Offline latency and accuracy benchmark for the intent classifier")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[0, 10000, 100000, 1000000],
+        help="Corpus sizes; 0 is the bundled intents.json with a held-out split",
+    )
+    parser.add_argument(
+        "--modes", nargs="+", default=[ClassifierMode.RAG.value],
+        choices=[mode.value for mode in ClassifierMode],
+    )
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument(
+        "--quantization", nargs="*", default=[mode.value for mode in VectorQuantization],
+        choices=[mode.value for mode in VectorQuantization],
+        help="Vector index quantizations to compare on vector search alone (none to skip)",
+    )
+    parser.add_argument("--queries", type=int, default=500, help="Queries per synthetic corpus")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of each intent's utterances held out")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent API clients")
+    parser.add_argument("--batch-size", type=int, default=256, help="Queries per query_batch() call")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    train, held_out = split_holdout(load_intent_data(), args.holdout, args.seed)
+    report = {
+        "git_commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "runs": [],
+    }
+
+    for size in args.sizes:
+        if size == 0:
+            name = "intents.json"
+            corpus = train
+            queries = [(doc.page_content, doc.metadata["intent"]) for doc in held_out]
+        else:
+            name = f"synthetic-{size}"
+            corpus = synthesize_corpus(train, size, args.seed)
+            queries = synthesize_queries(held_out, args.queries, args.seed)
+
+        for mode in args.modes:
+            report["runs"].append(run_corpus(name, corpus, queries, ClassifierMode(mode), args))
+        del corpus
+
+    report["peak_memory_mb"] = round(_peak_rss_mb(), 1)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Build or sync the vector index ahead of time, e.g. in an image build step."""
+
+import logging
+
+from rag_app.vector_store import build_vector_store, get_domains, load_intent_data
+
+
+def main():
+    """Embed new utterances from each domain's intent data and write its configured vector index."""
+    logging.basicConfig(level=logging.INFO)
+    for domain in get_domains():
+        documents = load_intent_data(domain.data_file)
+        build_vector_store(documents, domain)
+        print(f"Indexed {len(documents)} {domain.name} utterances")
+
+
+if __name__ == "__main__":
+    main()
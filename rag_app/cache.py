@@ -0,0 +1,357 @@
+"""In-memory caches for the RAG application."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share cache keys."""
+    return " ".join(text.casefold().split())
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: Optional[float] = None):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def discard_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove the entries for which predicate(key, value) is true and return how many."""
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves query embeddings from an LRUCache.
+
+    Keys are (model, normalized query text). Document embeddings are passed
+    through to the underlying embeddings unchanged.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache: LRUCache,
+        model: str,
+        query_batch_fn: Optional[Callable[[list[str]], list[list[float]]]] = None,
+    ):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model
+        # Embeds many queries in one provider call; defaults to embed_documents
+        self.query_batch_fn = query_batch_fn or underlying.embed_documents
+
+    def _key(self, text: str) -> tuple[str, str]:
+        return self.model, normalize_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.underlying.embed_query(text)
+            self.cache.put(key, embedding)
+        return embedding
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = await self.underlying.aembed_query(text)
+            self.cache.put(key, embedding)
+        return embedding
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed many queries, sending all cache misses to the provider in one call."""
+        keys = [self._key(text) for text in texts]
+        embeddings: dict[tuple[str, str], list[float]] = {}
+        missing: dict[tuple[str, str], str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in embeddings or key in missing:
+                continue
+            embedding = self.cache.get(key)
+            if embedding is None:
+                missing[key] = text
+            else:
+                embeddings[key] = embedding
+
+        if missing:
+            fresh = self.query_batch_fn(list(missing.values()))
+            for key, embedding in zip(missing, fresh):
+                self.cache.put(key, embedding)
+                embeddings[key] = embedding
+
+        return [embeddings[key] for key in keys]
+
+
+class ResponseCache:
+    """
+    Two-tier cache of classification results.
+
+    The exact tier is keyed by normalized query text and top_k. The similarity
+    tier holds unit-normalized query embeddings in a fixed-size ring and
+    returns the most similar entry with the same top_k whose cosine similarity
+    is at least similarity_threshold.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self._exact = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+
+        # Similarity tier, allocated on first put once the dimension is known
+        self._max_size = max_size
+        self._vectors: Optional[np.ndarray] = None
+        self._top_ks = np.zeros(max_size, dtype=np.int32)
+        self._expires_at = np.full(max_size, -np.inf)
+        self._results: list[Optional[dict]] = [None] * max_size
+        self._next_slot = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold <= 1.0
+
+    def _find_similar(self, embedding: Optional[list[float]], top_k: int) -> Optional[dict]:
+        if embedding is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+
+        query = query / norm
+
+        # Only the live-entry mask is taken under the lock; the scan runs
+        # without it, so lookups and puts don't queue behind one another
+        with self._lock:
+            vectors = self._vectors
+            if vectors is None or vectors.shape[1] != len(query):
+                return None
+            valid = (self._top_ks == top_k) & (self._expires_at >= time.monotonic())
+        if not valid.any():
+            return None
+        similarities = vectors @ query
+        similarities[~valid] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        # put() may have reused the slot since, so check it again before trusting it
+        with self._lock:
+            if (
+                self._vectors is vectors
+                and self._top_ks[best] == top_k
+                and self._expires_at[best] >= time.monotonic()
+                and float(vectors[best] @ query) >= self.similarity_threshold
+            ):
+                return self._results[best]
+        return None
+
+    def lookup(
+        self,
+        text: str,
+        top_k: int,
+        embed_fn: Optional[Callable[[], list[float]]] = None,
+    ) -> tuple[Optional[dict], str]:
+        """
+        Look a query up in both tiers.
+
+        embed_fn is only called when the exact tier misses.
+
+        Returns:
+            (result, tier) where tier is "exact", "semantic" or "miss".
+        """
+        embed_many_fn = (lambda texts: [embed_fn()]) if embed_fn is not None else None
+        return self.lookup_many([text], top_k, embed_many_fn)[0]
+
+    def lookup_many(
+        self,
+        texts: list[str],
+        top_k: int,
+        embed_many_fn: Optional[Callable[[list[str]], list[list[float]]]] = None,
+    ) -> list[tuple[Optional[dict], str]]:
+        """
+        Look many queries up in both tiers.
+
+        embed_many_fn is called once with all texts that miss the exact tier.
+        """
+        found: list[tuple[Optional[dict], str]] = []
+        pending: list[int] = []
+        for i, text in enumerate(texts):
+            result = self._exact.get((normalize_query(text), top_k))
+            found.append((result, "exact") if result is not None else (None, "miss"))
+            if result is None:
+                pending.append(i)
+
+        if pending and self.semantic_enabled and embed_many_fn is not None:
+            embeddings = embed_many_fn([texts[i] for i in pending])
+            for i, embedding in zip(pending, embeddings):
+                result = self._find_similar(embedding, top_k)
+                if result is not None:
+                    found[i] = (result, "semantic")
+
+        self._record(tier for _, tier in found)
+        return found
+
+    async def alookup(
+        self,
+        text: str,
+        top_k: int,
+        aembed_fn: Optional[Callable[[], Awaitable[list[float]]]] = None,
+    ) -> tuple[Optional[dict], str]:
+        """Async lookup(); aembed_fn is only awaited when the exact tier misses."""
+        found = (self._exact.get((normalize_query(text), top_k)), "exact")
+        if found[0] is None:
+            found = (None, "miss")
+            if self.semantic_enabled and aembed_fn is not None:
+                result = self._find_similar(await aembed_fn(), top_k)
+                if result is not None:
+                    found = (result, "semantic")
+
+        self._record([found[1]])
+        return found
+
+    def _record(self, tiers) -> None:
+        with self._lock:
+            for tier in tiers:
+                if tier == "exact":
+                    self.exact_hits += 1
+                elif tier == "semantic":
+                    self.semantic_hits += 1
+                else:
+                    self.misses += 1
+
+    def put(self, text: str, top_k: int, result: dict, embedding: Optional[list[float]] = None) -> None:
+        self._exact.put((normalize_query(text), top_k), result)
+        if not self.semantic_enabled or embedding is None:
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self._max_size, len(vector)), dtype=np.float32)
+                self._expires_at[:] = -np.inf
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self._max_size
+            self._vectors[slot] = vector / norm
+            self._top_ks[slot] = top_k
+            self._expires_at[slot] = time.monotonic() + self.ttl_seconds if self.ttl_seconds else np.inf
+            self._results[slot] = result
+
+    def clear(self) -> None:
+        self._exact.clear()
+        with self._lock:
+            self._expires_at[:] = -np.inf
+            self._results = [None] * self._max_size
+
+    def invalidate_intents(self, intents: set[str]) -> int:
+        """
+        Drop results that predicted any of intents or retrieved an utterance
+        of one, e.g. after those intents' utterances changed.
+
+        Returns:
+            The number of exact-tier entries dropped.
+        """
+        def affected(result: dict) -> bool:
+            return result["predicted_intent"] in intents or any(
+                item["intent"] in intents for item in result["retrieved_utterances"]
+            )
+
+        dropped = self._exact.discard_if(lambda key, result: affected(result))
+        with self._lock:
+            for slot, result in enumerate(self._results):
+                if result is not None and affected(result):
+                    self._expires_at[slot] = -np.inf
+                    self._results[slot] = None
+        return dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._exact),
+                "max_size": self._max_size,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
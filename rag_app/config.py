@@ -1,6 +1,7 @@
 """Configuration module for the RAG application."""
 
 import os
+import re
 from enum import Enum
 
 from dotenv import load_dotenv
@@ -8,9 +9,47 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _parse_domains(value: str) -> dict[str, str]:
+    """Parse "name=path,name=path" into {name: path}."""
+    domains = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, path = (item.strip() for item in entry.partition("="))
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", name) or not path:
+            raise ValueError(f"Invalid INTENT_DOMAINS entry {entry!r}, expected name=path")
+        domains[name] = path
+    return domains
+
+
 class LLMProvider(str, Enum):
     OPENAI = "openai"
     GEMINI = "gemini"
+    LOCAL = "local"
+
+
+class ClassifierMode(str, Enum):
+    RAG = "rag"
+    LOCAL = "local"
+    TIERED = "tiered"
+
+
+class VectorBackend(str, Enum):
+    CHROMA = "chroma"
+    NUMPY = "numpy"
+
+
+class VectorQuantization(str, Enum):
+    NONE = "none"
+    BINARY = "binary"
+
+
+class IndexLoadMode(str, Enum):
+    SYNC = "sync"
+    LOAD = "load"
+
+
+class FusionMethod(str, Enum):
+    RRF = "rrf"
+    SCORE = "score"
 
 
 # Determine which LLM provider to use based on available API keys
@@ -22,28 +61,168 @@ if GOOGLE_API_KEY:
 elif OPENAI_API_KEY:
     LLM_PROVIDER = LLMProvider.OPENAI
 else:
+    LLM_PROVIDER = LLMProvider.LOCAL
+
+# Classifier mode: "rag" (hybrid retrieval + LLM), "local" (a model trained on
+# the intent data at startup, no network) or "tiered" (local model first, RAG
+# when its confidence is below LOCAL_MIN_CONFIDENCE). Without an API key only
+# "local" is available, and it is the default.
+CLASSIFIER_MODE = ClassifierMode(
+    os.getenv(
+        "CLASSIFIER_MODE",
+        (ClassifierMode.LOCAL if LLM_PROVIDER == LLMProvider.LOCAL else ClassifierMode.RAG).value,
+    ).lower()
+)
+if LLM_PROVIDER == LLMProvider.LOCAL and CLASSIFIER_MODE != ClassifierMode.LOCAL:
     raise ValueError(
-        "No API key found. Please set either GOOGLE_API_KEY or OPENAI_API_KEY "
-        "in your environment or .env file."
+        f"CLASSIFIER_MODE={CLASSIFIER_MODE.value} needs an API key. Please set either "
+        "GOOGLE_API_KEY or OPENAI_API_KEY in your environment or .env file, "
+        "or use CLASSIFIER_MODE=local."
     )
+LOCAL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MIN_CONFIDENCE", "0.9"))
+
+# LLM providers to fail over to, in order, when the configured one is
+# unavailable: the other provider, if its API key is set
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "true").lower() == "true"
+LLM_FALLBACK_PROVIDERS = [
+    provider
+    for provider, key in ((LLMProvider.GEMINI, GOOGLE_API_KEY), (LLMProvider.OPENAI, OPENAI_API_KEY))
+    if LLM_FAILOVER and key and provider != LLM_PROVIDER
+]
+
+# Provider calls: timeout (seconds) and retries per call, consecutive failures
+# that open a provider's circuit breaker, and seconds before an open breaker
+# lets a trial call through
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "10"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "1"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_TIMEOUT = int(os.getenv("BREAKER_RECOVERY_TIMEOUT", "30"))
+
+# When no provider can answer, classify by the retrieval vote instead of the
+# LLM, and retrieve with BM25 alone while the embedding provider is down
+LOCAL_FALLBACK = os.getenv("LOCAL_FALLBACK", "true").lower() == "true"
+
+# Embedding model for the configured provider
+if LLM_PROVIDER == LLMProvider.GEMINI:
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+elif LLM_PROVIDER == LLMProvider.LOCAL:
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "local-char-ngram")
+else:
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# On-disk cache of document embeddings, keyed by content hash and model
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+
+# In-memory cache of query embeddings
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+# Cache of classification results. The similarity tier returns a cached result
+# when a query embedding's cosine similarity reaches the threshold (> 1 disables it)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", "0.95"))
 
 # ChromaDB settings
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
 CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "intent_utterances")
 
+# Vector store backend: "chroma", or "numpy" for an in-process index over a
+# memory-mapped embedding matrix stored in NUMPY_INDEX_DIR
+VECTOR_BACKEND = VectorBackend(os.getenv("VECTOR_BACKEND", VectorBackend.CHROMA.value).lower())
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./numpy_index")
+
+# Numpy backend first-pass scan over compressed codes: "binary" (sign bits
+# compared by Hamming distance, 32x smaller). The top
+# k * QUANTIZED_RERANK_MULTIPLIER candidates are re-ranked exactly
+VECTOR_QUANTIZATION = VectorQuantization(os.getenv("VECTOR_QUANTIZATION", VectorQuantization.NONE.value).lower())
+QUANTIZED_RERANK_MULTIPLIER = int(os.getenv("QUANTIZED_RERANK_MULTIPLIER", "10"))
+
+# Startup index mode: "sync" embeds and indexes new utterances before serving;
+# "load" opens the existing (e.g. prebuilt) index as-is for a fast start
+INDEX_LOAD_MODE = IndexLoadMode(os.getenv("INDEX_LOAD_MODE", IndexLoadMode.SYNC.value).lower())
+
 # Data file path
 DATA_FILE_PATH = os.getenv(
     "DATA_FILE_PATH",
     os.path.join(os.path.dirname(__file__), "data", "intents.json"),
 )
 
+# Intent domains: "name=path,name=path" serves several intent data files, each
+# with its own vector collection/index, BM25 index and prompt. A request names
+# its domain or is routed to one by a local model trained on all domains' data
+INTENT_DOMAINS = _parse_domains(os.getenv("INTENT_DOMAINS", ""))
+# Name of the only domain when INTENT_DOMAINS is unset; when it is set, the
+# domain that keeps the unsuffixed Chroma collection and numpy index directory
+DEFAULT_DOMAIN = os.getenv("DEFAULT_DOMAIN", "default")
+
 # Default top-k results
 DEFAULT_TOP_K = int(os.getenv("DEFAULT_TOP_K", "1"))
 
+# Largest top-k a request may ask for
+MAX_TOP_K = 20
+
+# Query normalization: lowercase, collapse whitespace and replace dollar
+# amounts, numbers and merchant names with typed placeholders in queries and
+# indexed utterances alike, so variants share cache entries and raw values
+# are never sent to a provider. Changing it changes the utterance IDs, so the
+# vector index is re-embedded on the next start
+QUERY_NORMALIZATION = os.getenv("QUERY_NORMALIZATION", "false").lower() == "true"
+
+# Confidence routing: when the top ROUTING_DEPTH retrieved utterances agree on an
+# intent with at least this vote share and margin, skip the LLM and return it
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+FAST_PATH_MIN_MARGIN = float(os.getenv("FAST_PATH_MIN_MARGIN", "0.5"))
+ROUTING_DEPTH = max(1, min(int(os.getenv("ROUTING_DEPTH", "5")), MAX_TOP_K))
+
+# Batch classification: max queries per JSON request, queries per NDJSON chunk,
+# and max concurrent LLM calls per batch
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "256"))
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+# LLM prompt and answer: token budget for the retrieved examples in a prompt,
+# max answer tokens, and whether to constrain the answer to the candidate
+# intents with structured output where the model supports it
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "512"))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "32"))
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# Max concurrent outbound embedding/LLM calls from the async request path
+MAX_OUTBOUND_CONCURRENCY = int(os.getenv("MAX_OUTBOUND_CONCURRENCY", "256"))
+
 # Hybrid search weights: [BM25_weight, vector_weight]
 BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "0.4"))
 VECTOR_WEIGHT = float(os.getenv("VECTOR_WEIGHT", "0.6"))
 
-# FastAPI settings
+# Hybrid fusion: "rrf" (weighted reciprocal rank) or "score" (weighted
+# min-max normalized scores). Each leg fetches ceil(k * HYBRID_FETCH_MULTIPLIER)
+FUSION_METHOD = FusionMethod(os.getenv("FUSION_METHOD", FusionMethod.RRF.value).lower())
+HYBRID_FETCH_MULTIPLIER = float(os.getenv("HYBRID_FETCH_MULTIPLIER", "1.0"))
+HYBRID_VECTOR_THREADS = int(os.getenv("HYBRID_VECTOR_THREADS", "32"))
+
+# FastAPI settings. FASTAPI_RELOAD restarts `python -m rag_app.api` on code
+# changes, for development only
 FASTAPI_HOST = os.getenv("FASTAPI_HOST", "0.0.0.0")
 FASTAPI_PORT = int(os.getenv("FASTAPI_PORT", "8000"))
+FASTAPI_RELOAD = os.getenv("FASTAPI_RELOAD", "false").lower() == "true"
+
+# Pre-fork production server (python -m rag_app.serve): worker processes and
+# seconds a stopping worker may spend finishing in-flight requests
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+
+# Live corpus reload: token required by POST /admin/reload (unset disables the
+# endpoint) and seconds between checks of DATA_FILE_PATH for changes (0 = off)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+CORPUS_WATCH_INTERVAL = float(os.getenv("CORPUS_WATCH_INTERVAL", "0"))
+
+# Admission control for /classify requests, per worker: max classifications
+# in flight (0 = unlimited) and waiting for a slot, and the deadline in seconds
+# until the response starts for requests without an X-Request-Timeout header
+# (0 = none)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("DEFAULT_REQUEST_TIMEOUT", "0"))
@@ -0,0 +1,262 @@
+"""Circuit breakers around embedding and LLM provider calls, and LLM provider failover."""
+
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, Union
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+from rag_app.config import BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT
+from rag_app.prompts import IntentPromptBuilder
+
+# The circuit breaker package (circuit_breaker/ at the repository root) is
+# imported where it is used, so local mode, which makes no provider calls,
+# does not need it
+if TYPE_CHECKING:
+    from circuit_breaker.custom_circuit_break_wrapper import CustomCircuitBreakerWrapper
+
+logger = logging.getLogger(__name__)
+
+# Breakers created by this process, by name
+_breakers: dict[str, "CustomCircuitBreakerWrapper"] = {}
+_breakers_lock = threading.Lock()
+
+
+class ProvidersUnavailableError(RuntimeError):
+    """Raised when every provider for a call failed or has an open circuit breaker."""
+
+
+class _Unguarded:
+    """Stands in for a circuit breaker when the circuit_breaker package is not importable: calls pass straight through."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @contextmanager
+    def calling(self) -> Iterator[None]:
+        yield
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        return func(*args, **kwargs)
+
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        return await func(*args, **kwargs)
+
+
+Breaker = Union["CustomCircuitBreakerWrapper", _Unguarded]
+
+
+def provider_breaker(name: str) -> Breaker:
+    """
+    The circuit breaker guarding calls to one provider.
+
+    Breakers are registered with the CircuitBreakerManager, so the stats
+    recorder and other monitoring see them too. Without the circuit_breaker
+    package, provider calls are made unguarded (with a warning) rather than
+    failing.
+    """
+    try:
+        from circuit_breaker.circuit_breaker_manager import CircuitBreakerManager
+        from circuit_breaker.custom_circuit_break_wrapper import CircuitBreakerConfig
+    except ImportError as e:
+        logger.warning("Circuit breaker package unavailable (%s); calling %s without a breaker", e, name)
+        return _Unguarded(name)
+
+    manager = CircuitBreakerManager()
+    with _breakers_lock:
+        breaker = manager.get_circuit_breaker(name)
+        if breaker is None:
+            breaker = manager.register_circuit_breaker(
+                CircuitBreakerConfig(
+                    name=name,
+                    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                    recovery_timeout=BREAKER_RECOVERY_TIMEOUT,
+                )
+            )
+        _breakers[name] = breaker
+    return breaker
+
+
+def breaker_stats() -> dict[str, dict]:
+    """State and call counts of this process's provider circuit breakers."""
+    stats = {}
+    for name, breaker in list(_breakers.items()):
+        raw = breaker.get_stats()
+        calls = raw["stats"]
+        stats[name] = {
+            "state": raw["current_state"],
+            "failure_count": raw["failure_count"],
+            "total_calls": calls["total_calls"],
+            "successful_calls": calls["successful_calls"],
+            "failed_calls": calls["failed_calls"],
+            "blocked_calls": calls["blocked_calls"],
+            "last_failure_time": calls["last_failure_time"],
+        }
+    return stats
+
+
+# Every GuardedEmbeddings of this process, for reset_provider_clients()
+_guarded_embeddings: "weakref.WeakSet[GuardedEmbeddings]" = weakref.WeakSet()
+
+
+class GuardedEmbeddings(Embeddings):
+    """
+    Embeddings whose provider calls go through a circuit breaker.
+
+    The provider client is created by factory on first use, and again after
+    reset_provider_clients(), so a forked worker never reuses the connection
+    pools of the process it was forked from.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings], breaker: Breaker):
+        self.factory = factory
+        self.breaker = breaker
+        self._embeddings: Embeddings | None = None
+        self._lock = threading.Lock()
+        _guarded_embeddings.add(self)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self.factory()
+        return self._embeddings
+
+    def reset(self) -> None:
+        """Drop the provider client; the next call creates a new one."""
+        # A lock held by another thread at fork time stays locked in the child
+        self._lock = threading.Lock()
+        self._embeddings = None
+
+    def embed_documents(self, texts: list[str], **kwargs: Any) -> list[list[float]]:
+        return self.breaker.call(self.embeddings.embed_documents, texts, **kwargs)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.breaker.call(self.embeddings.embed_query, text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.breaker.call_async(self.embeddings.aembed_documents, texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.breaker.call_async(self.embeddings.aembed_query, text)
+
+
+def reset_provider_clients() -> None:
+    """Drop the embedding provider clients created so far, e.g. in a worker right after fork()."""
+    for embeddings in list(_guarded_embeddings):
+        embeddings.reset()
+
+
+def _supports_structured_output(llm: BaseChatModel) -> bool:
+    try:
+        llm.with_structured_output(IntentPromptBuilder.output_schema([]))
+    except NotImplementedError:
+        return False
+    return True
+
+
+def _answer_text(response) -> str:
+    """The intent named by a structured (dict) or plain message response."""
+    if isinstance(response, dict):
+        return response.get("intent") or ""
+    if response is None:
+        return ""
+    return response.content
+
+
+@dataclass
+class _Provider:
+    name: str
+    llm: BaseChatModel
+    breaker: Breaker
+    structured_output: bool
+
+
+class FailoverLLM:
+    """
+    Chat models of one or more providers, tried in order.
+
+    Each provider is called through its own circuit breaker: a provider whose
+    breaker is open is skipped without waiting on it, and a failed call moves
+    on to the next provider. Where a model supports structured output, its
+    answer is constrained to the candidate intents with a JSON schema.
+    """
+
+    def __init__(self, llms: list[tuple[str, BaseChatModel]], structured_output: bool = True):
+        self.providers = [
+            _Provider(
+                name=name,
+                llm=llm,
+                breaker=provider_breaker(f"llm.{name}"),
+                structured_output=structured_output and _supports_structured_output(llm),
+            )
+            for name, llm in llms
+        ]
+
+    @staticmethod
+    def _model(provider: _Provider, candidates: list[str]):
+        if provider.structured_output:
+            return provider.llm.with_structured_output(IntentPromptBuilder.output_schema(candidates))
+        return provider.llm
+
+    @staticmethod
+    def _failed(provider: _Provider, e: Exception, errors: list[str]) -> None:
+        logger.warning("LLM provider %s unavailable: %s", provider.name, e)
+        errors.append(f"{provider.name}: {e}")
+
+    @staticmethod
+    def _unavailable(errors: list[str]) -> ProvidersUnavailableError:
+        return ProvidersUnavailableError("No LLM provider available (" + "; ".join(errors) + ")")
+
+    def invoke(self, messages: list[BaseMessage], candidates: list[str]) -> str:
+        """The first available provider's answer text."""
+        errors: list[str] = []
+        for provider in self.providers:
+            try:
+                return _answer_text(provider.breaker.call(self._model(provider, candidates).invoke, messages))
+            except Exception as e:
+                self._failed(provider, e, errors)
+        raise self._unavailable(errors)
+
+    async def ainvoke(self, messages: list[BaseMessage], candidates: list[str]) -> str:
+        """Async invoke()."""
+        errors: list[str] = []
+        for provider in self.providers:
+            try:
+                model = self._model(provider, candidates)
+                return _answer_text(await provider.breaker.call_async(model.ainvoke, messages))
+            except Exception as e:
+                self._failed(provider, e, errors)
+        raise self._unavailable(errors)
+
+    async def astream(self, messages: list[BaseMessage], candidates: list[str]) -> AsyncIterator[str]:
+        """
+        Stream the first available provider's answer as text deltas.
+
+        A provider that fails before its first delta is failed over; a failure
+        after it is raised, since part of the answer has been sent.
+        """
+        errors: list[str] = []
+        for provider in self.providers:
+            answer = ""
+            try:
+                with provider.breaker.calling():
+                    async for chunk in self._model(provider, candidates).astream(messages):
+                        text = _answer_text(chunk)
+                        # Structured output streams the whole answer so far; plain text streams deltas
+                        delta = text[len(answer):] if provider.structured_output else text
+                        if delta:
+                            answer += delta
+                            yield delta
+                return
+            except Exception as e:
+                if answer:
+                    raise
+                self._failed(provider, e, errors)
+        raise self._unavailable(errors)
@@ -0,0 +1,195 @@
+"""Network-free intent model: hashed character n-gram TF-IDF with a calibrated centroid classifier."""
+
+import zlib
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy import sparse
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag_app.cache import normalize_query
+
+
+def _char_ngrams(text: str, ngram_range: tuple[int, int]) -> list[str]:
+    """Character n-grams of each word, padded with spaces to mark word boundaries."""
+    grams = []
+    low, high = ngram_range
+    for word in normalize_query(text).split():
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+def _hash(gram: str) -> int:
+    # crc32 is stable across processes, unlike hash() on str
+    return zlib.crc32(gram.encode("utf-8"))
+
+
+class CharNgramVectorizer:
+    """Hashed character n-gram TF-IDF vectors with sublinear TF and L2 normalization."""
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: tuple[int, int] = (2, 5)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.idf = np.ones(n_features, dtype=np.float32)
+
+    def _counts(self, texts: list[str]) -> sparse.csr_matrix:
+        indptr = [0]
+        indices: list[int] = []
+        for text in texts:
+            indices.extend(_hash(gram) % self.n_features for gram in _char_ngrams(text, self.ngram_range))
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(texts), self.n_features),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def fit(self, texts: list[str]) -> "CharNgramVectorizer":
+        counts = self._counts(texts)
+        doc_freq = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts: list[str]) -> sparse.csr_matrix:
+        matrix = self._counts(texts)
+        data = (1 + np.log(matrix.data)) * self.idf[matrix.indices]
+        row_lengths = np.diff(matrix.indptr)
+        rows = np.repeat(np.arange(len(texts)), row_lengths)
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=len(texts)))
+        norms[norms == 0] = 1
+        matrix.data = (data / np.repeat(norms, row_lengths)).astype(np.float32)
+        return matrix
+
+
+@dataclass
+class LocalPrediction:
+    """Predicted intent with its calibrated probability and nearest training utterances."""
+    intent: str
+    confidence: float
+    # Probability gap to the runner-up intent
+    margin: float
+    neighbors: list[tuple[Document, float]] = field(default_factory=list)
+
+
+class LocalIntentModel:
+    """
+    Nearest-centroid linear classifier over character n-gram TF-IDF vectors.
+
+    Class scores are cosine similarities to each intent's centroid, turned into
+    probabilities with a softmax whose temperature is fitted at training time
+    to minimize leave-one-out log loss, so confidences are calibrated on the
+    training data.
+    """
+
+    TEMPERATURES = np.geomspace(0.005, 1.0, 40)
+
+    def __init__(self, documents: list[Document], n_features: int = 2 ** 18):
+        if not documents:
+            raise ValueError("LocalIntentModel needs at least one training document")
+
+        self.documents = documents
+        self.intents = sorted({doc.metadata["intent"] for doc in documents})
+        labels = np.array([self.intents.index(doc.metadata["intent"]) for doc in documents])
+
+        texts = [doc.page_content for doc in documents]
+        self.vectorizer = CharNgramVectorizer(n_features=n_features).fit(texts)
+        self._examples = self.vectorizer.transform(texts)
+
+        membership = sparse.csr_matrix(
+            (np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))),
+            shape=(len(self.intents), len(labels)),
+        )
+        sums = sparse.csr_matrix(membership @ self._examples)
+        sum_norms = np.sqrt(np.asarray(sums.multiply(sums).sum(axis=1)).ravel())
+        centroids = sparse.csr_matrix(sparse.diags(1 / np.maximum(sum_norms, 1e-12)) @ sums)
+        # Feature-major copies so scoring a query is a CSR x CSR product without transposes
+        self._centroids_t = sparse.csr_matrix(centroids.T)
+        self._examples_t = sparse.csr_matrix(self._examples.T)
+        self.temperature = self._fit_temperature(sums, sum_norms, labels)
+
+    def _fit_temperature(self, sums: sparse.csr_matrix, sum_norms: np.ndarray, labels: np.ndarray) -> float:
+        """Pick the softmax temperature minimizing leave-one-out log loss."""
+        rows = np.arange(len(labels))
+        dots = (self._examples @ sums.T).toarray()
+        scores = dots / np.maximum(sum_norms, 1e-12)
+
+        # Score of each example against its own class centroid with itself removed
+        own_dot = dots[rows, labels] - 1.0
+        own_norm = np.sqrt(np.maximum(sum_norms[labels] ** 2 - 2 * dots[rows, labels] + 1.0, 0))
+        scores[rows, labels] = np.where(own_norm > 1e-12, own_dot / np.maximum(own_norm, 1e-12), 0.0)
+
+        best_temperature, best_loss = 1.0, np.inf
+        for temperature in self.TEMPERATURES:
+            logits = scores / temperature
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs = logits[rows, labels] - np.log(np.exp(logits).sum(axis=1))
+            loss = -log_probs.mean()
+            if loss < best_loss:
+                best_temperature, best_loss = float(temperature), loss
+        return best_temperature
+
+    def _probabilities(self, vectors: sparse.csr_matrix) -> np.ndarray:
+        logits = (vectors @ self._centroids_t).toarray() / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict_batch(self, texts: list[str], top_k: int = 0) -> list[LocalPrediction]:
+        """Predict intents for texts, with up to top_k nearest training utterances each."""
+        vectors = self.vectorizer.transform(texts)
+        probs = self._probabilities(vectors)
+        # Kept sparse: only training utterances sharing an n-gram with the query are scored
+        similarities = sparse.csr_matrix(vectors @ self._examples_t) if top_k else None
+
+        predictions = []
+        for i, row in enumerate(probs):
+            best = int(np.argmax(row))
+            runner_up = np.partition(row, -2)[-2] if len(row) > 1 else 0.0
+            neighbors = []
+            if top_k:
+                start, end = similarities.indptr[i], similarities.indptr[i + 1]
+                doc_ids, scores = similarities.indices[start:end], similarities.data[start:end]
+                k = min(top_k, len(scores))
+                if k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    top = top[np.lexsort((doc_ids[top], -scores[top]))]
+                    neighbors = [(self.documents[doc_ids[j]], float(scores[j])) for j in top]
+            predictions.append(LocalPrediction(
+                self.intents[best], float(row[best]), float(row[best] - runner_up), neighbors
+            ))
+        return predictions
+
+    def predict(self, text: str, top_k: int = 0) -> LocalPrediction:
+        return self.predict_batch([text], top_k)[0]
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Deterministic, network-free embeddings from signed hashed character n-grams.
+
+    Texts sharing character n-grams get similar vectors, so these work as a
+    local stand-in for a provider's embeddings.
+    """
+
+    def __init__(self, size: int = 256, ngram_range: tuple[int, int] = (2, 4)):
+        self.size = size
+        self.ngram_range = ngram_range
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for gram in _char_ngrams(text, self.ngram_range):
+            h = _hash(gram)
+            vector[h % self.size] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
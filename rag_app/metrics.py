@@ -0,0 +1,191 @@
+"""Stage timers, fixed-memory latency histograms and Prometheus exposition for the RAG application."""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Upper bounds in seconds, from 100 µs (local model, BM25) to 10 s (slow LLM calls)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Stages that call the embedding or LLM provider
+UPSTREAM_STAGES = frozenset({"embed", "llm"})
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus-style histogram keyed by one label.
+
+    Memory is one fixed array of bucket counts per label value, however many
+    observations are made.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # label value -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[str, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += seconds
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {value: (list(counts), total[0]) for value, (counts, total) in self._series.items()}
+
+        for value, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {value}" for key, value in values)
+        return lines
+
+
+stage_durations = Histogram(
+    "rag_stage_duration_seconds", "Time spent in each classification stage", "stage"
+)
+stage_errors = Counter("rag_stage_errors_total", "Exceptions raised by each classification stage", ("stage",))
+request_durations = Histogram("rag_request_duration_seconds", "HTTP request latency by route", "path")
+responses = Counter("rag_http_responses_total", "HTTP responses by route and status code", ("path", "status"))
+
+# Stage timings of the request being served, for the Server-Timing header
+_request_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("rag_request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a classification stage.
+
+    The duration goes into stage_durations and, inside a request, into that
+    request's Server-Timing header. An exception escaping the stage is counted
+    and tagged with a failed_stage attribute (the innermost stage wins) so the
+    API can tell provider failures from internal ones.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        stage_errors.inc(name)
+        if getattr(e, "failed_stage", None) is None:
+            try:
+                e.failed_stage = name
+            except AttributeError:
+                pass
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_durations.observe(name, elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """Collect the durations of stages run in this context (including copies of it) into a dict."""
+    timings: dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items())
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that collects a request's stage timings into a Server-Timing
+    header and records request latency and status per route.
+
+    Routes are labelled by their path template, so path parameters and unknown
+    paths cannot grow the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        with collect_timings() as timings:
+            async def send_with_timing(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if timings:
+                        headers = list(message.get("headers", []))
+                        headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                route = scope.get("route")
+                path = getattr(route, "path", "other")
+                request_durations.observe(path, time.perf_counter() - start)
+                responses.inc(path, str(status))
+
+
+def render_prometheus(extra: Optional[list[str]] = None) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (stage_durations, stage_errors, request_durations, responses):
+        lines.extend(metric.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
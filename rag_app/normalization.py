@@ -0,0 +1,49 @@
+"""Query normalization: case, whitespace and typed placeholders for sensitive values."""
+
+import re
+
+# Typed placeholders, lowercase so the final case fold leaves them intact, and
+# made of word characters so BM25 tokenizes each as one token that no real
+# word matches (a bare "<amount>" would tokenize to the word "amount")
+AMOUNT = "__amount__"
+NUMBER = "__number__"
+MERCHANT = "__merchant__"
+
+# One alternation, so a single scan handles every replacement. Alternatives are
+# tried in order: amounts before the numbers inside them, and merchants before
+# the case fold that would hide them. As in the DataTokenizationAPI prototype, a
+# merchant is a capitalized name after a lowercase "at" ("Spent $71.75 at LOS
+# POLLOS and ...", "Paid at Walmart"), ending before " and", punctuation or the
+# end of the text. The preposition is case-sensitive, so all-caps text, where
+# every word looks like a name, is never masked as a merchant.
+_NORMALIZE_PATTERN = re.compile(
+    r"(?P<amount>\$\s?\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?"
+    r"|\$\s?\d+(?:\.\d{1,2})?"
+    r"|\b\d+(?:\.\d+)?\s?(?i:dollars?|usd|bucks)\b)"
+    r"|(?P<merchant>\bat\s+[A-Z][A-Za-z0-9&'-]+(?:[ \t]+[A-Z0-9][A-Za-z0-9&'-]*)*)"
+    r"|(?P<number>\b\d+(?:[.,:/-]\d+)*\b)"
+    r"|(?P<space>\s+)"
+)
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "space":
+        return " "
+    if kind == "amount":
+        return AMOUNT
+    if kind == "number":
+        return NUMBER
+    return f"at {MERCHANT}"
+
+
+def normalize_utterance(text: str) -> str:
+    """
+    Lowercase, collapse whitespace and replace dollar amounts, numbers and
+    merchant names with typed placeholders.
+
+    "Can you transfer $100 to my friend?" and "transfer  $250 to my friend"
+    both become "... transfer __amount__ to my friend", so they share cache
+    entries and retrieval results, and raw values never reach a provider.
+    """
+    return _NORMALIZE_PATTERN.sub(_replace, text).strip().casefold()
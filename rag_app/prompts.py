@@ -0,0 +1,111 @@
+"""Token-budgeted intent classification prompts and validation of the LLM's answer."""
+
+import math
+import re
+from typing import Optional
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from rag_app.cache import normalize_query
+
+# Rough characters-per-token ratio of English text for the supported models
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count, without a tokenizer dependency."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _label_key(label: str) -> str:
+    """Case- and separator-insensitive form of an intent label."""
+    return re.sub(r"[\s\-_]+", "_", label.strip().casefold())
+
+
+class IntentPromptBuilder:
+    """
+    Builds classification prompts over a fixed set of known intents.
+
+    The system message (instructions and the known intents) is identical for
+    every request, so providers can cache it as a prompt prefix. The human
+    message holds the retrieved examples, deduplicated and trimmed to
+    example_token_budget, the candidate intents and the query.
+    """
+
+    def __init__(self, intents: list[str], example_token_budget: int = 512):
+        self.intents = sorted(set(intents))
+        self.example_token_budget = example_token_budget
+        self._by_key = {_label_key(intent): intent for intent in self.intents}
+        self.system_message = SystemMessage(
+            content=(
+                "You are an intent classifier. Each request gives a user query, similar "
+                "utterances retrieved from a database with their intents, and the candidate "
+                "intents. Answer with exactly one candidate intent name and nothing else.\n\n"
+                f"Known intents: {', '.join(self.intents)}"
+            )
+        )
+
+    def select_examples(self, retrieved_docs: list[tuple[Document, float]]) -> list[Document]:
+        """Retrieved documents in rank order without duplicate utterances, within the token budget."""
+        examples: list[Document] = []
+        seen: set[str] = set()
+        used = 0
+        for doc, _ in retrieved_docs:
+            key = normalize_query(doc.page_content)
+            if key in seen:
+                continue
+            cost = estimate_tokens(self._example_line(doc))
+            # The best match is always kept, even if it alone exceeds the budget
+            if examples and used + cost > self.example_token_budget:
+                break
+            seen.add(key)
+            examples.append(doc)
+            used += cost
+        return examples
+
+    @staticmethod
+    def _example_line(doc: Document) -> str:
+        return f"- \"{doc.page_content}\" -> {doc.metadata['intent']}"
+
+    def build(
+        self, user_query: str, retrieved_docs: list[tuple[Document, float]]
+    ) -> tuple[list[BaseMessage], list[str]]:
+        """
+        Build the messages for one query.
+
+        Returns:
+            (messages, candidates) where candidates are the distinct intents of
+            the selected examples in rank order.
+        """
+        examples = self.select_examples(retrieved_docs)
+        candidates = list(dict.fromkeys(doc.metadata["intent"] for doc in examples))
+        body = (
+            "Examples:\n"
+            + "\n".join(self._example_line(doc) for doc in examples)
+            + f"\n\nCandidate intents: {' | '.join(candidates)}"
+            + f"\n\nQuery: \"{user_query}\""
+        )
+        return [self.system_message, HumanMessage(content=body)], candidates
+
+    @staticmethod
+    def output_schema(candidates: list[str]) -> dict:
+        """
+        JSON schema restricting the answer to one of the candidate intents.
+
+        Without candidates (retrieval found nothing) the answer is any string,
+        since providers reject an empty enum; validate() checks it instead.
+        """
+        intent = {"type": "string", "enum": candidates} if candidates else {"type": "string"}
+        return {
+            "title": "IntentChoice",
+            "description": "The intent of the user query.",
+            "type": "object",
+            "properties": {"intent": intent},
+            "required": ["intent"],
+            "additionalProperties": False,
+        }
+
+    def validate(self, answer: str) -> Optional[str]:
+        """The known intent an answer names (ignoring case, quotes and separators), or None."""
+        return self._by_key.get(_label_key(answer.strip().strip("`'\".")))
@@ -1,115 +1,1013 @@
 """RAG chain module for intent classification from utterance queries."""
 
-from langchain.schema import Document
-from langchain_chroma import Chroma
+import asyncio
+import logging
+import threading
+import weakref
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import AsyncIterator
 
-from rag_app.config import LLM_PROVIDER, LLMProvider
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
+from langchain_core.vectorstores import VectorStore
+
+from rag_app.cache import ResponseCache, normalize_query
+from rag_app.config import (
+    LLM_PROVIDER,
+    LLMProvider,
+    LLM_FALLBACK_PROVIDERS,
+    LOCAL_FALLBACK,
+    PROVIDER_TIMEOUT,
+    PROVIDER_MAX_RETRIES,
+    CLASSIFIER_MODE,
+    ClassifierMode,
+    LOCAL_MIN_CONFIDENCE,
+    MAX_TOP_K,
+    QUERY_NORMALIZATION,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    FAST_PATH_ENABLED,
+    FAST_PATH_MIN_CONFIDENCE,
+    FAST_PATH_MIN_MARGIN,
+    ROUTING_DEPTH,
+    LLM_BATCH_CONCURRENCY,
+    LLM_MAX_TOKENS,
+    LLM_STRUCTURED_OUTPUT,
+    PROMPT_TOKEN_BUDGET,
+    MAX_OUTBOUND_CONCURRENCY,
+    DEFAULT_DOMAIN,
+)
+from rag_app.failover import FailoverLLM, ProvidersUnavailableError
+from rag_app.local_model import LocalIntentModel
+from rag_app.metrics import stage
+from rag_app.normalization import normalize_utterance
+from rag_app.prompts import IntentPromptBuilder
+from rag_app.routing import DomainRouter, RoutingDecision, vote_intents
 from rag_app.vector_store import (
     load_intent_data,
-    build_chroma_vector_store,
+    build_vector_store,
+    load_or_build_vector_store,
+    build_bm25_retriever,
     build_hybrid_retriever,
+    get_domains,
+    query_embedding_cache,
+    Domain,
+    HybridRetriever,
+    NumpyVectorStore,
+    SparseBM25Retriever,
 )
 
+logger = logging.getLogger(__name__)
+
+
+class ClassifierNotReadyError(RuntimeError):
+    """Raised when querying a classifier that has not been initialized."""
+
+
+class InvalidAnswerError(ValueError):
+    """Raised when the LLM's answer names no known intent and retrieval has none to offer instead."""
 
-def _get_llm():
-    """Return the appropriate LLM based on the configured provider."""
-    if LLM_PROVIDER == LLMProvider.OPENAI:
+    # Blamed on the LLM, so the API answers 502 like other provider failures
+    failed_stage = "llm"
+
+
+def _get_llm(provider: LLMProvider = LLM_PROVIDER) -> BaseChatModel:
+    """Return the LLM of a provider, by default the configured one."""
+    if provider == LLMProvider.OPENAI:
         from langchain_openai import ChatOpenAI
 
-        return ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        return ChatOpenAI(
+            model="gpt-4o-mini",
+            temperature=0,
+            max_tokens=LLM_MAX_TOKENS,
+            timeout=PROVIDER_TIMEOUT,
+            max_retries=PROVIDER_MAX_RETRIES,
+        )
     else:
         from langchain_google_genai import ChatGoogleGenerativeAI
 
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+        return ChatGoogleGenerativeAI(
+            model="gemini-2.0-flash",
+            temperature=0,
+            max_output_tokens=LLM_MAX_TOKENS,
+            timeout=PROVIDER_TIMEOUT,
+            max_retries=PROVIDER_MAX_RETRIES,
+        )
+
+
+@dataclass
+class CorpusSnapshot:
+    """
+    One domain's corpus and everything built from it, as of one version of the data.
+
+    A reload builds a new snapshot and swaps it in with a single assignment.
+    Requests take the current snapshot once and use it throughout, so they
+    finish on the snapshot they started with. The response cache is carried
+    over from one snapshot of a domain to the next.
+    """
+    domain: str
+    documents: list[Document]
+    vector_store: VectorStore | None = None
+    bm25_retriever: SparseBM25Retriever | None = None
+    retriever: HybridRetriever | None = None
+    local_model: LocalIntentModel | None = None
+    prompt_builder: IntentPromptBuilder | None = None
+    response_cache: ResponseCache | None = None
+    version: int = 0
+    # Original text of utterances indexed in normalized form, by document ID, for display
+    utterances: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class CorpusChange:
+    """Utterances added and removed by a reload; false if nothing changed."""
+    added: list[Document] = field(default_factory=list)
+    removed: list[Document] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    @property
+    def affected_intents(self) -> set[str]:
+        return {doc.metadata["intent"] for doc in self.added + self.removed}
 
 
 class RAGIntentClassifier:
-    """Hybrid RAG-based intent classifier using BM25 + vector search."""
+    """
+    Hybrid RAG-based intent classifier using BM25 + vector search.
+
+    In "local" mode (see CLASSIFIER_MODE) it only uses a LocalIntentModel
+    trained on the intent data and makes no network calls; in "tiered" mode
+    that model answers first and the RAG path handles queries below
+    LOCAL_MIN_CONFIDENCE. mode and llm default to the configured ones.
+
+    Each domain (see INTENT_DOMAINS) is a separate shard with its own indexes,
+    local model, prompt and response cache. A query is classified against the
+    domain it names or, with several domains, the one a DomainRouter picks,
+    so its cost depends on that domain's size only.
 
-    def __init__(self):
-        self.documents: list[Document] = []
-        self.vector_store: Chroma | None = None
-        self.llm = _get_llm()
+    LLM calls go to the configured provider and fail over to
+    LLM_FALLBACK_PROVIDERS; each provider is guarded by a circuit breaker.
+    With LOCAL_FALLBACK, a query no provider could answer gets the retrieval
+    vote's intent (route "fallback"), and retrieval uses BM25 alone while the
+    embedding provider is unavailable. Neither kind of result is cached.
+    """
+
+    def __init__(self, mode: ClassifierMode | None = None, llm=None, domains: list[Domain] | None = None):
+        self.mode = mode or CLASSIFIER_MODE
+        self.domains = {domain.name: domain for domain in domains or get_domains()}
+        self.default_domain = DEFAULT_DOMAIN if DEFAULT_DOMAIN in self.domains else next(iter(self.domains))
+        self._snapshots: dict[str, CorpusSnapshot] = {}
+        self._router: DomainRouter | None = None
+        self._llm: FailoverLLM | None = None
+        self._llm_lock = threading.Lock()
+        if llm is not None:
+            self._llm = FailoverLLM([(llm._llm_type, llm)], structured_output=LLM_STRUCTURED_OUTPUT)
+        # Semaphores of _outbound, by the event loop they were created in
+        self._outbound_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._route_counts: Counter[str] = Counter()
+        self._domain_counts: Counter[str] = Counter()
+        self._stats_lock = threading.Lock()
+        # Serializes reloads; requests never wait on it
+        self._reload_lock = threading.Lock()
         self._initialized = False
 
-    def initialize(self) -> None:
-        """Load data and build indexes."""
-        self.documents = load_intent_data()
-        self.vector_store = build_chroma_vector_store(self.documents)
+    @property
+    def llm(self) -> FailoverLLM | None:
+        """
+        The configured LLM providers (None in local mode), created on first use.
+
+        Loading and reloading never use them, so a pre-fork parent creates no
+        provider clients for its workers to inherit; each worker creates its own.
+        """
+        if self._llm is None and self.mode != ClassifierMode.LOCAL:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = FailoverLLM(
+                        [(provider.value, _get_llm(provider)) for provider in [LLM_PROVIDER, *LLM_FALLBACK_PROVIDERS]],
+                        structured_output=LLM_STRUCTURED_OUTPUT,
+                    )
+        return self._llm
+
+    @property
+    def _outbound(self) -> asyncio.Semaphore:
+        """
+        Bounds in-flight embedding and LLM calls made by aquery().
+
+        Created on first use in each event loop rather than in __init__, which
+        runs outside any loop, since a semaphore is bound to one loop.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._outbound_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._outbound_semaphores[loop] = asyncio.Semaphore(MAX_OUTBOUND_CONCURRENCY)
+        return semaphore
+
+    @property
+    def snapshot(self) -> CorpusSnapshot:
+        """The current snapshot of the default domain."""
+        return self._snapshots[self.default_domain]
+
+    @property
+    def snapshots(self) -> dict[str, CorpusSnapshot]:
+        """The current snapshot of each domain."""
+        return dict(self._snapshots)
+
+    @property
+    def documents(self) -> list[Document]:
+        return self.snapshot.documents
+
+    @property
+    def vector_store(self) -> VectorStore | None:
+        return self.snapshot.vector_store
+
+    @property
+    def retriever(self) -> HybridRetriever | None:
+        return self.snapshot.retriever
+
+    @property
+    def local_model(self) -> LocalIntentModel | None:
+        return self.snapshot.local_model
+
+    @property
+    def prompt_builder(self) -> IntentPromptBuilder | None:
+        return self.snapshot.prompt_builder
+
+    @property
+    def response_cache(self) -> ResponseCache | None:
+        return self.snapshot.response_cache
+
+    def initialize(self, documents: list[Document] | None = None) -> None:
+        """
+        Load each domain's data and build or load its indexes (see INDEX_LOAD_MODE).
+
+        If documents are given, they are served as the only domain instead.
+        """
+        if documents is not None:
+            self.domains = {self.default_domain: self.domains[self.default_domain]}
+            corpora = {self.default_domain: documents}
+        else:
+            corpora = {name: load_intent_data(domain.data_file) for name, domain in self.domains.items()}
+
+        snapshots = {}
+        for name, domain_documents in corpora.items():
+            vector_store = (
+                load_or_build_vector_store(domain_documents, self.domains[name])
+                if self.mode != ClassifierMode.LOCAL
+                else None
+            )
+            snapshots[name] = self._build_snapshot(name, domain_documents, vector_store)
+        self._snapshots = snapshots
+        self._router = self._build_router()
         self._initialized = True
 
+    def _new_response_cache(self) -> ResponseCache | None:
+        # Local predictions are cheaper than a cache lookup, so only RAG results are cached
+        if not RESPONSE_CACHE_ENABLED or self.mode == ClassifierMode.LOCAL:
+            return None
+        return ResponseCache(
+            max_size=RESPONSE_CACHE_SIZE,
+            ttl_seconds=RESPONSE_CACHE_TTL,
+            similarity_threshold=RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        )
+
+    def _build_snapshot(
+        self,
+        domain: str,
+        documents: list[Document],
+        vector_store: VectorStore | None,
+        bm25_retriever: SparseBM25Retriever | None = None,
+        version: int = 0,
+        response_cache: ResponseCache | None = None,
+    ) -> CorpusSnapshot:
+        """Train the local model and/or index the corpus for hybrid retrieval, per mode."""
+        snapshot = CorpusSnapshot(
+            domain=domain,
+            documents=documents,
+            vector_store=vector_store,
+            response_cache=response_cache or self._new_response_cache(),
+            version=version,
+            utterances={doc.id: doc.metadata["utterance"] for doc in documents if "utterance" in doc.metadata},
+        )
+        if self.mode != ClassifierMode.RAG:
+            snapshot.local_model = LocalIntentModel(documents)
+        if self.mode == ClassifierMode.LOCAL:
+            return snapshot
+
+        snapshot.prompt_builder = IntentPromptBuilder(
+            [doc.metadata["intent"] for doc in documents],
+            example_token_budget=PROMPT_TOKEN_BUDGET,
+        )
+        snapshot.bm25_retriever = bm25_retriever or build_bm25_retriever(documents)
+        snapshot.retriever = build_hybrid_retriever(
+            documents=documents,
+            vector_store=vector_store,
+            bm25_retriever=snapshot.bm25_retriever,
+        )
+        return snapshot
+
+    def _build_router(self) -> DomainRouter | None:
+        if len(self._snapshots) < 2:
+            return None
+        return DomainRouter({name: snapshot.documents for name, snapshot in self._snapshots.items()})
+
+    def _domains_for(self, texts: list[str], domain: str | None) -> list[str]:
+        """The domain to classify each text against: the one named, or the router's choice."""
+        if domain is not None:
+            if domain not in self._snapshots:
+                raise ValueError(f"Unknown domain {domain!r}, expected one of: {', '.join(self._snapshots)}")
+            names = [domain] * len(texts)
+        elif self._router is None:
+            names = [self.default_domain] * len(texts)
+        else:
+            with stage("domain"):
+                names = self._router.route(texts)
+
+        with self._stats_lock:
+            self._domain_counts.update(names)
+        return names
+
+    def _snapshot_for(self, user_query: str, domain: str | None) -> CorpusSnapshot:
+        return self._snapshots[self._domains_for([user_query], domain)[0]]
+
+    def reload(self, documents: list[Document] | None = None, domain: str | None = None) -> CorpusChange:
+        """
+        Reload the intent data of one domain, or of every domain, and apply what changed.
+
+        Each domain's new corpus (its data file, unless documents are given)
+        is diffed against the loaded one by document ID. Only added
+        utterances are embedded and tokenized: the vector store is synced
+        (see build_vector_store()) and the BM25 index reuses the term counts
+        of kept utterances. The resulting snapshot is swapped in while
+        requests continue on the old one, and cached results involving the
+        affected intents are dropped.
+
+        Returns:
+            The added and removed utterances of all reloaded domains; false if
+            nothing changed.
+        """
+        with self._reload_lock:
+            if not self._initialized:
+                self.initialize(documents)
+                return CorpusChange(added=[doc for snapshot in self._snapshots.values() for doc in snapshot.documents])
+
+            if domain is not None and domain not in self._snapshots:
+                raise ValueError(f"Unknown domain {domain!r}, expected one of: {', '.join(self._snapshots)}")
+            names = [domain] if domain is not None else list(self._snapshots)
+            if documents is not None and len(names) > 1:
+                raise ValueError("documents can only be reloaded into a single domain")
+
+            change = CorpusChange()
+            for name in names:
+                domain_change = self._reload_domain(name, documents)
+                change.added += domain_change.added
+                change.removed += domain_change.removed
+            if change:
+                self._router = self._build_router()
+            return change
+
+    def _reload_domain(self, name: str, documents: list[Document] | None) -> CorpusChange:
+        current = self._snapshots[name]
+        new_documents = documents if documents is not None else load_intent_data(self.domains[name].data_file)
+        old_ids = {doc.id for doc in current.documents}
+        new_ids = {doc.id for doc in new_documents}
+        change = CorpusChange(
+            added=[doc for doc in new_documents if doc.id not in old_ids],
+            removed=[doc for doc in current.documents if doc.id not in new_ids],
+        )
+        if not change:
+            return change
+
+        # Kept utterances stay in their order ahead of the added ones, so index rows line up
+        keep = [i for i, doc in enumerate(current.documents) if doc.id in new_ids]
+        documents = [current.documents[i] for i in keep] + change.added
+
+        vector_store = (
+            build_vector_store(documents, self.domains[name]) if self.mode != ClassifierMode.LOCAL else None
+        )
+        bm25_retriever = (
+            current.bm25_retriever.updated(keep, change.added)
+            if current.bm25_retriever is not None
+            else None
+        )
+        self._snapshots[name] = self._build_snapshot(
+            name, documents, vector_store, bm25_retriever, current.version + 1, current.response_cache
+        )
+
+        if current.response_cache is not None:
+            current.response_cache.invalidate_intents(change.affected_intents)
+        logger.info(
+            "Reloaded %s intent data: %d added, %d removed, %d utterances (version %d)",
+            name, len(change.added), len(change.removed), len(documents), current.version + 1,
+        )
+        return change
+
     @property
     def is_initialized(self) -> bool:
         return self._initialized
 
-    def query(self, user_query: str, top_k: int = 1) -> dict:
+    def stats(self) -> dict:
+        """Cache hit/miss and routing statistics."""
+        stats = {"classifier_mode": self.mode.value}
+        snapshots = self._snapshots
+        if any(snapshot.vector_store is not None for snapshot in snapshots.values()):
+            stats["query_embeddings"] = query_embedding_cache.stats()
+        vector_indexes = {
+            name: snapshot.vector_store.memory_stats()
+            for name, snapshot in snapshots.items()
+            if isinstance(snapshot.vector_store, NumpyVectorStore)
+        }
+        if vector_indexes:
+            stats["vector_index"] = vector_indexes
+        cache_stats = [
+            snapshot.response_cache.stats() for snapshot in snapshots.values() if snapshot.response_cache is not None
+        ]
+        if cache_stats:
+            responses = {
+                key: sum(cache[key] for cache in cache_stats)
+                for key in ("size", "max_size", "exact_hits", "semantic_hits", "misses")
+            }
+            lookups = responses["exact_hits"] + responses["semantic_hits"] + responses["misses"]
+            responses["hit_rate"] = (responses["exact_hits"] + responses["semantic_hits"]) / lookups if lookups else 0.0
+            stats["responses"] = responses
+
+        with self._stats_lock:
+            domain_counts = dict(self._domain_counts)
+            local = self._route_counts["local"]
+            fast_path = self._route_counts["fast_path"]
+            llm = self._route_counts["llm"]
+            llm_invalid = self._route_counts["llm_invalid"]
+            llm_fallback = self._route_counts["llm_fallback"]
+            lexical_only = self._route_counts["lexical_only"]
+        # Each classification is counted once, by the route that answered it
+        routed = local + fast_path + llm + llm_fallback
+        stats["routing"] = {
+            "local": local,
+            "fast_path": fast_path,
+            "llm": llm,
+            "llm_invalid": llm_invalid,
+            "llm_fallback": llm_fallback,
+            "lexical_only": lexical_only,
+            "llm_offload_rate": (local + fast_path) / routed if routed else 0.0,
+        }
+        stats["domains"] = {
+            name: {
+                "utterances": len(snapshot.documents),
+                "version": snapshot.version,
+                "queries": domain_counts.get(name, 0),
+            }
+            for name, snapshot in snapshots.items()
+        }
+        return stats
+
+    def _check_ready(self, top_k: int) -> None:
+        if not self._initialized:
+            raise ClassifierNotReadyError("RAGIntentClassifier not initialized. Call initialize() first.")
+
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}, got {top_k}")
+
+    @staticmethod
+    def _normalized(user_query: str) -> str:
+        """The text classified for a query: normalized and masked with QUERY_NORMALIZATION."""
+        return normalize_utterance(user_query) if QUERY_NORMALIZATION else user_query
+
+    def query(self, user_query: str, top_k: int = 1, domain: str | None = None) -> dict:
         """
         Query the hybrid retriever and return the predicted intent.
 
+        The query is normalized first (see QUERY_NORMALIZATION), and the
+        normalized text keys every cache and index lookup and is what the
+        LLM sees; the result echoes the original query.
+
         Args:
             user_query: The user's utterance to classify.
             top_k: Number of top documents to retrieve.
 
         Returns:
-            A dict with the predicted intent, matched utterances, and LLM explanation.
+            A dict with the predicted intent, matched utterances, the route
+            taken ("local", "fast_path", "llm" or "fallback") with its
+            confidence, and which response cache tier ("exact", "semantic" or
+            "miss") served it.
+        """
+        return {**self._query(self._normalized(user_query), top_k, domain), "query": user_query}
+
+    def _query(self, user_query: str, top_k: int, domain: str | None) -> dict:
+        """query() for normalized text."""
+        self._check_ready(top_k)
+        snapshot = self._snapshot_for(user_query, domain)
+
+        if snapshot.local_model is not None:
+            local_results = self._classify_local(snapshot, [user_query], top_k)
+            if local_results:
+                return local_results[user_query]
+
+        query_embedding = None
+        lexical_only = False
+        if snapshot.response_cache is not None:
+            # The query embedding is cached, so the vector leg below reuses it
+            def embed_query():
+                nonlocal query_embedding, lexical_only
+                try:
+                    with stage("embed"):
+                        query_embedding = snapshot.vector_store.embeddings.embed_query(user_query)
+                except Exception as e:
+                    if not self._embedding_unavailable(e):
+                        raise
+                    lexical_only = True
+                return query_embedding
+
+            with stage("cache_lookup"):
+                cached, tier = snapshot.response_cache.lookup(user_query, top_k, embed_query)
+            if cached is not None:
+                return {**cached, "query": user_query, "cache": tier}
+
+        # Retrieve deep enough to judge confidence even for small top_k
+        depth = max(top_k, ROUTING_DEPTH)
+        if not lexical_only:
+            try:
+                candidate_docs = snapshot.retriever.search(user_query, depth)
+            except Exception as e:
+                if not self._embedding_unavailable(e):
+                    raise
+                lexical_only = True
+        if lexical_only:
+            candidate_docs = snapshot.retriever.search_lexical(user_query, depth)
+
+        decision, retrieved_docs = self._route(candidate_docs, top_k, lexical_only)
+        if decision.route == "fast_path":
+            predicted_intent = decision.intent
+        else:
+            with stage("prompt"):
+                messages, candidates = snapshot.prompt_builder.build(user_query, retrieved_docs)
+            try:
+                with stage("llm"):
+                    answer = self.llm.invoke(messages, candidates)
+            except ProvidersUnavailableError:
+                if not self._can_fall_back(decision):
+                    raise
+                predicted_intent = self._fall_back(decision)
+            else:
+                predicted_intent = self._validate_answer(snapshot, answer, decision)
+
+        result = self._build_result(snapshot, user_query, top_k, retrieved_docs, predicted_intent, decision)
+        self._cache_put(snapshot, user_query, top_k, result, query_embedding, decision)
+        return result
+
+    async def aquery(self, user_query: str, top_k: int = 1, domain: str | None = None) -> dict:
+        """
+        Async version of query().
+
+        Embedding and LLM calls are awaited under a semaphore bounded by
+        MAX_OUTBOUND_CONCURRENCY instead of blocking a worker thread.
+        """
+        return {**await self._aquery(self._normalized(user_query), top_k, domain), "query": user_query}
+
+    async def _aquery(self, user_query: str, top_k: int, domain: str | None) -> dict:
+        """aquery() for normalized text."""
+        result, pending = await self._aretrieve(user_query, top_k, domain)
+        if result is not None:
+            return result
+
+        snapshot, decision, retrieved_docs, query_embedding = pending
+        with stage("prompt"):
+            messages, candidates = snapshot.prompt_builder.build(user_query, retrieved_docs)
+        try:
+            async with self._outbound:
+                with stage("llm"):
+                    answer = await self.llm.ainvoke(messages, candidates)
+        except ProvidersUnavailableError:
+            if not self._can_fall_back(decision):
+                raise
+            predicted_intent = self._fall_back(decision)
+        else:
+            predicted_intent = self._validate_answer(snapshot, answer, decision)
+
+        result = self._build_result(snapshot, user_query, top_k, retrieved_docs, predicted_intent, decision)
+        self._cache_put(snapshot, user_query, top_k, result, query_embedding, decision)
+        return result
+
+    async def astream(
+        self, user_query: str, top_k: int = 1, domain: str | None = None
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Classify a query, yielding (event, data) pairs as results become available.
+
+        Events, in order:
+            "retrieval": the aquery() result without predicted_intent, sent as
+                soon as retrieval and routing are done.
+            "token": {"text": ...} for each chunk of the LLM's answer; only
+                when the query is routed to the LLM.
+            "result": the complete aquery() result.
         """
-        if not self._initialized or self.vector_store is None:
-            raise RuntimeError("RAGIntentClassifier not initialized. Call initialize() first.")
+        async for event, data in self._astream(self._normalized(user_query), top_k, domain):
+            yield event, data if event == "token" else {**data, "query": user_query}
 
-        retriever = build_hybrid_retriever(
-            documents=self.documents,
-            vector_store=self.vector_store,
-            top_k=top_k,
+    async def _astream(
+        self, user_query: str, top_k: int, domain: str | None
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """astream() for normalized text."""
+        result, pending = await self._aretrieve(user_query, top_k, domain)
+        if result is not None:
+            yield "retrieval", self._retrieval_event(result)
+            yield "result", result
+            return
+
+        snapshot, decision, retrieved_docs, query_embedding = pending
+        yield "retrieval", self._retrieval_event(
+            self._build_result(snapshot, user_query, top_k, retrieved_docs, "", decision)
         )
 
-        retrieved_docs = retriever.invoke(user_query)
+        answer = ""
+        with stage("prompt"):
+            messages, candidates = snapshot.prompt_builder.build(user_query, retrieved_docs)
+        try:
+            async with self._outbound:
+                with stage("llm"):
+                    async for delta in self.llm.astream(messages, candidates):
+                        answer += delta
+                        yield "token", {"text": delta}
+        except ProvidersUnavailableError:
+            if not self._can_fall_back(decision):
+                raise
+            predicted_intent = self._fall_back(decision)
+        else:
+            predicted_intent = self._validate_answer(snapshot, answer, decision)
+
+        result = self._build_result(snapshot, user_query, top_k, retrieved_docs, predicted_intent, decision)
+        self._cache_put(snapshot, user_query, top_k, result, query_embedding, decision)
+        yield "result", result
+
+    async def _aretrieve(
+        self, user_query: str, top_k: int, domain: str | None
+    ) -> tuple[dict | None, tuple | None]:
+        """
+        Everything in aquery() up to the LLM call.
+
+        Returns:
+            (result, None) when the local model, the response cache or the
+            fast path answered, otherwise (None, (snapshot, decision,
+            retrieved_docs, query_embedding)) for a query that needs the LLM.
+        """
+        self._check_ready(top_k)
+        snapshot = self._snapshot_for(user_query, domain)
+
+        if snapshot.local_model is not None:
+            local_results = self._classify_local(snapshot, [user_query], top_k)
+            if local_results:
+                return local_results[user_query], None
+
+        embeddings = snapshot.vector_store.embeddings
+        query_embedding = None
+        lexical_only = False
+
+        async def aembed_query():
+            nonlocal query_embedding, lexical_only
+            try:
+                async with self._outbound:
+                    with stage("embed"):
+                        query_embedding = await embeddings.aembed_query(user_query)
+            except Exception as e:
+                if not self._embedding_unavailable(e):
+                    raise
+                lexical_only = True
+            return query_embedding
+
+        if snapshot.response_cache is not None:
+            with stage("cache_lookup"):
+                cached, tier = await snapshot.response_cache.alookup(user_query, top_k, aembed_query)
+            if cached is not None:
+                return {**cached, "query": user_query, "cache": tier}, None
+
+        if query_embedding is None and not lexical_only:
+            await aembed_query()
+
+        depth = max(top_k, ROUTING_DEPTH)
+        if lexical_only:
+            candidate_docs = snapshot.retriever.search_lexical(user_query, depth)
+        else:
+            candidate_docs = await snapshot.retriever.asearch(user_query, depth, query_embedding)
+
+        decision, retrieved_docs = self._route(candidate_docs, top_k, lexical_only)
+        if decision.route != "fast_path":
+            return None, (snapshot, decision, retrieved_docs, query_embedding)
+
+        result = self._build_result(snapshot, user_query, top_k, retrieved_docs, decision.intent, decision)
+        self._cache_put(snapshot, user_query, top_k, result, query_embedding, decision)
+        return result, None
+
+    def query_batch(self, user_queries: list[str], top_k: int = 1, domain: str | None = None) -> list[dict]:
+        """
+        Classify many queries at once.
+
+        Queries identical after normalization are classified once, and queries are
+        grouped by domain. Within a domain, cache misses are embedded in a
+        single provider call and scored lexically in one sparse product, and
+        the queries that need the LLM are sent as one batch with at most
+        LLM_BATCH_CONCURRENCY calls in flight.
+
+        Returns:
+            One dict per input query, in order: the same result as query(),
+            or {"query": ..., "error": ...} if that query failed.
+        """
+        self._check_ready(top_k)
 
-        # Limit to top_k results (EnsembleRetriever may return more)
-        retrieved_docs = retrieved_docs[:top_k]
+        # Dedupe on the cache key so repeated queries share one result
+        keys = []
+        unique_queries: dict[str, str] = {}
+        for user_query in user_queries:
+            text = self._normalized(user_query)
+            keys.append(normalize_query(text))
+            unique_queries.setdefault(keys[-1], text)
+        texts = list(unique_queries.values())
 
-        # Build context from retrieved documents
-        context_lines = []
-        for i, doc in enumerate(retrieved_docs, 1):
-            context_lines.append(
-                f"{i}. Utterance: \"{doc.page_content}\" -> Intent: \"{doc.metadata['intent']}\""
+        snapshots = self._snapshots
+        by_domain: dict[str, list[str]] = {}
+        for text, name in zip(texts, self._domains_for(texts, domain)):
+            by_domain.setdefault(name, []).append(text)
+
+        results: dict[str, dict] = {}
+        for name, domain_texts in by_domain.items():
+            results.update(self._query_shard(snapshots[name], domain_texts, top_k))
+
+        return [
+            {**results[unique_queries[key]], "query": user_query}
+            for key, user_query in zip(keys, user_queries)
+        ]
+
+    def _query_shard(self, snapshot: CorpusSnapshot, texts: list[str], top_k: int) -> dict[str, dict]:
+        """query_batch() for distinct texts of one domain; returns the results by text."""
+        results: dict[str, dict] = (
+            self._classify_local(snapshot, texts, top_k) if snapshot.local_model is not None else {}
+        )
+        remaining = [text for text in texts if text not in results]
+
+        embeddings_by_text: dict[str, list[float]] = {}
+        lexical_only = False
+
+        def embed_many(batch: list[str]) -> list[list[float] | None]:
+            nonlocal lexical_only
+            try:
+                with stage("embed"):
+                    embedded = snapshot.vector_store.embeddings.embed_queries(batch)
+            except Exception as e:
+                if not self._embedding_unavailable(e):
+                    raise
+                lexical_only = True
+                return [None] * len(batch)
+            embeddings_by_text.update(zip(batch, embedded))
+            return embedded
+
+        if snapshot.response_cache is not None and remaining:
+            with stage("cache_lookup"):
+                found = snapshot.response_cache.lookup_many(remaining, top_k, embed_many)
+            for text, (cached, tier) in zip(remaining, found):
+                if cached is not None:
+                    results[text] = {**cached, "cache": tier}
+
+        pending = [text for text in remaining if text not in results]
+        if pending:
+            missing = [text for text in pending if text not in embeddings_by_text]
+            if missing and not lexical_only:
+                embed_many(missing)
+
+            depth = max(top_k, ROUTING_DEPTH)
+            candidate_lists = snapshot.retriever.search_batch(
+                pending,
+                None if lexical_only else [embeddings_by_text[text] for text in pending],
+                depth,
             )
-        context = "\n".join(context_lines)
-
-        # Use LLM to confirm / refine the intent prediction
-        prompt = (
-            f"You are an intent classifier. Given the user's query and the most similar "
-            f"utterances retrieved from the database, determine the correct intent.\n\n"
-            f"User Query: \"{user_query}\"\n\n"
-            f"Retrieved similar utterances and their intents:\n{context}\n\n"
-            f"Based on the retrieved results, what is the most likely intent for the "
-            f"user's query? Return ONLY the intent name, nothing else."
+
+            llm_items = []
+            decisions: dict[str, RoutingDecision] = {}
+            for text, candidate_docs in zip(pending, candidate_lists):
+                decision, retrieved_docs = self._route(candidate_docs, top_k, lexical_only)
+                decisions[text] = decision
+                if decision.route == "fast_path":
+                    results[text] = self._build_result(
+                        snapshot, text, top_k, retrieved_docs, decision.intent, decision
+                    )
+                else:
+                    llm_items.append((text, retrieved_docs, decision))
+
+            responses = []
+            if llm_items:
+                with stage("prompt"):
+                    calls = [snapshot.prompt_builder.build(text, retrieved_docs) for text, retrieved_docs, _ in llm_items]
+                with stage("llm"):
+                    responses = RunnableLambda(lambda call: self.llm.invoke(*call)).batch(
+                        calls,
+                        config={"max_concurrency": LLM_BATCH_CONCURRENCY},
+                        return_exceptions=True,
+                    )
+
+            for (text, retrieved_docs, decision), response in zip(llm_items, responses):
+                if isinstance(response, ProvidersUnavailableError) and self._can_fall_back(decision):
+                    predicted_intent = self._fall_back(decision)
+                elif isinstance(response, Exception):
+                    results[text] = {"query": text, "error": str(response)}
+                    continue
+                else:
+                    try:
+                        predicted_intent = self._validate_answer(snapshot, response, decision)
+                    except InvalidAnswerError as e:
+                        results[text] = {"query": text, "error": str(e)}
+                        continue
+                results[text] = self._build_result(
+                    snapshot, text, top_k, retrieved_docs, predicted_intent, decision
+                )
+
+            # Results computed on a snapshot a reload has since replaced may be stale
+            if snapshot.response_cache is not None and snapshot is self._snapshots.get(snapshot.domain):
+                with stage("cache_put"):
+                    for text in pending:
+                        if "error" not in results[text] and self._cacheable(decisions[text]):
+                            snapshot.response_cache.put(text, top_k, results[text], embeddings_by_text.get(text))
+
+        return results
+
+    def _classify_local(self, snapshot: CorpusSnapshot, texts: list[str], top_k: int) -> dict[str, dict]:
+        """
+        Classify texts with the local model.
+
+        In tiered mode only predictions with at least LOCAL_MIN_CONFIDENCE are
+        returned; the rest are left to the RAG path.
+        """
+        results = {}
+        with stage("local"):
+            predictions = snapshot.local_model.predict_batch(texts, top_k)
+        for text, prediction in zip(texts, predictions):
+            if self.mode == ClassifierMode.LOCAL or prediction.confidence >= LOCAL_MIN_CONFIDENCE:
+                decision = RoutingDecision(
+                    intent=prediction.intent,
+                    confidence=prediction.confidence,
+                    margin=prediction.margin,
+                    route="local",
+                )
+                results[text] = self._build_result(
+                    snapshot, text, top_k, prediction.neighbors, prediction.intent, decision
+                )
+
+        if results:
+            with self._stats_lock:
+                self._route_counts["local"] += len(results)
+        return results
+
+    def _route(
+        self, candidate_docs: list[tuple[Document, float]], top_k: int, lexical_only: bool = False
+    ) -> tuple[RoutingDecision, list[tuple[Document, float]]]:
+        """
+        Vote over the scored candidates, pick the route and cut the results to top_k.
+
+        Only the fast path is counted here: a query routed to the LLM is
+        counted once the LLM answers it (see _validate_answer()), or as a
+        fallback if no provider could.
+        """
+        decision = vote_intents(
+            [doc.metadata["intent"] for doc, _ in candidate_docs],
+            [score for _, score in candidate_docs],
         )
+        decision.lexical_only = lexical_only
+        fast_path = FAST_PATH_ENABLED and decision.is_confident(FAST_PATH_MIN_CONFIDENCE, FAST_PATH_MIN_MARGIN)
+        decision.route = "fast_path" if fast_path else "llm"
+
+        with self._stats_lock:
+            if fast_path:
+                self._route_counts["fast_path"] += 1
+            if lexical_only:
+                self._route_counts["lexical_only"] += 1
 
-        llm_response = self.llm.invoke(prompt)
-        predicted_intent = llm_response.content.strip()
+        return decision, candidate_docs[:top_k]
 
+    @staticmethod
+    def _build_result(
+        snapshot: CorpusSnapshot,
+        user_query: str,
+        top_k: int,
+        retrieved_docs: list[tuple[Document, float]],
+        predicted_intent: str,
+        decision: RoutingDecision,
+    ) -> dict:
         return {
             "query": user_query,
             "predicted_intent": predicted_intent,
             "top_k": top_k,
             "retrieved_utterances": [
                 {
-                    "utterance": doc.page_content,
+                    "utterance": snapshot.utterances.get(doc.id, doc.page_content),
                     "intent": doc.metadata["intent"],
+                    "score": score,
                 }
-                for doc in retrieved_docs
+                for doc, score in retrieved_docs
             ],
+            "domain": snapshot.domain,
+            "route": decision.route,
+            "confidence": decision.confidence,
+            "cache": "miss",
         }
 
+    @staticmethod
+    def _retrieval_event(result: dict) -> dict:
+        """A result without its predicted intent, as sent ahead of the LLM's answer."""
+        return {key: value for key, value in result.items() if key != "predicted_intent"}
+
+    def _embedding_unavailable(self, e: Exception) -> bool:
+        """
+        Whether retrieval may go on with BM25 alone after e: embedding the
+        query failed (or its provider's circuit breaker is open) and
+        LOCAL_FALLBACK is on.
+        """
+        if not LOCAL_FALLBACK or getattr(e, "failed_stage", None) != "embed":
+            return False
+        logger.warning("Embedding provider unavailable, retrieving with BM25 only: %s", e)
+        return True
+
+    @staticmethod
+    def _can_fall_back(decision: RoutingDecision) -> bool:
+        return LOCAL_FALLBACK and decision.intent is not None
+
+    def _fall_back(self, decision: RoutingDecision) -> str:
+        """Answer a query no LLM provider could take with the retrieval vote."""
+        decision.route = "fallback"
+        with self._stats_lock:
+            self._route_counts["llm_fallback"] += 1
+        return decision.intent
+
+    @staticmethod
+    def _cacheable(decision: RoutingDecision) -> bool:
+        """Degraded results are not cached, so they stop once the providers recover."""
+        return decision.route != "fallback" and not decision.lexical_only
+
+    def _cache_put(
+        self,
+        snapshot: CorpusSnapshot,
+        user_query: str,
+        top_k: int,
+        result: dict,
+        query_embedding: list[float] | None,
+        decision: RoutingDecision,
+    ) -> None:
+        if (
+            snapshot.response_cache is not None
+            and snapshot is self._snapshots.get(snapshot.domain)
+            and self._cacheable(decision)
+        ):
+            with stage("cache_put"):
+                snapshot.response_cache.put(user_query, top_k, result, query_embedding)
+
+    def _validate_answer(self, snapshot: CorpusSnapshot, answer: str, decision: RoutingDecision) -> str:
+        """
+        The known intent the LLM answered, or the retrieval vote's intent if the
+        answer names no known intent. Counts the query as answered by the LLM.
+
+        Raises:
+            InvalidAnswerError: The answer names no known intent and retrieval
+                found no candidates to vote on.
+        """
+        intent = snapshot.prompt_builder.validate(answer)
+        with self._stats_lock:
+            self._route_counts["llm"] += 1
+        if intent is None:
+            with self._stats_lock:
+                self._route_counts["llm_invalid"] += 1
+            if decision.intent is None:
+                raise InvalidAnswerError(f"LLM answered {answer.strip()[:100]!r}, which is not a known intent")
+            return decision.intent
+        return intent
+
 
 # Singleton instance
 _classifier: RAGIntentClassifier | None = None
+_classifier_lock = threading.Lock()
 
 
 def get_classifier() -> RAGIntentClassifier:
-    """Get or create the singleton RAGIntentClassifier instance."""
+    """
+    Get or create the singleton RAGIntentClassifier instance.
+
+    Thread-safe: concurrent first callers wait for a single initialization.
+    """
     global _classifier
     if _classifier is None:
-        _classifier = RAGIntentClassifier()
-        _classifier.initialize()
+        with _classifier_lock:
+            if _classifier is None:
+                classifier = RAGIntentClassifier()
+                classifier.initialize()
+                _classifier = classifier
     return _classifier
+
+
+def set_classifier(classifier: RAGIntentClassifier) -> None:
+    """Install an initialized classifier as the singleton, e.g. one built over a benchmark corpus."""
+    global _classifier
+    with _classifier_lock:
+        _classifier = classifier
+
+
+def is_classifier_ready() -> bool:
+    """True once the singleton has been created and initialized."""
+    return _classifier is not None and _classifier.is_initialized
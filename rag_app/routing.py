@@ -0,0 +1,89 @@
+"""
+Confidence routing: decide whether retrieval alone is enough to classify a
+query, and which domain's corpus to classify it against.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from rag_app.local_model import LocalIntentModel
+
+# Rank discount used for rank-only votes, matching reciprocal rank fusion
+RRF_C = 60
+
+
+@dataclass
+class RoutingDecision:
+    """Majority intent of the retrieved utterances and how decisively it won."""
+    intent: Optional[str]
+    confidence: float
+    margin: float
+    # Set by the classifier: "local", "fast_path", "llm" or "fallback"
+    route: str = "llm"
+    # Set by the classifier when retrieval used BM25 alone
+    lexical_only: bool = False
+
+    def is_confident(self, min_confidence: float, min_margin: float) -> bool:
+        return (
+            self.intent is not None
+            and self.confidence >= min_confidence
+            and self.margin >= min_margin
+        )
+
+
+def vote_intents(intents: list[str], scores: Optional[list[float]] = None) -> RoutingDecision:
+    """
+    Weighted intent vote over ranked retrieval results.
+
+    Each result votes for its intent with its score, or with 1 / (RRF_C + rank)
+    when no scores are given. confidence is the winning intent's share of the
+    total vote and margin is the gap to the runner-up as a share of the total.
+    """
+    if not intents:
+        return RoutingDecision(intent=None, confidence=0.0, margin=0.0)
+
+    if scores is None:
+        scores = [1.0 / (RRF_C + rank) for rank in range(1, len(intents) + 1)]
+
+    votes: dict[str, float] = defaultdict(float)
+    for intent, score in zip(intents, scores):
+        votes[intent] += max(score, 0.0)
+
+    total = sum(votes.values())
+    if total <= 0:
+        return RoutingDecision(intent=intents[0], confidence=0.0, margin=0.0)
+
+    ranked = sorted(votes.items(), key=lambda item: item[1], reverse=True)
+    top_intent, top_vote = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+    return RoutingDecision(
+        intent=top_intent,
+        confidence=top_vote / total,
+        margin=(top_vote - runner_up) / total,
+    )
+
+
+class DomainRouter:
+    """
+    Picks the domain of a query that names none.
+
+    A LocalIntentModel is trained with each utterance labelled by its domain
+    instead of its intent, so routing is one sparse product per batch of
+    queries and makes no network calls.
+    """
+
+    def __init__(self, documents_by_domain: dict[str, list[Document]]):
+        self.domains = sorted(documents_by_domain)
+        self._model = LocalIntentModel([
+            Document(page_content=doc.page_content, metadata={"intent": domain})
+            for domain, documents in documents_by_domain.items()
+            for doc in documents
+        ])
+
+    def route(self, texts: list[str]) -> list[str]:
+        """The most likely domain of each text."""
+        return [prediction.intent for prediction in self._model.predict_batch(texts)]
@@ -0,0 +1,262 @@
+"""
+Pre-fork production server for the RAG intent classifier.
+
+The parent process loads the documents and indexes once, binds the listening
+socket and forks worker processes that serve the FastAPI app on it. Workers
+share the parent's classifier copy-on-write (and the NumPy backend's
+memory-mapped embeddings through the page cache), so adding workers neither
+multiplies startup embedding cost nor index memory. Provider clients are not
+shared: the parent creates no LLM clients, and each worker drops the
+embedding clients the parent used for indexing and creates its own.
+
+Chroma's client does not survive a fork, so with the Chroma backend the parent
+never opens it: it syncs the persisted index in a short-lived
+`rag_app.build_index` subprocess, and each worker loads its own classifier
+from that index after the fork. The workers then share nothing, so use
+VECTOR_BACKEND=numpy to get the memory sharing described above.
+
+Signals sent to the parent:
+    SIGHUP           reload the intent data, then replace workers one by one
+    SIGTERM, SIGINT  stop workers gracefully and exit
+
+Workers forward POST /admin/reload to the parent as SIGHUP, and with
+CORPUS_WATCH_INTERVAL set the parent also reloads when the data file changes.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import uvicorn
+
+from rag_app.config import (
+    CLASSIFIER_MODE,
+    ClassifierMode,
+    CORPUS_WATCH_INTERVAL,
+    FASTAPI_HOST,
+    FASTAPI_PORT,
+    SERVER_WORKERS,
+    SERVER_GRACEFUL_TIMEOUT,
+    VECTOR_BACKEND,
+    VectorBackend,
+)
+from rag_app import api
+from rag_app.failover import reset_provider_clients
+from rag_app.rag_chain import get_classifier
+from rag_app.vector_store import domains_signature
+
+logger = logging.getLogger("rag_app.serve")
+
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _uses_chroma() -> bool:
+    return VECTOR_BACKEND == VectorBackend.CHROMA and CLASSIFIER_MODE != ClassifierMode.LOCAL
+
+
+def _sync_chroma_index() -> None:
+    """Embed new utterances into the persisted Chroma index without opening Chroma in this process."""
+    subprocess.run([sys.executable, "-m", "rag_app.build_index"], check=True)
+
+
+def _run_worker(sock: socket.socket, graceful_timeout: float) -> None:
+    """Worker process body: serve the app on the inherited socket until told to stop."""
+    for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+
+    # Reload requests received by this worker go to the parent
+    api.prefork_parent_pid = os.getppid()
+    # Connection pools are not fork-safe; this worker opens its own
+    reset_provider_clients()
+
+    config = uvicorn.Config(
+        "rag_app.api:app",
+        lifespan="on",
+        timeout_graceful_shutdown=graceful_timeout,
+        log_config=None,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class PreforkServer:
+    """Parent process that keeps `workers` forked uvicorn workers alive on one socket."""
+
+    def __init__(self, host: str, port: int, workers: int, graceful_timeout: float):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self._sock: socket.socket | None = None
+        self._children: set[int] = set()
+        self._stopping = False
+        self._restart_requested = False
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self._sock, self.graceful_timeout)
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self._children.add(pid)
+        logger.info("Started worker %d", pid)
+        return pid
+
+    def _stop_workers(self, pids: list[int]) -> None:
+        """SIGTERM workers and wait for them, killing any still running after graceful_timeout."""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        remaining = set(pids)
+        deadline = time.monotonic() + self.graceful_timeout + 1
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        remaining.discard(pid)
+                except ChildProcessError:
+                    remaining.discard(pid)
+            time.sleep(0.05)
+
+        for pid in remaining:
+            logger.warning("Worker %d did not stop in time, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._children.difference_update(pids)
+
+    def _reap(self) -> None:
+        """Collect exited workers, replacing any that died unexpectedly."""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self._children:
+                self._children.discard(pid)
+                if not self._stopping:
+                    logger.warning("Worker %d exited with status %d, replacing it", pid, status)
+                    self._spawn()
+
+    def _graceful_restart(self) -> None:
+        """Reload the corpus in the parent (or sync the Chroma index), then replace workers one at a time."""
+        try:
+            if _uses_chroma():
+                _sync_chroma_index()
+                logger.info("Chroma index synced with the intent data")
+            else:
+                change = get_classifier().reload()
+                if change:
+                    logger.info("Intent data reloaded: %d added, %d removed", len(change.added), len(change.removed))
+                else:
+                    logger.info("Intent data unchanged")
+        except Exception:
+            logger.exception("Reload failed, restarting workers with the current indexes")
+
+        gc.freeze()
+        for old_pid in list(self._children):
+            self._spawn()
+            self._stop_workers([old_pid])
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _handle_hup(self, signum, frame) -> None:
+        self._restart_requested = True
+
+    def run(self) -> None:
+        started = time.monotonic()
+        if _uses_chroma():
+            if self.workers > 1:
+                logger.warning(
+                    "VECTOR_BACKEND=chroma: each of the %d workers loads its own classifier; "
+                    "set VECTOR_BACKEND=numpy to share one copy", self.workers,
+                )
+            # Workers load the classifier themselves, from the synced index
+            _sync_chroma_index()
+            logger.info("Chroma index synced in %.1fs", time.monotonic() - started)
+        else:
+            get_classifier()
+            logger.info("Classifier loaded in %.1fs", time.monotonic() - started)
+
+        self._sock = _bind(self.host, self.port)
+        # Keep the loaded objects out of GC bookkeeping so workers don't copy their pages
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_hup)
+
+        for _ in range(self.workers):
+            self._spawn()
+        logger.info("Serving on %s:%d with %d workers", self.host, self.port, self.workers)
+
+        signatures = domains_signature()
+        next_check = time.monotonic() + CORPUS_WATCH_INTERVAL
+        try:
+            while not self._stopping:
+                if CORPUS_WATCH_INTERVAL > 0 and time.monotonic() >= next_check:
+                    next_check = time.monotonic() + CORPUS_WATCH_INTERVAL
+                    current = domains_signature()
+                    if None not in current.values() and current != signatures:
+                        signatures = current
+                        self._restart_requested = True
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self._graceful_restart()
+                self._reap()
+                time.sleep(0.2)
+        finally:
+            self._stopping = True
+            self._stop_workers(list(self._children))
+            self._sock.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the pre-fork server."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=FASTAPI_HOST)
+    parser.add_argument("--port", type=int, default=FASTAPI_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Number of worker processes")
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=SERVER_GRACEFUL_TIMEOUT,
+        help="Seconds a stopping worker may spend finishing in-flight requests",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    if not hasattr(os, "fork"):
+        sys.exit("rag_app.serve needs os.fork(); use `python -m rag_app.api` on this platform")
+
+    PreforkServer(args.host, args.port, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,20 @@
 """Streamlit UI for the RAG Intent Classifier."""
 
+import io
+import json
+
+import pandas as pd
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Rows sent per /classify/batch request in bulk mode
+BULK_CHUNK_SIZE = 256
+# Seconds to wait for one chunk; the LLM may be called for every row in it
+BULK_CHUNK_TIMEOUT = 300
+# Seconds Streamlit keeps cached chunk results
+BULK_CACHE_TTL = 3600
 
 st.set_page_config(
     page_title="RAG Intent Classifier",
@@ -27,6 +40,12 @@ top_k = st.sidebar.slider(
     help="Number of top matching utterances to retrieve using hybrid search (BM25 + Vector)",
 )
 
+domain = st.sidebar.text_input(
+    "Intent Domain",
+    value="",
+    help="Domain to classify against; leave empty to let the API route each query",
+).strip() or None
+
 st.sidebar.markdown("---")
 st.sidebar.markdown(
     """
@@ -41,75 +60,230 @@ st.sidebar.markdown(
     """
 )
 
+def stream_events(response: requests.Response):
+    """Parse a Server-Sent Events response into (event, data) pairs."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def show_retrieved(data: dict) -> None:
+    st.subheader(f"Top {data['top_k']} Retrieved Utterance(s)")
+
+    for i, item in enumerate(data["retrieved_utterances"], 1):
+        with st.container():
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**{i}.** {item['utterance']}")
+            with col2:
+                st.markdown(f"Intent: `{item['intent']}`")
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    """One pooled HTTP session shared by all reruns and users, so connections to the API are reused."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[503], allowed_methods=["POST"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(show_spinner=False)
+def load_table(data: bytes, file_name: str) -> pd.DataFrame:
+    """Parse an uploaded CSV or Parquet file."""
+    if file_name.lower().endswith(".parquet"):
+        return pd.read_parquet(io.BytesIO(data))
+    return pd.read_csv(io.BytesIO(data))
+
+
+@st.cache_data(show_spinner=False, ttl=BULK_CACHE_TTL, max_entries=10_000)
+def classify_chunk(api_url: str, queries: tuple[str, ...], top_k: int, domain: str | None) -> list[dict]:
+    """
+    Classify one chunk of queries with /classify/batch.
+
+    Returns one {"predicted_intent", "domain", "route", "confidence", "error"}
+    dict per query. Cached by its arguments, so relabelling a file does not
+    call the API again; label_table() evicts chunks with failed rows.
+    """
+    response = http_session().post(
+        f"{api_url.rstrip('/')}/classify/batch",
+        json={"queries": list(queries), "top_k": top_k, "domain": domain},
+        timeout=BULK_CHUNK_TIMEOUT,
+    )
+    response.raise_for_status()
+    labels = []
+    for item in response.json()["results"]:
+        result = item.get("result") or {}
+        labels.append({
+            "predicted_intent": result.get("predicted_intent"),
+            "domain": result.get("domain"),
+            "route": result.get("route"),
+            "confidence": result.get("confidence"),
+            "error": item.get("error"),
+        })
+    return labels
+
+
+def label_table(df: pd.DataFrame, column: str, api_url: str, top_k: int, domain: str | None) -> pd.DataFrame:
+    """
+    Add the predicted intent of every row's `column` text to df.
+
+    Distinct texts are classified once, in chunks of BULK_CHUNK_SIZE, with a
+    progress bar.
+    """
+    texts = df[column].fillna("").astype(str)
+    unique = [text for text in texts.unique() if text.strip()]
+    labels: dict[str, dict] = {}
+
+    progress = st.progress(0.0, text=f"Classifying {len(unique)} distinct utterances...")
+    for start in range(0, len(unique), BULK_CHUNK_SIZE):
+        chunk = tuple(unique[start:start + BULK_CHUNK_SIZE])
+        try:
+            chunk_labels = classify_chunk(api_url, chunk, top_k, domain)
+        except requests.exceptions.RequestException as e:
+            # Exceptions are not cached, so a rerun retries just the failed chunks
+            chunk_labels = [{"error": str(e)}] * len(chunk)
+        else:
+            if any(label["error"] for label in chunk_labels):
+                classify_chunk.clear(api_url, chunk, top_k, domain)
+        labels.update(zip(chunk, chunk_labels))
+        done = min(start + BULK_CHUNK_SIZE, len(unique))
+        progress.progress(done / len(unique), text=f"Classified {done} of {len(unique)} distinct utterances")
+    progress.empty()
+
+    labelled = df.copy()
+    for field in ("predicted_intent", "domain", "route", "confidence", "error"):
+        labelled[field] = [labels.get(text, {}).get(field) for text in texts]
+    return labelled
+
+
+def to_download(df: pd.DataFrame, file_name: str) -> tuple[bytes, str, str]:
+    """The labelled table in the uploaded file's format: (data, file name, MIME type)."""
+    stem, _, extension = file_name.rpartition(".")
+    if extension.lower() == "parquet":
+        return df.to_parquet(index=False), f"{stem}_labelled.parquet", "application/vnd.apache.parquet"
+    return df.to_csv(index=False).encode("utf-8"), f"{stem or file_name}_labelled.csv", "text/csv"
+
+
 # Main content
 st.title("Hybrid RAG Intent Classifier")
-st.markdown(
-    "Enter a query below to classify its intent using hybrid search "
-    "(BM25 + Vector similarity) over utterance-intent pairs."
-)
+single_tab, bulk_tab = st.tabs(["Single query", "Bulk labelling"])
 
-# Query input
-user_query = st.text_input(
-    "Enter your query:",
-    placeholder="e.g., I want to check how much money is in my account",
-)
+with single_tab:
+    st.markdown(
+        "Enter a query below to classify its intent using hybrid search "
+        "(BM25 + Vector similarity) over utterance-intent pairs."
+    )
 
-if st.button("Classify Intent", type="primary", disabled=not user_query):
-    if not user_query.strip():
-        st.warning("Please enter a query.")
-    else:
-        with st.spinner("Classifying intent..."):
+    # Query input
+    user_query = st.text_input(
+        "Enter your query:",
+        placeholder="e.g., I want to check how much money is in my account",
+    )
+
+    if st.button("Classify Intent", type="primary", disabled=not user_query):
+        if not user_query.strip():
+            st.warning("Please enter a query.")
+        else:
+            # Filled in as the streamed answer arrives; retrieval results show up first
+            intent_placeholder = st.empty()
+            intent_placeholder.info("Classifying intent...")
             try:
-                response = requests.post(
-                    f"{api_url.rstrip('/')}/classify",
-                    json={"query": user_query, "top_k": top_k},
+                response = http_session().post(
+                    f"{api_url.rstrip('/')}/classify/stream",
+                    json={"query": user_query, "top_k": top_k, "domain": domain},
+                    stream=True,
                     timeout=30,
                 )
 
                 if response.status_code == 200:
-                    data = response.json()
-
-                    # Display predicted intent
-                    st.success(f"**Predicted Intent:** `{data['predicted_intent']}`")
-
-                    # Display retrieved utterances
-                    st.subheader(f"Top {data['top_k']} Retrieved Utterance(s)")
-
-                    for i, item in enumerate(data["retrieved_utterances"], 1):
-                        with st.container():
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                st.markdown(f"**{i}.** {item['utterance']}")
-                            with col2:
-                                st.markdown(f"Intent: `{item['intent']}`")
+                    answer = ""
+                    for event, data in stream_events(response):
+                        if event == "retrieval":
+                            show_retrieved(data)
+                        elif event == "token":
+                            answer += data["text"]
+                            intent_placeholder.info(f"**Predicted Intent:** `{answer}`")
+                        elif event == "result":
+                            # Display predicted intent
+                            intent_placeholder.success(f"**Predicted Intent:** `{data['predicted_intent']}`")
+                        elif event == "error":
+                            intent_placeholder.error(f"API Error: {data.get('detail', 'Unknown error')}")
                 else:
+                    intent_placeholder.empty()
                     st.error(
                         f"API Error (HTTP {response.status_code}): "
                         f"{response.json().get('detail', 'Unknown error')}"
                     )
             except requests.exceptions.ConnectionError:
+                intent_placeholder.empty()
                 st.error(
                     f"Cannot connect to the API at `{api_url}`. "
                     "Make sure the FastAPI backend is running."
                 )
             except requests.exceptions.Timeout:
+                intent_placeholder.empty()
                 st.error("Request timed out. Please try again.")
             except Exception as e:
+                intent_placeholder.empty()
                 st.error(f"An unexpected error occurred: {e}")
 
-# Example queries section
-with st.expander("Example Queries"):
-    examples = [
-        "I want to check how much money is in my account",
-        "Can you help me cancel my recent purchase?",
-        "My app keeps crashing, what should I do?",
-        "I'd like to schedule a meeting for tomorrow",
-        "Hello, how are you doing today?",
-        "I need to get my money back for this order",
-        "Where is my package right now?",
-        "I forgot my login password",
-        "Tell me about the products you sell",
-        "I'm really unhappy with your service",
-    ]
-    for ex in examples:
-        st.code(ex, language=None)
+    # Example queries section
+    with st.expander("Example Queries"):
+        examples = [
+            "I want to check how much money is in my account",
+            "Can you help me cancel my recent purchase?",
+            "My app keeps crashing, what should I do?",
+            "I'd like to schedule a meeting for tomorrow",
+            "Hello, how are you doing today?",
+            "I need to get my money back for this order",
+            "Where is my package right now?",
+            "I forgot my login password",
+            "Tell me about the products you sell",
+            "I'm really unhappy with your service",
+        ]
+        for ex in examples:
+            st.code(ex, language=None)
+
+with bulk_tab:
+    st.markdown(
+        "Upload a CSV or Parquet file to label every row's utterance. Rows are sent "
+        f"to the batch endpoint {BULK_CHUNK_SIZE} at a time and repeated utterances "
+        "are classified once."
+    )
+    uploaded = st.file_uploader("Utterances file", type=["csv", "parquet"])
+    if uploaded is not None:
+        try:
+            table = load_table(uploaded.getvalue(), uploaded.name)
+        except Exception as e:
+            st.error(f"Could not read `{uploaded.name}`: {e}")
+            table = None
+
+        if table is not None:
+            text_columns = [name for name in table.columns if pd.api.types.is_string_dtype(table[name])] or list(table.columns)
+            column = st.selectbox("Utterance column", text_columns)
+            st.caption(f"{len(table)} rows")
+            st.dataframe(table.head(20), use_container_width=True)
+
+            if st.button("Label File", type="primary"):
+                try:
+                    st.session_state["labelled"] = (uploaded.name, label_table(table, column, api_url, top_k, domain))
+                except Exception as e:
+                    st.error(f"An unexpected error occurred: {e}")
+
+            labelled_name, labelled = st.session_state.get("labelled", (None, None))
+            if labelled is not None and labelled_name == uploaded.name:
+                failed = int(labelled["error"].notna().sum())
+                if failed:
+                    st.warning(f"{failed} rows could not be classified; see the `error` column.")
+                st.dataframe(labelled, use_container_width=True)
+                data, file_name, mime = to_download(labelled, uploaded.name)
+                st.download_button("Download Labelled File", data=data, file_name=file_name, mime=mime)
@@ -0,0 +1,59 @@
+"""Test settings: the numpy vector backend and local embeddings, with no API keys or network calls."""
+
+import json
+import os
+
+import pytest
+
+# Set before rag_app.config is first imported, which reads the environment once
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.pop("GOOGLE_API_KEY", None)
+os.environ["CLASSIFIER_MODE"] = "local"
+os.environ["VECTOR_BACKEND"] = "numpy"
+os.environ["INDEX_LOAD_MODE"] = "sync"
+
+INTENTS = [
+    {"intent": "check_balance", "utterances": ["what is my balance", "show my account balance", "how much money do I have"]},
+    {"intent": "transfer_money", "utterances": ["transfer money to savings", "send money to my friend", "move funds between accounts"]},
+    {"intent": "order_status", "utterances": ["where is my order", "track my package", "has my order shipped"]},
+]
+
+
+@pytest.fixture
+def write_intents(tmp_path):
+    """Write intent data to a JSON file in tmp_path and return its path."""
+
+    def write(data: list[dict] = INTENTS, name: str = "intents.json") -> str:
+        path = tmp_path / name
+        path.write_text(json.dumps(data))
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def make_classifier(tmp_path):
+    """
+    Build an initialized RAG classifier answering with a fake LLM, over a data
+    file or over several domains given as {name: data file}.
+    """
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from rag_app.config import DEFAULT_DOMAIN, ClassifierMode
+    from rag_app.rag_chain import RAGIntentClassifier
+    from rag_app.vector_store import Domain
+
+    def make(data_file: str | dict[str, str], answer: str = "check_balance") -> RAGIntentClassifier:
+        data_files = data_file if isinstance(data_file, dict) else {DEFAULT_DOMAIN: data_file}
+        classifier = RAGIntentClassifier(
+            mode=ClassifierMode.RAG,
+            llm=FakeListChatModel(responses=[answer]),
+            domains=[
+                Domain(name=name, data_file=path, index_dir=str(tmp_path / "index" / name))
+                for name, path in data_files.items()
+            ],
+        )
+        classifier.initialize()
+        return classifier
+
+    return make
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from rag_app.admission import AdmissionControlMiddleware, AdmissionController
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def slow(request):
+    await asyncio.sleep(float(request.query_params.get("delay", "0.2")))
+    return JSONResponse({"status": "ok"})
+
+
+async def stream(request):
+    async def lines():
+        yield "first\n"
+        await asyncio.sleep(0.2)
+        yield "last\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _client(controller: AdmissionController) -> httpx.AsyncClient:
+    app = Starlette(routes=[Route("/classify", slow), Route("/classify/stream", stream)])
+    app = AdmissionControlMiddleware(app, controller, path_prefix="/classify")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _occupy(client: httpx.AsyncClient, controller: AdmissionController) -> asyncio.Task:
+    """Start a slow request and wait until it holds an in-flight slot."""
+    task = asyncio.create_task(client.get("/classify", params={"delay": "0.3"}))
+    while controller.in_flight == 0:
+        await asyncio.sleep(0.01)
+    return task
+
+
+async def test_full_queue_is_rejected_with_429():
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    async with _client(controller) as client:
+        running = await _occupy(client, controller)
+
+        response = await client.get("/classify")
+
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+        assert (await running).status_code == 200
+    assert controller.stats()["rejected_queue_full"] == 1
+
+
+async def test_request_that_cannot_meet_its_deadline_is_rejected_with_503():
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    controller.service_time = 1.0
+    async with _client(controller) as client:
+        running = await _occupy(client, controller)
+
+        response = await client.get("/classify", headers={"X-Request-Timeout": "0.1"})
+
+        assert response.status_code == 503
+        assert (await running).status_code == 200
+    assert controller.stats()["rejected_deadline"] == 1
+
+
+async def test_deadline_before_the_response_starts_returns_504():
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    async with _client(controller) as client:
+        response = await client.get("/classify", params={"delay": "1"}, headers={"X-Request-Timeout": "0.05"})
+
+    assert response.status_code == 504
+    assert controller.stats()["cancelled_deadline"] == 1
+    assert controller.in_flight == 0
+
+
+async def test_deadline_does_not_cut_a_started_stream():
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    async with _client(controller) as client:
+        response = await client.get("/classify/stream", headers={"X-Request-Timeout": "0.05"})
+
+    assert response.status_code == 200
+    assert response.text == "first\nlast\n"
+    assert controller.stats()["cancelled_deadline"] == 0
@@ -0,0 +1,199 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from rag_app import api, rag_chain
+from rag_app.failover import FailoverLLM
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def client():
+    # ASGITransport does not run the lifespan, so nothing initializes the classifier on its own
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
+
+
+@pytest.fixture
+def serving(monkeypatch):
+    """Install a classifier as the singleton, as the startup initialization would."""
+
+    def serve(classifier):
+        monkeypatch.setattr(rag_chain, "_classifier", classifier)
+        return classifier
+
+    monkeypatch.setattr(rag_chain, "_classifier", None)
+    monkeypatch.setattr(api, "_startup_error", None)
+    return serve
+
+
+@pytest.fixture
+def initializations(monkeypatch):
+    """Calls to get_classifier() made by the API, which fail like a broken startup."""
+    calls = []
+
+    def get_classifier():
+        calls.append(1)
+        raise RuntimeError("intent data missing")
+
+    monkeypatch.setattr(api, "get_classifier", get_classifier)
+    return calls
+
+
+NOT_READY_REQUESTS = [
+    ("POST", "/classify", {"json": {"query": "what is my balance"}}),
+    ("GET", "/classify", {"params": {"query": "what is my balance"}}),
+    ("POST", "/classify/stream", {"json": {"query": "what is my balance"}}),
+    ("POST", "/classify/batch", {"json": {"queries": ["what is my balance"]}}),
+    (
+        "POST",
+        "/classify/batch",
+        {"content": b'"what is my balance"\n', "headers": {"Content-Type": "application/x-ndjson"}},
+    ),
+    ("GET", "/stats", {}),
+]
+
+
+@pytest.mark.parametrize("method, path, kwargs", NOT_READY_REQUESTS)
+async def test_requests_get_503_while_initializing(client, serving, initializations, method, path, kwargs):
+    async with client:
+        response = await client.request(method, path, **kwargs)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(api.NOT_READY_RETRY_AFTER)
+    assert response.json()["detail"] == "Classifier is initializing"
+    assert initializations == []
+
+
+async def test_failed_startup_is_recorded_and_not_retried_per_request(client, serving, initializations):
+    await api._warm_up()
+
+    async with client:
+        ready = await client.get("/ready")
+        response = await client.post("/classify", json={"query": "what is my balance"})
+
+    assert ready.status_code == 503
+    assert ready.json() == {"status": "failed", "detail": "intent data missing"}
+    assert response.status_code == 503
+    assert "intent data missing" in response.json()["detail"]
+    assert initializations == [1]
+
+
+async def test_requests_are_served_once_ready(client, serving, write_intents, make_classifier):
+    serving(make_classifier(write_intents()))
+
+    async with client:
+        ready = await client.get("/ready")
+        response = await client.post("/classify", json={"query": "what is my balance"})
+
+    assert ready.status_code == 200
+    assert response.status_code == 200
+    assert response.json()["predicted_intent"] == "check_balance"
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    """Parse a Server-Sent Events body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def test_stream_sends_retrieval_then_tokens_then_the_result(client, serving, write_intents, make_classifier):
+    serving(make_classifier(write_intents(), answer="check_balance"))
+
+    async with client:
+        response = await client.get("/classify/stream", params={"query": "what is my balance"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    names = [event for event, _ in events]
+    assert names[0] == "retrieval" and names[-1] == "result"
+    assert set(names[1:-1]) == {"token"}
+    assert "".join(data["text"] for event, data in events if event == "token") == "check_balance"
+    assert "predicted_intent" not in events[0][1]
+    assert events[0][1]["retrieved_utterances"]
+    assert events[-1][1]["predicted_intent"] == "check_balance"
+    assert events[-1][1]["query"] == "what is my balance"
+
+
+async def test_stream_reports_a_failure_after_the_first_token_as_an_error_event(
+    client, serving, write_intents, make_classifier, monkeypatch
+):
+    async def astream(self, messages, candidates):
+        yield "check"
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(FailoverLLM, "astream", astream)
+    serving(make_classifier(write_intents()))
+
+    async with client:
+        response = await client.post("/classify/stream", json={"query": "what is my balance"})
+
+    assert response.status_code == 200
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["retrieval", "token", "error"]
+    assert events[1][1] == {"text": "check"}
+    assert events[2][1] == {"status": 502, "detail": "llm failed: connection reset"}
+
+
+async def test_classifier_serves_requests_from_several_event_loops(write_intents, make_classifier, monkeypatch):
+    monkeypatch.setattr(rag_chain, "MAX_OUTBOUND_CONCURRENCY", 1)
+    classifier = make_classifier(write_intents())
+
+    async def classify_with_a_waiter():
+        # A task waiting on the outbound semaphore binds it to the running loop
+        semaphore = classifier._outbound
+        async with semaphore:
+            waiter = asyncio.create_task(semaphore.acquire())
+            await asyncio.sleep(0)
+        await waiter
+        semaphore.release()
+        return (await classifier.aquery("what is my balance"))["predicted_intent"]
+
+    assert await classify_with_a_waiter() == "check_balance"
+    assert await asyncio.to_thread(asyncio.run, classify_with_a_waiter()) == "check_balance"
+
+
+async def test_json_batch_returns_one_item_per_query(client, serving, write_intents, make_classifier):
+    serving(make_classifier(write_intents()))
+
+    async with client:
+        response = await client.post("/classify/batch", json={"queries": ["what is my balance", "track my package"]})
+        empty = await client.post("/classify/batch", json={"queries": []})
+
+    assert response.status_code == 200
+    items = response.json()["results"]
+    assert [item["index"] for item in items] == [0, 1]
+    assert [item["result"]["query"] for item in items] == ["what is my balance", "track my package"]
+    assert empty.status_code == 422
+
+
+async def test_ndjson_batch_streams_results_chunk_by_chunk(client, serving, write_intents, make_classifier, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_CHUNK_SIZE", 2)
+    serving(make_classifier(write_intents()))
+    body = b'"what is my balance"\n{"query": "track my package"}\nnot json\n\n{"text": "missing"}\n"send money"'
+
+    async with client:
+        response = await client.post(
+            "/classify/batch", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["index"] for item in items] == [0, 1, 2, 3, 4]
+    assert items[0]["result"]["query"] == "what is my balance"
+    assert items[1]["result"]["query"] == "track my package"
+    assert items[2]["error"].startswith("Invalid NDJSON line") and "result" not in items[2]
+    assert items[3]["error"].startswith("Invalid NDJSON line")
+    assert items[4]["result"]["query"] == "send money"
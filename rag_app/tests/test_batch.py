@@ -0,0 +1,61 @@
+import pytest
+
+from rag_app.failover import FailoverLLM
+
+
+def test_results_follow_the_input_order_and_match_single_queries(write_intents, make_classifier):
+    queries = ["track my package", "what is my balance", "send money to my friend"]
+
+    batch = make_classifier(write_intents()).query_batch(queries, top_k=2)
+    single = make_classifier(write_intents())
+
+    for query, result in zip(queries, batch):
+        expected = single.query(query, top_k=2)
+        assert result["query"] == query
+        assert result["predicted_intent"] == expected["predicted_intent"]
+        assert result["route"] == expected["route"]
+        assert [item["utterance"] for item in result["retrieved_utterances"]] == [
+            item["utterance"] for item in expected["retrieved_utterances"]
+        ]
+
+
+def test_duplicate_queries_are_classified_once(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+
+    results = classifier.query_batch(["what is my balance", "What is  my BALANCE", "track my package"])
+
+    assert [result["query"] for result in results] == ["what is my balance", "What is  my BALANCE", "track my package"]
+    assert results[0]["predicted_intent"] == results[1]["predicted_intent"]
+    assert classifier.stats()["routing"]["llm"] == 2
+
+
+def test_a_failed_query_is_an_item_error(write_intents, make_classifier, monkeypatch):
+    invoke = FailoverLLM.invoke
+
+    def fail_on_packages(self, messages, candidates):
+        if "package" in messages[-1].content:
+            raise RuntimeError("provider returned garbage")
+        return invoke(self, messages, candidates)
+
+    monkeypatch.setattr(FailoverLLM, "invoke", fail_on_packages)
+    classifier = make_classifier(write_intents())
+
+    ok, failed = classifier.query_batch(["what is my balance", "track my package"])
+
+    assert ok["predicted_intent"] == "check_balance"
+    assert failed == {"query": "track my package", "error": "provider returned garbage"}
+
+
+def test_repeated_batches_are_served_from_the_response_cache(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+    classifier.query_batch(["what is my balance", "track my package"])
+
+    results = classifier.query_batch(["track my package", "what is my balance"])
+
+    assert [result["cache"] for result in results] == ["exact", "exact"]
+    assert classifier.stats()["routing"]["llm"] == 2
+
+
+def test_unknown_domain_fails_the_whole_batch(write_intents, make_classifier):
+    with pytest.raises(ValueError, match="Unknown domain"):
+        make_classifier(write_intents()).query_batch(["what is my balance"], domain="travel")
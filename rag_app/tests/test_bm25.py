@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from rag_app.tests.conftest import INTENTS
+from rag_app.vector_store import BM25Index, tokenize
+
+TEXTS = [utterance for intent in INTENTS for utterance in intent["utterances"]]
+QUERIES = ["what is my balance", "send money", "my order", "where is my money", "nothing matches"]
+
+
+def _dense_scores(index: BM25Index, query: str) -> np.ndarray:
+    scores = np.zeros(index.n_docs)
+    doc_ids, doc_scores = index.search(query, index.n_docs)
+    scores[doc_ids] = doc_scores
+    return scores
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_rank_bm25(query):
+    # The implementation BM25Index replaced, as the reference for its scores
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    expected = rank_bm25.BM25Okapi([tokenize(text) for text in TEXTS]).get_scores(tokenize(query))
+
+    np.testing.assert_allclose(_dense_scores(BM25Index(TEXTS), query), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_results_are_ranked_by_score():
+    doc_ids, scores = BM25Index(TEXTS).search("where is my order", 3)
+
+    assert TEXTS[doc_ids[0]] == "where is my order"
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize(
+    "texts",
+    [
+        ["hello world", "!!!"],
+        ["!!!", "hello world"],
+        ["hello", "", "world", "?"],
+        ["!!!", "?"],
+        [],
+    ],
+)
+def test_documents_without_tokens(texts):
+    index = BM25Index(texts)
+
+    doc_ids, _ = index.search("hello world", 5)
+
+    assert index.n_docs == len(texts)
+    assert all(tokenize(texts[i]) for i in doc_ids)
+
+
+@pytest.mark.parametrize(
+    "keep, added",
+    [
+        ([0], ["?"]),
+        ([0, 1], ["", "hello again"]),
+        ([], ["!!!"]),
+        ([1, 0], []),
+    ],
+)
+def test_update_with_documents_without_tokens_matches_a_fresh_build(keep, added):
+    texts = ["hello there", "world peace"]
+    updated = BM25Index(texts).updated(keep, added)
+    fresh = BM25Index([texts[i] for i in keep] + added)
+
+    assert updated.n_docs == fresh.n_docs
+    for query in ["hello", "world peace", "again"]:
+        np.testing.assert_allclose(_dense_scores(updated, query), _dense_scores(fresh, query), rtol=1e-6)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from rag_app import cache as cache_module
+from rag_app.cache import ResponseCache
+
+
+def _result(intent: str, retrieved: tuple[str, ...] = ()) -> dict:
+    return {
+        "predicted_intent": intent,
+        "retrieved_utterances": [{"intent": name} for name in retrieved],
+    }
+
+
+BALANCE = _result("check_balance", ("check_balance",))
+TRANSFER = _result("transfer_money", ("transfer_money", "check_balance"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic() for TTL expiry."""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = ResponseCache(max_size=4)
+    cache.put("What is my balance", 3, BALANCE)
+
+    assert cache.lookup("  what is   my BALANCE ", 3) == (BALANCE, "exact")
+    assert cache.lookup("what is my balance", 5) == (None, "miss")
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_similarity_hit_needs_the_threshold_and_the_same_top_k():
+    cache = ResponseCache(max_size=4, similarity_threshold=0.95)
+    cache.put("what is my balance", 3, BALANCE, embedding=[1.0, 0.0, 0.0])
+
+    assert cache.lookup("my balance please", 3, lambda: [0.99, 0.05, 0.0]) == (BALANCE, "semantic")
+    assert cache.lookup("my balance please", 5, lambda: [0.99, 0.05, 0.0]) == (None, "miss")
+    assert cache.lookup("send money", 3, lambda: [0.5, 0.5, 0.0]) == (None, "miss")
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(max_size=4, ttl_seconds=10)
+    cache.put("what is my balance", 3, BALANCE, embedding=[1.0, 0.0])
+
+    clock[0] += 9
+    assert cache.lookup("what is my balance", 3)[1] == "exact"
+    assert cache.lookup("balance", 3, lambda: [1.0, 0.0])[1] == "semantic"
+
+    clock[0] += 2
+    assert cache.lookup("what is my balance", 3, lambda: [1.0, 0.0]) == (None, "miss")
+
+
+def test_invalidate_intents_drops_predicted_and_retrieved_intents():
+    cache = ResponseCache(max_size=4)
+    cache.put("what is my balance", 3, BALANCE, embedding=[1.0, 0.0])
+    cache.put("send money", 3, TRANSFER, embedding=[0.0, 1.0])
+    cache.put("where is my order", 3, _result("order_status", ("order_status",)), embedding=[0.7, 0.7])
+
+    assert cache.invalidate_intents({"check_balance"}) == 2
+
+    assert cache.lookup("what is my balance", 3, lambda: [1.0, 0.0]) == (None, "miss")
+    assert cache.lookup("send money", 3, lambda: [0.0, 1.0]) == (None, "miss")
+    assert cache.lookup("where is my order", 3)[1] == "exact"
+
+
+def test_slot_reused_during_the_scan_is_not_returned():
+    cache = ResponseCache(max_size=1)
+    cache.put("what is my balance", 3, BALANCE, embedding=[1.0, 0.0])
+
+    class ReusedDuringScan(np.ndarray):
+        """Ring vectors whose only slot is taken over by another put() while they are scanned."""
+
+        def __matmul__(self, other):
+            scores = np.asarray(self) @ other
+            if scores.ndim:
+                cache.put("send money", 3, TRANSFER, embedding=[0.0, 1.0])
+            return scores
+
+    cache._vectors = cache._vectors.view(ReusedDuringScan)
+
+    assert cache.lookup("balance", 3, lambda: [1.0, 0.0]) == (None, "miss")
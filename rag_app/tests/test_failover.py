@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+
+import pytest
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from rag_app import rag_chain
+from rag_app.config import DEFAULT_DOMAIN, LLM_FALLBACK_PROVIDERS, LLM_PROVIDER, ClassifierMode
+from rag_app.failover import (
+    FailoverLLM,
+    GuardedEmbeddings,
+    ProvidersUnavailableError,
+    provider_breaker,
+    reset_provider_clients,
+)
+from rag_app.vector_store import Domain
+
+MESSAGES = [HumanMessage(content="what is my balance")]
+
+# Breakers are registered process-wide by name, so each test gets fresh providers
+_provider_ids = itertools.count()
+
+
+class FailingChatModel(FakeListChatModel):
+    """A provider that is down: every call raises and is counted."""
+
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+
+class StructuredChatModel(FakeListChatModel):
+    """A provider with structured output: answers {"intent": ...} and records the schemas it was given."""
+
+    schemas: list = []
+
+    def with_structured_output(self, schema, **kwargs):
+        self.schemas.append(schema)
+        return RunnableLambda(lambda messages: {"intent": self.responses[0]})
+
+
+def _failover(*llms) -> FailoverLLM:
+    return FailoverLLM([(f"test{next(_provider_ids)}", llm) for llm in llms])
+
+
+def test_fails_over_to_the_next_provider():
+    primary = FailingChatModel(responses=[""])
+    llm = _failover(primary, FakeListChatModel(responses=["check_balance"]))
+
+    assert llm.invoke(MESSAGES, ["check_balance"]) == "check_balance"
+    assert asyncio.run(llm.ainvoke(MESSAGES, ["check_balance"])) == "check_balance"
+    assert primary.calls == 2
+    assert llm.providers[0].breaker.get_stats()["stats"]["failed_calls"] == 2
+
+
+def test_open_breaker_skips_the_provider_without_calling_it():
+    primary = FailingChatModel(responses=[""])
+    llm = _failover(primary, FakeListChatModel(responses=["check_balance"]))
+    llm.providers[0].breaker.force_open()
+
+    assert llm.invoke(MESSAGES, ["check_balance"]) == "check_balance"
+    assert primary.calls == 0
+    assert llm.providers[0].breaker.get_stats()["stats"]["blocked_calls"] == 1
+
+
+def test_no_available_provider_raises():
+    llm = _failover(FailingChatModel(responses=[""]), FailingChatModel(responses=[""]))
+
+    with pytest.raises(ProvidersUnavailableError, match="provider down"):
+        llm.invoke(MESSAGES, ["check_balance"])
+
+
+def test_stream_fails_over_before_the_first_delta():
+    llm = _failover(FailingChatModel(responses=[""]), FakeListChatModel(responses=["check_balance"]))
+
+    async def collect():
+        return "".join([delta async for delta in llm.astream(MESSAGES, ["check_balance"])])
+
+    assert asyncio.run(collect()) == "check_balance"
+
+
+def test_structured_output_constrains_the_answer_to_the_candidates():
+    structured = StructuredChatModel(responses=["transfer_money"])
+    llm = _failover(structured)
+
+    assert llm.providers[0].structured_output
+    assert llm.invoke(MESSAGES, ["check_balance", "transfer_money"]) == "transfer_money"
+    assert structured.schemas[-1]["properties"]["intent"]["enum"] == ["check_balance", "transfer_money"]
+
+
+def test_structured_output_without_candidates_has_no_empty_enum():
+    structured = StructuredChatModel(responses=["transfer_money"])
+    llm = _failover(structured)
+
+    assert llm.invoke(MESSAGES, []) == "transfer_money"
+    assert "enum" not in structured.schemas[-1]["properties"]["intent"]
+
+
+def test_models_without_structured_output_answer_in_plain_text():
+    llm = _failover(FakeListChatModel(responses=["check_balance"]))
+
+    assert not llm.providers[0].structured_output
+    assert llm.invoke(MESSAGES, ["check_balance"]) == "check_balance"
+
+
+def test_embedding_client_is_created_on_first_use_and_after_reset():
+    clients = []
+
+    def factory():
+        clients.append(FakeEmbeddings(size=4))
+        return clients[-1]
+
+    embeddings = GuardedEmbeddings(factory, provider_breaker(f"embeddings.test{next(_provider_ids)}"))
+    assert clients == []
+
+    embeddings.embed_query("one")
+    embeddings.embed_documents(["two"])
+    assert len(clients) == 1
+
+    # As a pre-fork worker does before serving
+    reset_provider_clients()
+    embeddings.embed_query("three")
+    assert len(clients) == 2 and embeddings.embeddings is clients[1]
+
+
+def test_classifier_creates_llm_clients_on_first_use(write_intents, tmp_path, monkeypatch):
+    created = []
+
+    def get_llm(provider):
+        created.append(provider)
+        return FakeListChatModel(responses=["check_balance"])
+
+    monkeypatch.setattr(rag_chain, "_get_llm", get_llm)
+    classifier = rag_chain.RAGIntentClassifier(
+        mode=ClassifierMode.RAG,
+        domains=[Domain(name=DEFAULT_DOMAIN, data_file=write_intents(), index_dir=str(tmp_path / "index"))],
+    )
+    classifier.initialize()
+    classifier.reload()
+    assert created == []
+
+    assert classifier.llm is classifier.llm
+    assert created == [LLM_PROVIDER, *LLM_FALLBACK_PROVIDERS]
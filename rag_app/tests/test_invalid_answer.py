@@ -0,0 +1,40 @@
+import pytest
+
+from rag_app.api import _http_error
+from rag_app.rag_chain import InvalidAnswerError
+from rag_app.vector_store import HybridRetriever
+
+
+@pytest.fixture
+def no_candidates(monkeypatch):
+    """Make retrieval find nothing, so the routing vote has no intent."""
+    monkeypatch.setattr(HybridRetriever, "search", lambda self, query, k=None: [])
+    monkeypatch.setattr(HybridRetriever, "search_batch", lambda self, queries, embeddings, k=None: [[] for _ in queries])
+
+
+def test_invalid_answer_falls_back_to_the_vote(write_intents, make_classifier):
+    classifier = make_classifier(write_intents(), answer="no idea")
+
+    result = classifier.query("what is my balance")
+
+    assert result["predicted_intent"] == "check_balance"
+    assert classifier.stats()["routing"]["llm_invalid"] == 1
+
+
+def test_invalid_answer_without_candidates_raises(write_intents, make_classifier, no_candidates):
+    classifier = make_classifier(write_intents(), answer="no idea")
+
+    with pytest.raises(InvalidAnswerError) as excinfo:
+        classifier.query("what is my balance")
+
+    error = _http_error(excinfo.value)
+    assert error.status_code == 502
+    assert error.headers == {"X-Failed-Stage": "llm"}
+
+
+def test_invalid_answer_without_candidates_is_a_batch_item_error(write_intents, make_classifier, no_candidates):
+    classifier = make_classifier(write_intents(), answer="no idea")
+
+    [result] = classifier.query_batch(["what is my balance"])
+
+    assert "not a known intent" in result["error"]
@@ -0,0 +1,107 @@
+import pytest
+
+from rag_app import vector_store
+from rag_app.normalization import normalize_utterance
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Can you transfer $100 to my friend?", "can you transfer __amount__ to my friend?"),
+        ("transfer  $250 to my   friend?", "transfer __amount__ to my friend?"),
+        ("Loan amount approved is $5,000", "loan amount approved is __amount__"),
+        ("I paid 20 dollars", "i paid __amount__"),
+        ("Cancel order number 12345", "cancel order number __number__"),
+        ("my 401k balance", "my 401k balance"),
+    ],
+)
+def test_normalizes_case_whitespace_amounts_and_numbers(text, expected):
+    assert normalize_utterance(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "Spent $71.75 at LOS POLLOS and $43.43 at QMART. Income Exceeds",
+            "spent __amount__ at __merchant__ and __amount__ at __merchant__. income exceeds",
+        ),
+        ("Paid at Walmart", "paid at __merchant__"),
+        ("refund at Home Depot please", "refund at __merchant__ please"),
+        ("what is my balance at the moment", "what is my balance at the moment"),
+    ],
+)
+def test_masks_capitalized_merchants_after_at(text, expected):
+    assert normalize_utterance(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("TRANSFER MONEY FROM MY SAVINGS ACCOUNT TO CHECKING", "transfer money from my savings account to checking"),
+        ("I AM AT HOME DEPOT", "i am at home depot"),
+        ("PAY $20 AT QMART", "pay __amount__ at qmart"),
+    ],
+)
+def test_all_caps_text_is_not_masked_as_a_merchant(text, expected):
+    assert normalize_utterance(text) == expected
+
+
+def test_is_idempotent():
+    once = normalize_utterance("Spent $71.75 at LOS POLLOS and order 42")
+    assert normalize_utterance(once) == once
+
+
+def test_loaded_utterances_keep_their_original_text(write_intents, monkeypatch):
+    monkeypatch.setattr(vector_store, "QUERY_NORMALIZATION", True)
+    path = write_intents([
+        {"intent": "transfer_money", "utterances": ["Transfer $100 to my friend", "transfer $250 to my friend", "send money"]},
+    ])
+
+    documents = vector_store.load_intent_data(path)
+
+    # Utterances differing only in masked values become one document
+    assert [doc.page_content for doc in documents] == ["transfer __amount__ to my friend", "send money"]
+    assert documents[0].metadata["utterance"] == "Transfer $100 to my friend"
+    assert "utterance" not in documents[1].metadata
+
+
+def test_utterances_are_indexed_as_is_by_default(write_intents):
+    documents = vector_store.load_intent_data(write_intents([{"intent": "a", "utterances": ["Pay $5 at QMART"]}]))
+
+    assert documents[0].page_content == "Pay $5 at QMART"
+
+
+def test_queries_share_cache_entries_and_responses_show_original_utterances(write_intents, make_classifier, monkeypatch):
+    from rag_app import rag_chain
+
+    monkeypatch.setattr(vector_store, "QUERY_NORMALIZATION", True)
+    monkeypatch.setattr(rag_chain, "QUERY_NORMALIZATION", True)
+    classifier = make_classifier(
+        write_intents([{"intent": "transfer_money", "utterances": ["Transfer $100 to my friend", "send money"]}]),
+        answer="transfer_money",
+    )
+
+    first = classifier.query("Transfer $100 to my friend", 2)
+    second = classifier.query("transfer   $7 to my FRIEND", 2)
+
+    assert first["query"] == "Transfer $100 to my friend"
+    assert second["query"] == "transfer   $7 to my FRIEND"
+    assert second["cache"] == "exact"
+    assert "Transfer $100 to my friend" in [item["utterance"] for item in first["retrieved_utterances"]]
+
+
+def test_placeholders_are_single_tokens_unlike_the_words_they_name():
+    tokens = vector_store.tokenize(normalize_utterance("Loan amount of $5,000 at Walmart for order 12"))
+
+    assert tokens == ["loan", "amount", "of", "__amount__", "at", "__merchant__", "for", "order", "__number__"]
+
+
+def test_masked_amounts_do_not_match_the_word_amount_lexically():
+    index = vector_store.BM25Index(
+        [normalize_utterance("transfer $100 to savings"), "what is the loan amount", "check my balance"]
+    )
+
+    doc_ids, _ = index.search(normalize_utterance("send $20"), 3)
+
+    assert list(doc_ids) == [0]
@@ -0,0 +1,55 @@
+import os
+
+from langchain_core.documents import Document
+
+from rag_app.local_model import LocalEmbeddings
+from rag_app.vector_store import NumpyVectorStore, document_id
+
+
+def _documents(texts: list[str]) -> list[Document]:
+    return [
+        Document(id=document_id("intent", text), page_content=text, metadata={"intent": "intent"})
+        for text in texts
+    ]
+
+
+def _versions(directory) -> list[str]:
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+
+def test_build_publishes_a_new_version(tmp_path):
+    embedding = LocalEmbeddings()
+    before = NumpyVectorStore.build(_documents(["one", "two"]), embedding, str(tmp_path))
+
+    after = NumpyVectorStore.build(_documents(["one", "two", "three"]), embedding, str(tmp_path))
+
+    assert len(NumpyVectorStore.load(str(tmp_path), embedding)) == 3
+    assert len(after) == 3
+    # A store opened on the previous version keeps its own, consistent files
+    assert len(before) == 2 and before._vectors.shape[0] == 2
+    assert (tmp_path / NumpyVectorStore.CURRENT_FILE).read_text() == _versions(tmp_path)[-1]
+
+
+def test_build_keeps_one_superseded_version(tmp_path):
+    embedding = LocalEmbeddings()
+    for texts in (["one"], ["one", "two"], ["one", "two", "three"]):
+        NumpyVectorStore.build(_documents(texts), embedding, str(tmp_path))
+
+    assert len(_versions(tmp_path)) == 1 + NumpyVectorStore.KEEP_VERSIONS
+
+
+def test_build_upgrades_an_unversioned_index(tmp_path):
+    embedding = LocalEmbeddings()
+    NumpyVectorStore.build(_documents(["one", "two"]), embedding, str(tmp_path))
+    version = tmp_path / (tmp_path / NumpyVectorStore.CURRENT_FILE).read_text()
+    for path in version.iterdir():
+        path.rename(tmp_path / path.name)
+    version.rmdir()
+    (tmp_path / NumpyVectorStore.CURRENT_FILE).unlink()
+    assert len(NumpyVectorStore.load(str(tmp_path), embedding)) == 2
+
+    documents = _documents(["one", "two", "three"])
+    store = NumpyVectorStore.build(documents, embedding, str(tmp_path))
+
+    assert store.ids == [doc.id for doc in documents]
+    assert not (tmp_path / NumpyVectorStore.META_FILE).exists()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from rag_app.config import VectorQuantization
+from rag_app.tests.test_numpy_index import _documents
+from rag_app.vector_store import NumpyVectorStore, quantize_vectors
+
+DIM = 256
+_rng = np.random.default_rng(0)
+# 200 intents of 10 utterances each, clustered as dense provider embeddings are
+_centers = _rng.standard_normal((200, DIM)).astype(np.float32)
+VECTORS = np.repeat(_centers, 10, axis=0) + 0.5 * _rng.standard_normal((2000, DIM)).astype(np.float32)
+TEXTS = [f"utterance {i}" for i in range(len(VECTORS))]
+# Paraphrases of the first utterance of 50 intents
+QUERIES = (VECTORS[:500:10] + 0.5 * _rng.standard_normal((50, DIM)).astype(np.float32)).tolist()
+
+
+class FixedEmbeddings(Embeddings):
+    """Dense embeddings looked up by text; LocalEmbeddings are too sparse for meaningful sign bits."""
+
+    def __init__(self):
+        self.vectors = dict(zip(TEXTS, VECTORS.tolist()))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.vectors[text]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore.build(
+        _documents(TEXTS), FixedEmbeddings(), str(tmp_path), quantization=VectorQuantization.BINARY
+    )
+
+
+def test_binary_codes_scan_a_32x_smaller_index(store):
+    stats = store.memory_stats()
+
+    assert stats["documents"] == len(TEXTS)
+    assert stats["float_bytes"] == len(TEXTS) * DIM * 4
+    assert stats["scanned_bytes"] == len(TEXTS) * DIM // 8
+    assert stats["compression"] == 32.0
+    assert store.quantized(VectorQuantization.NONE).memory_stats()["compression"] == 1.0
+
+
+@pytest.mark.parametrize("k", [1, 5, 10])
+def test_binary_search_keeps_recall_at_k(store, k):
+    assert store.quantized(VectorQuantization.NONE).recall_at_k(QUERIES, k) == 1.0
+    assert store.recall_at_k(QUERIES, k) >= 0.95
+
+
+def test_loaded_index_uses_the_stored_codes(store, tmp_path):
+    loaded = NumpyVectorStore.load(str(tmp_path), FixedEmbeddings(), VectorQuantization.BINARY)
+
+    np.testing.assert_array_equal(loaded._codes, quantize_vectors(store._vectors, VectorQuantization.BINARY))
+    assert [[doc.page_content for doc, _ in results] for results in loaded.search_batch(QUERIES[:3], 1)] == [
+        [TEXTS[0]], [TEXTS[10]], [TEXTS[20]]
+    ]
+
+
+def test_only_binary_codes_are_supported(store):
+    with pytest.raises(ValueError):
+        quantize_vectors(store._vectors, VectorQuantization.NONE)
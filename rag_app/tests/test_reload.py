@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from rag_app.config import DEFAULT_DOMAIN
+from rag_app.tests.conftest import INTENTS
+from rag_app.vector_store import BM25Index, load_intent_data
+
+# order_status loses an utterance and transfer_money gains one; check_balance is unchanged
+RELOADED = [
+    INTENTS[0],
+    {**INTENTS[1], "utterances": INTENTS[1]["utterances"] + ["wire cash to my brother"]},
+    {**INTENTS[2], "utterances": INTENTS[2]["utterances"][1:]},
+]
+
+
+def test_reload_swaps_in_a_new_snapshot(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+    before = classifier.snapshots[DEFAULT_DOMAIN]
+
+    change = classifier.reload(load_intent_data(write_intents(RELOADED)))
+
+    after = classifier.snapshots[DEFAULT_DOMAIN]
+    assert [doc.page_content for doc in change.added] == ["wire cash to my brother"]
+    assert [doc.page_content for doc in change.removed] == ["where is my order"]
+    assert change.affected_intents == {"transfer_money", "order_status"}
+    assert after is not before
+    assert after.version == before.version + 1
+    # Requests still holding the old snapshot keep its documents
+    assert len(before.documents) == 9 and len(after.documents) == 9
+    assert "wire cash to my brother" in [doc.page_content for doc in after.documents]
+    assert classifier.query("wire cash to my brother")["retrieved_utterances"][0]["utterance"] == "wire cash to my brother"
+
+
+def test_reload_without_changes_keeps_the_snapshot(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+    before = classifier.snapshots[DEFAULT_DOMAIN]
+
+    change = classifier.reload()
+
+    assert not change
+    assert classifier.snapshots[DEFAULT_DOMAIN] is before
+
+
+def test_reload_invalidates_cached_results_of_affected_intents(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+    classifier.query("what is my balance")
+    classifier.query("track my package")
+
+    classifier.reload(load_intent_data(write_intents(RELOADED)))
+
+    assert classifier.query("what is my balance")["cache"] == "exact"
+    assert classifier.query("track my package")["cache"] == "miss"
+
+
+TEXTS = [
+    "what is my balance",
+    "show my account balance",
+    "transfer money to savings",
+    "send money to my friend",
+    "where is my order",
+    "has my order shipped",
+]
+QUERIES = ["balance", "money to my friend", "where is my order", "order shipped", "refund my card", "where"]
+
+
+@pytest.mark.parametrize(
+    "keep, added",
+    [
+        ([0, 1, 2, 3, 4, 5], ["refund my card"]),
+        ([0, 2, 3, 5], []),
+        ([5, 1, 3], ["refund my card", "where is my refund"]),
+    ],
+)
+def test_bm25_update_matches_a_fresh_build(keep, added):
+    updated = BM25Index(TEXTS).updated(keep, added)
+    fresh = BM25Index([TEXTS[i] for i in keep] + added)
+
+    assert updated.n_docs == fresh.n_docs
+    for (updated_ids, updated_scores), (fresh_ids, fresh_scores) in zip(
+        updated.search_batch(QUERIES, len(TEXTS) + 2), fresh.search_batch(QUERIES, len(TEXTS) + 2)
+    ):
+        np.testing.assert_array_equal(updated_ids, fresh_ids)
+        np.testing.assert_allclose(updated_scores, fresh_scores, rtol=1e-6)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from rag_app import rag_chain
+from rag_app.failover import FailoverLLM, ProvidersUnavailableError
+from rag_app.tests.conftest import INTENTS
+from rag_app.vector_store import HybridRetriever
+
+
+@pytest.fixture
+def fast_path(monkeypatch):
+    """Fast-path thresholds the small test corpus can meet: confident queries skip the LLM."""
+    monkeypatch.setattr(rag_chain, "FAST_PATH_MIN_CONFIDENCE", 0.6)
+    monkeypatch.setattr(rag_chain, "FAST_PATH_MIN_MARGIN", 0.0)
+
+
+@pytest.fixture
+def providers_down(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ProvidersUnavailableError("No LLM provider available (test: down)")
+
+    async def aunavailable(*args, **kwargs):
+        unavailable()
+
+    monkeypatch.setattr(FailoverLLM, "invoke", unavailable)
+    monkeypatch.setattr(FailoverLLM, "ainvoke", aunavailable)
+
+
+def _routing(classifier) -> dict:
+    routing = classifier.stats()["routing"]
+    return {route: routing[route] for route in ("local", "fast_path", "llm", "llm_fallback")}
+
+
+def test_confident_queries_take_the_fast_path(write_intents, make_classifier, fast_path):
+    classifier = make_classifier(write_intents(), answer="check_balance")
+
+    confident = classifier.query("track my package")
+    unsure = classifier.query("what is my balance")
+
+    assert confident["route"] == "fast_path"
+    # The retrieval vote answers, not the LLM
+    assert confident["predicted_intent"] == "order_status"
+    assert unsure["route"] == "llm"
+    assert _routing(classifier) == {"local": 0, "fast_path": 1, "llm": 1, "llm_fallback": 0}
+    assert classifier.stats()["routing"]["llm_offload_rate"] == 0.5
+
+
+def test_fast_path_in_a_batch(write_intents, make_classifier, fast_path):
+    classifier = make_classifier(write_intents())
+
+    results = classifier.query_batch(["track my package", "what is my balance"])
+
+    assert [result["route"] for result in results] == ["fast_path", "llm"]
+    assert _routing(classifier) == {"local": 0, "fast_path": 1, "llm": 1, "llm_fallback": 0}
+
+
+def test_unavailable_llm_is_counted_as_a_fallback_only(write_intents, make_classifier, providers_down):
+    classifier = make_classifier(write_intents())
+
+    result = classifier.query("what is my balance")
+    async_result = asyncio.run(classifier.aquery("show my account balance"))
+    [batch_result] = classifier.query_batch(["how much money do I have"])
+
+    assert [result["route"], async_result["route"], batch_result["route"]] == ["fallback"] * 3
+    assert _routing(classifier) == {"local": 0, "fast_path": 0, "llm": 0, "llm_fallback": 3}
+
+
+def test_failed_classification_is_not_counted(write_intents, make_classifier, providers_down, monkeypatch):
+    # Nothing retrieved, so there is no vote to fall back on
+    monkeypatch.setattr(HybridRetriever, "search", lambda self, query, k=None: [])
+    classifier = make_classifier(write_intents())
+
+    with pytest.raises(ProvidersUnavailableError):
+        classifier.query("what is my balance")
+
+    assert _routing(classifier) == {"local": 0, "fast_path": 0, "llm": 0, "llm_fallback": 0}
+
+
+def test_queries_without_a_domain_are_routed_to_theirs(write_intents, make_classifier):
+    classifier = make_classifier({
+        "banking": write_intents(INTENTS[:2], name="banking.json"),
+        "shopping": write_intents(INTENTS[2:], name="shopping.json"),
+    })
+
+    routed = [classifier.query(text)["domain"] for text in ["track my package", "send money to my friend"]]
+    batch = [result["domain"] for result in classifier.query_batch(["has my order shipped", "what is my balance"])]
+    named = classifier.query("track my package", domain="banking")
+
+    assert routed == ["shopping", "banking"]
+    assert batch == ["shopping", "banking"]
+    assert named["domain"] == "banking"
+    domains = classifier.stats()["domains"]
+    assert domains["banking"]["queries"] == 3 and domains["shopping"]["queries"] == 2
+    assert domains["banking"]["utterances"] == 6 and domains["shopping"]["utterances"] == 3
+
+
+def test_unknown_domain_is_rejected(write_intents, make_classifier):
+    classifier = make_classifier(write_intents())
+
+    with pytest.raises(ValueError, match="Unknown domain"):
+        classifier.query("what is my balance", domain="travel")
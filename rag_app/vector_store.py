@@ -1,12 +1,33 @@
 """Vector store module for loading data and building ChromaDB + BM25 indexes."""
 
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
-from typing import Optional
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
-from langchain.schema import Document
-from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
+import numpy as np
+from scipy import sparse
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 
 from rag_app.config import (
     LLM_PROVIDER,
@@ -14,79 +35,1097 @@ from rag_app.config import (
     CHROMA_PERSIST_DIR,
     CHROMA_COLLECTION_NAME,
     DATA_FILE_PATH,
+    QUERY_NORMALIZATION,
+    INTENT_DOMAINS,
+    DEFAULT_DOMAIN,
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_DIR,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    VECTOR_BACKEND,
+    VectorBackend,
+    NUMPY_INDEX_DIR,
+    VECTOR_QUANTIZATION,
+    VectorQuantization,
+    QUANTIZED_RERANK_MULTIPLIER,
+    INDEX_LOAD_MODE,
+    IndexLoadMode,
     BM25_WEIGHT,
     VECTOR_WEIGHT,
+    FUSION_METHOD,
+    FusionMethod,
+    HYBRID_FETCH_MULTIPLIER,
+    HYBRID_VECTOR_THREADS,
+    PROVIDER_TIMEOUT,
+    PROVIDER_MAX_RETRIES,
+)
+from rag_app.cache import LRUCache, CachedQueryEmbeddings
+from rag_app.failover import GuardedEmbeddings, provider_breaker
+from rag_app.metrics import stage
+from rag_app.normalization import normalize_utterance
+
+# Provider, Chroma and langchain modules are imported where they are used so
+# that importing this module (and starting the API) stays fast
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+logger = logging.getLogger(__name__)
+
+# Max documents per Chroma add/delete call
+_INDEX_BATCH_SIZE = 1000
+
+# Shared by every embedding function created in this process
+query_embedding_cache = LRUCache(
+    max_size=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl_seconds=QUERY_EMBEDDING_CACHE_TTL,
 )
 
 
-def _get_embedding_function():
-    """Return the appropriate embedding function based on the configured provider."""
+def _get_embedding_function() -> CachedQueryEmbeddings:
+    """
+    Return the embedding function for the configured provider.
+
+    Document embeddings are cached on disk under EMBEDDING_CACHE_DIR, keyed by
+    a hash of the text and namespaced by the embedding model, except for local
+    embeddings, which are cheaper to recompute than to read back. Query
+    embeddings are cached in memory in query_embedding_cache. Provider calls
+    go through the provider's "embeddings.<provider>" circuit breaker, and
+    the provider client is created on the first call.
+    """
+    from langchain.embeddings import CacheBackedEmbeddings
+    from langchain.storage import LocalFileStore
+
     if LLM_PROVIDER == LLMProvider.OPENAI:
         from langchain_openai import OpenAIEmbeddings
 
-        return OpenAIEmbeddings(model="text-embedding-3-small")
+        provider = GuardedEmbeddings(
+            lambda: OpenAIEmbeddings(model=EMBEDDING_MODEL, timeout=PROVIDER_TIMEOUT, max_retries=PROVIDER_MAX_RETRIES),
+            provider_breaker("embeddings.openai"),
+        )
+        query_batch_fn = provider.embed_documents
+    elif LLM_PROVIDER == LLMProvider.LOCAL:
+        from rag_app.local_model import LocalEmbeddings
+
+        provider = LocalEmbeddings()
+        return CachedQueryEmbeddings(provider, query_embedding_cache, model=EMBEDDING_MODEL)
     else:
         from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
-        return GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        provider = GuardedEmbeddings(
+            lambda: GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, request_options={"timeout": PROVIDER_TIMEOUT}),
+            provider_breaker("embeddings.gemini"),
+        )
+        # Keep the query task type that embed_query uses
+        query_batch_fn = functools.partial(provider.embed_documents, task_type="RETRIEVAL_QUERY")
+
+    document_embeddings = CacheBackedEmbeddings.from_bytes_store(
+        provider,
+        LocalFileStore(EMBEDDING_CACHE_DIR),
+        namespace=EMBEDDING_MODEL,
+        key_encoder="sha256",
+    )
+    return CachedQueryEmbeddings(
+        document_embeddings,
+        query_embedding_cache,
+        model=EMBEDDING_MODEL,
+        query_batch_fn=query_batch_fn,
+    )
+
+
+@dataclass(frozen=True)
+class Domain:
+    """A named intent corpus: its data file and where its vector index is stored."""
+    name: str
+    data_file: str
+    collection_name: str = CHROMA_COLLECTION_NAME
+    index_dir: str = NUMPY_INDEX_DIR
+
+
+def get_domains() -> list[Domain]:
+    """
+    The configured domains, each indexed separately.
+
+    Without INTENT_DOMAINS there is one domain, DEFAULT_DOMAIN, over
+    DATA_FILE_PATH. Otherwise each domain's Chroma collection and numpy index
+    directory are suffixed with its name, except that DEFAULT_DOMAIN keeps
+    the unsuffixed ones so an existing index stays valid.
+    """
+    if not INTENT_DOMAINS:
+        return [Domain(name=DEFAULT_DOMAIN, data_file=DATA_FILE_PATH)]
+    return [
+        Domain(name=name, data_file=data_file)
+        if name == DEFAULT_DOMAIN
+        else Domain(
+            name=name,
+            data_file=data_file,
+            collection_name=f"{CHROMA_COLLECTION_NAME}_{name}",
+            index_dir=os.path.join(NUMPY_INDEX_DIR, name),
+        )
+        for name, data_file in INTENT_DOMAINS.items()
+    ]
+
+
+def document_id(intent: str, utterance: str) -> str:
+    """Deterministic document ID derived from the intent and utterance text."""
+    return hashlib.sha256(f"{intent}\x1f{utterance}".encode("utf-8")).hexdigest()
 
 
 def load_intent_data(file_path: Optional[str] = None) -> list[Document]:
-    """Load intent-utterance data from a JSON file and return as LangChain Documents."""
+    """
+    Load intent-utterance data from a JSON file and return as LangChain Documents.
+
+    With QUERY_NORMALIZATION, utterances are indexed normalized like queries,
+    with the original text in metadata["utterance"], and utterances that
+    differ only in masked values become one document.
+    """
     path = file_path or DATA_FILE_PATH
     with open(path, "r") as f:
         data = json.load(f)
 
     documents = []
+    seen_ids = set()
     for item in data:
         intent = item["intent"]
-        for utterance in item["utterances"]:
+        for original in item["utterances"]:
+            utterance = normalize_utterance(original) if QUERY_NORMALIZATION else original
+            doc_id = document_id(intent, utterance)
+            if doc_id in seen_ids:
+                continue
+            seen_ids.add(doc_id)
+            metadata = {"intent": intent}
+            if utterance != original:
+                # Shown in responses instead of the normalized text
+                metadata["utterance"] = original
             doc = Document(
+                id=doc_id,
                 page_content=utterance,
-                metadata={"intent": intent},
+                metadata=metadata,
             )
             documents.append(doc)
     return documents
 
 
-def build_chroma_vector_store(documents: list[Document]) -> Chroma:
-    """Build and persist a ChromaDB vector store from documents."""
-    embedding_fn = _get_embedding_function()
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding_fn,
-        persist_directory=CHROMA_PERSIST_DIR,
-        collection_name=CHROMA_COLLECTION_NAME,
-    )
+def corpus_signature(file_path: Optional[str] = None) -> Optional[tuple[int, int]]:
+    """(mtime_ns, size) of the intent data file, or None if it does not exist; changes when the file does."""
+    try:
+        stat = os.stat(file_path or DATA_FILE_PATH)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def domains_signature() -> dict[str, Optional[tuple[int, int]]]:
+    """corpus_signature() of every configured domain's data file, by domain name."""
+    return {domain.name: corpus_signature(domain.data_file) for domain in get_domains()}
+
+
+def sync_vector_store(vector_store: "Chroma", documents: list[Document]) -> tuple[int, int]:
+    """
+    Bring a vector store in line with documents by their IDs.
+
+    Only documents missing from the store are embedded and added; documents
+    whose IDs are no longer present are deleted.
+
+    Returns:
+        The number of (added, deleted) documents.
+    """
+    existing_ids = set(vector_store.get(include=[])["ids"])
+    wanted = {doc.id: doc for doc in documents}
+
+    to_delete = [doc_id for doc_id in existing_ids if doc_id not in wanted]
+    to_add = [doc for doc_id, doc in wanted.items() if doc_id not in existing_ids]
+
+    for i in range(0, len(to_delete), _INDEX_BATCH_SIZE):
+        vector_store.delete(ids=to_delete[i:i + _INDEX_BATCH_SIZE])
+    for i in range(0, len(to_add), _INDEX_BATCH_SIZE):
+        batch = to_add[i:i + _INDEX_BATCH_SIZE]
+        vector_store.add_documents(batch, ids=[doc.id for doc in batch])
+
+    logger.info("Synced vector store: %d added, %d deleted", len(to_add), len(to_delete))
+    return len(to_add), len(to_delete)
+
+
+def build_chroma_vector_store(documents: list[Document], collection_name: str = CHROMA_COLLECTION_NAME) -> "Chroma":
+    """Open the persisted ChromaDB vector store and incrementally sync it with documents."""
+    vector_store = get_chroma_vector_store(collection_name)
+    sync_vector_store(vector_store, documents)
     return vector_store
 
 
-def get_chroma_vector_store() -> Chroma:
+def get_chroma_vector_store(collection_name: str = CHROMA_COLLECTION_NAME) -> "Chroma":
     """Load an existing ChromaDB vector store from disk."""
+    from langchain_chroma import Chroma
+
     embedding_fn = _get_embedding_function()
     vector_store = Chroma(
         persist_directory=CHROMA_PERSIST_DIR,
         embedding_function=embedding_fn,
-        collection_name=CHROMA_COLLECTION_NAME,
+        collection_name=collection_name,
     )
     return vector_store
 
 
+# Values per block of a quantized scan, bounding its temporary arrays
+_SCAN_BLOCK_VALUES = 2 ** 22
+# Smallest k whose candidate count a quantized search uses
+_MIN_RERANK_K = 10
+
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits of each uint64 in a 1-D array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _POPCOUNT[words.view(np.uint8)].reshape(len(words), 8).sum(axis=1, dtype=np.uint8)
+
+
+def _pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of vectors packed into uint64 words, zero-padded to whole words."""
+    packed = np.packbits(vectors > 0, axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def quantize_vectors(vectors: np.ndarray, quantization: VectorQuantization) -> np.ndarray:
+    """
+    Compact codes of unit-normalized vectors for a first-pass scan.
+
+    Binary codes are the sign bits packed into uint64 words and stored
+    word-major, shape (ceil(dim / 64), n), so a scan XORs and counts one
+    contiguous word column at a time.
+    """
+    if quantization != VectorQuantization.BINARY:
+        raise ValueError(f"Unsupported vector quantization: {quantization.value}")
+    block = max(1, _SCAN_BLOCK_VALUES // max(1, vectors.shape[1]))
+    packed = np.concatenate(
+        [_pack_signs(vectors[start:start + block]) for start in range(0, len(vectors), block)]
+    )
+    return np.ascontiguousarray(packed.T)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store over a memory-mapped matrix of unit-normalized embeddings.
+
+    Each build writes a new version subdirectory of the index directory, and
+    the CURRENT file there names the version to open. A version holds:
+        embeddings.npy   float32 (n_docs, dim), rows L2-normalized
+        intents.npy      int32 (n_docs,) codes into the intent name list
+        index.json       embedding model, quantization, intent names, document IDs and texts
+        codes.npy        with binary quantization: sign bits packed into
+                         uint64 (ceil(dim / 64), n_docs)
+
+    Publishing a version is one os.replace of CURRENT, so a reader opens all
+    files of one version, never a mix of two builds. The previous version is
+    kept until the next build for readers that read CURRENT just before it
+    changed; older ones are removed (processes mapping them keep their pages).
+
+    Files are opened with mmap_mode="r", so worker processes loading the same
+    index share its pages through the OS page cache. Exact cosine top-k is one
+    matrix-vector (or matrix-matrix for batches) product plus argpartition.
+
+    With quantization, a search first scans the codes for the best
+    max(k, 10) * rerank_multiplier candidates, then re-ranks only those rows with exact
+    float scores. Searches then read the codes plus a few float rows, so the
+    float matrix can stay on disk.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    INTENTS_FILE = "intents.npy"
+    META_FILE = "index.json"
+    CODES_FILE = "codes.npy"
+    CURRENT_FILE = "CURRENT"
+    # Superseded versions kept besides the current one
+    KEEP_VERSIONS = 1
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        vectors: np.ndarray,
+        intent_codes: np.ndarray,
+        intent_names: list[str],
+        ids: list[str],
+        texts: list[str],
+        codes: Optional[np.ndarray] = None,
+        quantization: VectorQuantization = VectorQuantization.NONE,
+        rerank_multiplier: int = QUANTIZED_RERANK_MULTIPLIER,
+    ):
+        self._embedding = embedding
+        self._vectors = vectors
+        self._intent_codes = intent_codes
+        self.intent_names = intent_names
+        self.ids = ids
+        self.texts = texts
+        self._codes = codes
+        self.quantization = quantization if codes is not None else VectorQuantization.NONE
+        self.rerank_multiplier = max(1, rerank_multiplier)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        embedding: Embeddings,
+        quantization: VectorQuantization = VectorQuantization.NONE,
+    ) -> "NumpyVectorStore":
+        """
+        Open the current version of an index written by build().
+
+        If the index holds no codes for the requested quantization, they are
+        computed in memory; rebuild the index to store them.
+        """
+        directory = cls._current_version(directory)
+        with open(os.path.join(directory, cls.META_FILE), "r") as f:
+            meta = json.load(f)
+        store = cls(
+            embedding=embedding,
+            vectors=np.load(os.path.join(directory, cls.EMBEDDINGS_FILE), mmap_mode="r"),
+            intent_codes=np.load(os.path.join(directory, cls.INTENTS_FILE), mmap_mode="r"),
+            intent_names=meta["intent_names"],
+            ids=meta["ids"],
+            texts=meta["texts"],
+        )
+        if quantization == VectorQuantization.NONE:
+            return store
+        if meta.get("quantization") != quantization.value:
+            logger.warning("Index at %s has no %s codes; quantizing in memory", directory, quantization.value)
+            return store.quantized(quantization)
+
+        store._codes = np.load(os.path.join(directory, cls.CODES_FILE), mmap_mode="r")
+        store.quantization = quantization
+        return store
+
+    def quantized(self, quantization: VectorQuantization) -> "NumpyVectorStore":
+        """This index with codes for quantization computed in memory (or without codes for "none")."""
+        codes = quantize_vectors(self._vectors, quantization) if quantization != VectorQuantization.NONE else None
+        return NumpyVectorStore(
+            embedding=self._embedding,
+            vectors=self._vectors,
+            intent_codes=self._intent_codes,
+            intent_names=self.intent_names,
+            ids=self.ids,
+            texts=self.texts,
+            codes=codes,
+            quantization=quantization,
+            rerank_multiplier=self.rerank_multiplier,
+        )
+
+    def memory_stats(self) -> dict:
+        """Bytes of the float vectors and of the codes a quantized search scans instead."""
+        float_bytes = self._vectors.nbytes
+        code_bytes = self._codes.nbytes if self._codes is not None else float_bytes
+        return {
+            "quantization": self.quantization.value,
+            "documents": len(self),
+            "float_bytes": float_bytes,
+            "scanned_bytes": code_bytes,
+            "compression": round(float_bytes / code_bytes, 2) if code_bytes else 1.0,
+        }
+
+    @classmethod
+    def _current_version(cls, directory: str) -> str:
+        """The directory of the version CURRENT names, or directory itself for an index from before versioning."""
+        try:
+            with open(os.path.join(directory, cls.CURRENT_FILE), "r") as f:
+                return os.path.join(directory, f.read().strip())
+        except FileNotFoundError:
+            return directory
+
+    @classmethod
+    def _publish(cls, directory: str, version: str) -> None:
+        """Point CURRENT at version, then remove superseded versions and files of the unversioned layout."""
+        tmp_path = os.path.join(directory, f".{cls.CURRENT_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(directory, cls.CURRENT_FILE))
+
+        superseded = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith("v") and name != version and os.path.isdir(os.path.join(directory, name))
+        )
+        for name in superseded[:max(len(superseded) - cls.KEEP_VERSIONS, 0)]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        for name in (cls.EMBEDDINGS_FILE, cls.INTENTS_FILE, cls.META_FILE, cls.CODES_FILE):
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def build(
+        cls,
+        documents: list[Document],
+        embedding: Embeddings,
+        directory: str,
+        model: str = "",
+        quantization: VectorQuantization = VectorQuantization.NONE,
+    ) -> "NumpyVectorStore":
+        """
+        Write an index for documents, with codes for quantization, and open it.
+
+        Vectors of documents already in an index at directory (same model) are
+        reused, so only new documents are embedded. The files are written to a
+        new version, which is published once complete, so processes that still
+        map the previous version are unaffected.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        previous: dict[str, np.ndarray] = {}
+        current = cls._current_version(directory)
+        meta_path = os.path.join(current, cls.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                previous_meta = json.load(f)
+            if previous_meta.get("model") == model:
+                old_vectors = np.load(os.path.join(current, cls.EMBEDDINGS_FILE), mmap_mode="r")
+                previous = {doc_id: old_vectors[i] for i, doc_id in enumerate(previous_meta["ids"])}
+
+        missing = [doc for doc in documents if doc.id not in previous]
+        fresh = embedding.embed_documents([doc.page_content for doc in missing]) if missing else []
+        fresh_by_id = dict(zip((doc.id for doc in missing), fresh))
+
+        dim = len(fresh[0]) if fresh else (next(iter(previous.values())).shape[0] if previous else 0)
+        vectors = np.zeros((len(documents), dim), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            vectors[i] = previous[doc.id] if doc.id in previous else fresh_by_id[doc.id]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        intent_names = sorted({doc.metadata["intent"] for doc in documents})
+        intent_lookup = {name: code for code, name in enumerate(intent_names)}
+        intent_codes = np.array(
+            [intent_lookup[doc.metadata["intent"]] for doc in documents], dtype=np.int32
+        )
+
+        # Versions sort by creation time; the random suffix keeps concurrent builds apart
+        version_dir = tempfile.mkdtemp(prefix=f"v{time.time_ns()}-", dir=directory)
+
+        def write(name: str, save) -> None:
+            with open(os.path.join(version_dir, name), "wb") as f:
+                save(f)
+
+        write(cls.EMBEDDINGS_FILE, lambda f: np.save(f, vectors))
+        write(cls.INTENTS_FILE, lambda f: np.save(f, intent_codes))
+        if quantization != VectorQuantization.NONE:
+            codes = quantize_vectors(vectors, quantization)
+            write(cls.CODES_FILE, lambda f: np.save(f, codes))
+        write(cls.META_FILE, lambda f: f.write(json.dumps({
+            "model": model,
+            "quantization": quantization.value,
+            "intent_names": intent_names,
+            "ids": [doc.id for doc in documents],
+            "texts": [doc.page_content for doc in documents],
+        }).encode("utf-8")))
+        cls._publish(directory, os.path.basename(version_dir))
+
+        logger.info("Built numpy vector index: %d documents, %d embedded", len(documents), len(missing))
+        store = cls.load(directory, embedding, quantization)
+        if quantization != VectorQuantization.NONE:
+            memory = store.memory_stats()
+            logger.info(
+                "Quantized vector index (%s): scans %.1f MB instead of %.1f MB (%.1fx smaller)",
+                quantization.value, memory["scanned_bytes"] / 2 ** 20, memory["float_bytes"] / 2 ** 20,
+                memory["compression"],
+            )
+        return store
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        directory: str = NUMPY_INDEX_DIR,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [
+            Document(
+                id=ids[i] if ids else document_id(metadata.get("intent", ""), text),
+                page_content=text,
+                metadata=metadata,
+            )
+            for i, (text, metadata) in enumerate(zip(texts, metadatas))
+        ]
+        return cls.build(documents, embedding, directory, **kwargs)
+
+    def _document(self, row: int) -> Document:
+        return Document(
+            id=self.ids[row],
+            page_content=self.texts[row],
+            metadata={"intent": self.intent_names[self._intent_codes[row]]},
+        )
+
+    def _top_k(
+        self, scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None
+    ) -> list[tuple[Document, float]]:
+        """Top-k (Document, score) by scores, which are of all rows or of the given rows."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        doc_rows = top if rows is None else rows[top]
+        return [(self._document(int(row)), float(score)) for row, score in zip(doc_rows, scores[top])]
+
+    def _code_scores(self, queries: np.ndarray, rows: slice) -> np.ndarray:
+        """Negated Hamming distances between the packed sign bits of queries and of rows; higher is closer."""
+        codes = self._codes[:, rows]
+        scores = np.zeros((len(queries), codes.shape[1]), dtype=np.float32)
+        for query, row_scores in zip(queries, scores):
+            for word, bits in zip(codes, query):
+                row_scores -= _popcount(np.bitwise_xor(word, bits))
+        return scores
+
+    def _candidates(self, queries: np.ndarray, n: int) -> np.ndarray:
+        """Rows of the n best code scores for each query, shape (n_queries, n)."""
+        encoded = _pack_signs(queries)
+        block = max(n, _SCAN_BLOCK_VALUES // self._codes.shape[0])
+        best_rows, best_scores = [], []
+        for start in range(0, len(self), block):
+            scores = self._code_scores(encoded, slice(start, start + block))
+            keep = min(n, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_rows.append(top + start)
+            best_scores.append(np.take_along_axis(scores, top, axis=1))
+
+        rows, scores = np.concatenate(best_rows, axis=1), np.concatenate(best_scores, axis=1)
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        return np.take_along_axis(rows, top, axis=1)
+
+    def _normalize(self, embeddings: Iterable[list[float]]) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4
+    ) -> list[tuple[Document, float]]:
+        """Top-k documents by cosine similarity to embedding."""
+        return self.search_batch([embedding], k)[0]
+
+    def search_batch(
+        self, embeddings: list[list[float]], k: int = 4, exact: bool = False
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Top-k (Document, cosine similarity) per query embedding.
+
+        Without quantization (or with exact) this is one matrix product over
+        the float vectors; otherwise the quantized candidates are re-ranked.
+        """
+        if len(self) == 0:
+            return [[] for _ in embeddings]
+        queries = self._normalize(embeddings)
+        # Small k still re-ranks a useful number of candidates
+        n = min(len(self), max(k, _MIN_RERANK_K) * self.rerank_multiplier)
+        if exact or self._codes is None or n >= len(self):
+            return [self._top_k(row, k) for row in queries @ self._vectors.T]
+
+        results = []
+        for query, rows in zip(queries, self._candidates(queries, n)):
+            # Ascending rows read the memory-mapped float matrix in order
+            rows = np.sort(rows)
+            results.append(self._top_k(self._vectors[rows] @ query, k, rows))
+        return results
+
+    def recall_at_k(self, embeddings: list[list[float]], k: int) -> float:
+        """Share of the exact top-k documents that search_batch() also returns, averaged over embeddings."""
+        if not embeddings or len(self) == 0:
+            return 1.0
+        found = self.search_batch(embeddings, k)
+        expected = self.search_batch(embeddings, k, exact=True)
+        hits = sum(
+            len({doc.id for doc, _ in approx} & {doc.id for doc, _ in truth}) / len(truth)
+            for approx, truth in zip(found, expected)
+        )
+        return hits / len(embeddings)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+
+def build_vector_store(documents: list[Document], domain: Optional[Domain] = None) -> VectorStore:
+    """Build or incrementally sync the vector store selected by VECTOR_BACKEND, for domain's index."""
+    domain = domain or Domain(name=DEFAULT_DOMAIN, data_file=DATA_FILE_PATH)
+    if VECTOR_BACKEND == VectorBackend.NUMPY:
+        return NumpyVectorStore.build(
+            documents, _get_embedding_function(), domain.index_dir, model=EMBEDDING_MODEL,
+            quantization=VECTOR_QUANTIZATION,
+        )
+    return build_chroma_vector_store(documents, domain.collection_name)
+
+
+def get_vector_store(domain: Optional[Domain] = None) -> VectorStore:
+    """Load the existing vector store selected by VECTOR_BACKEND for domain's index from disk."""
+    domain = domain or Domain(name=DEFAULT_DOMAIN, data_file=DATA_FILE_PATH)
+    if VECTOR_BACKEND == VectorBackend.NUMPY:
+        return NumpyVectorStore.load(domain.index_dir, _get_embedding_function(), VECTOR_QUANTIZATION)
+    return get_chroma_vector_store(domain.collection_name)
+
+
+def load_or_build_vector_store(documents: list[Document], domain: Optional[Domain] = None) -> VectorStore:
+    """
+    Open the vector store as selected by INDEX_LOAD_MODE.
+
+    In "load" mode an existing index is opened as-is, without syncing it
+    against documents or making embedding calls. If there is no usable
+    index, or in "sync" mode, it is built or synced with build_vector_store().
+    """
+    if INDEX_LOAD_MODE == IndexLoadMode.LOAD:
+        try:
+            vector_store = get_vector_store(domain)
+            if _vector_store_size(vector_store) > 0:
+                logger.info("Loaded existing vector index without syncing")
+                return vector_store
+        except FileNotFoundError:
+            pass
+        logger.warning("No existing vector index found; building one")
+
+    return build_vector_store(documents, domain)
+
+
+def _vector_store_size(vector_store: VectorStore) -> int:
+    if isinstance(vector_store, NumpyVectorStore):
+        return len(vector_store)
+    return vector_store._collection.count()
+
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Case-fold text and split it into word tokens, dropping punctuation."""
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+class BM25Index:
+    """
+    BM25 index over a precomputed sparse term-document weight matrix.
+
+    Per-term BM25 weights are computed once at build time, so scoring a query
+    is a single sparse matrix product that only touches the posting lists of
+    the query's terms. Scores follow rank_bm25's BM25Okapi, which this index
+    replaced: a term in more than half the documents gets epsilon times the
+    average IDF instead of a negative IDF.
+    """
+
+    def __init__(self, texts: list[str], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        vocabulary: dict[str, int] = {}
+        counts = self._count_terms(texts, vocabulary)
+        self._build(counts, vocabulary, k1, b, epsilon)
+
+    @staticmethod
+    def _count_terms(texts: list[str], vocabulary: dict[str, int]) -> sparse.csr_matrix:
+        """Document-term count matrix of texts, adding new terms to vocabulary."""
+        indptr = [0]
+        indices: list[int] = []
+        counts: list[int] = []
+
+        for text in texts:
+            for term, count in Counter(tokenize(text)).items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (
+                np.asarray(counts, dtype=np.float32),
+                np.asarray(indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(texts), max(len(vocabulary), 1)),
+        )
+
+    def _build(
+        self, counts: sparse.csr_matrix, vocabulary: dict[str, int], k1: float, b: float, epsilon: float
+    ) -> None:
+        n_docs = counts.shape[0]
+        n_terms = counts.shape[1]
+        indptr_arr = counts.indptr.astype(np.int64)
+        indices_arr = counts.indices
+        tf = counts.data
+
+        # Row sums, so documents without tokens (anywhere in the corpus) have length 0
+        doc_lengths = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        avg_length = float(doc_lengths.mean()) if n_docs and doc_lengths.mean() > 0 else 1.0
+
+        doc_freq = np.bincount(indices_arr, minlength=n_terms)
+        idf = np.log(n_docs - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+        # Terms left in the vocabulary by updated() but in no document do not count
+        present = doc_freq > 0
+        average_idf = float(idf[present].mean()) if present.any() else 0.0
+        idf = np.where(idf < 0, epsilon * average_idf, idf).astype(np.float32)
+
+        row_lengths = np.repeat(doc_lengths, np.diff(indptr_arr)).astype(np.float32)
+        weights = idf[indices_arr] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * row_lengths / avg_length))
+
+        doc_term = sparse.csr_matrix(
+            (weights, indices_arr, indptr_arr), shape=(n_docs, n_terms), dtype=np.float32
+        )
+        # Term-major layout: row t holds the posting list of term t
+        self._term_doc = doc_term.T.tocsr()
+        # Raw counts, kept so updated() only has to tokenize new documents
+        self._counts = counts
+        self.vocabulary = vocabulary
+        self.n_docs = n_docs
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+    def updated(self, keep: list[int], added_texts: list[str]) -> "BM25Index":
+        """
+        A new index over the documents at positions keep, in that order,
+        followed by added_texts.
+
+        Only added_texts are tokenized; the kept documents' term counts are
+        reused and the corpus statistics (IDF, average length) recomputed.
+        This index is left unchanged.
+        """
+        vocabulary = dict(self.vocabulary)
+        added = self._count_terms(added_texts, vocabulary)
+        kept = self._counts[np.asarray(keep, dtype=np.int64)]
+
+        n_terms = max(len(vocabulary), 1)
+        kept.resize((kept.shape[0], n_terms))
+        added.resize((added.shape[0], n_terms))
+
+        index = BM25Index.__new__(BM25Index)
+        index._build(sparse.vstack([kept, added], format="csr"), vocabulary, self.k1, self.b, self.epsilon)
+        return index
+
+    def _query_matrix(self, queries: list[str]) -> sparse.csr_matrix:
+        indptr = [0]
+        indices: list[int] = []
+        counts: list[int] = []
+        for query in queries:
+            for term, count in Counter(tokenize(query)).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is not None:
+                    indices.append(term_id)
+                    counts.append(count)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), indices, indptr),
+            shape=(len(queries), self._term_doc.shape[0]),
+        )
+
+    def search_batch(
+        self, queries: list[str], k: int
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Score a batch of queries and return the top-k per query.
+
+        Returns:
+            One (doc_indices, scores) pair per query, ordered by descending
+            score. Documents sharing no term with the query are not returned.
+        """
+        scores = self._query_matrix(queries) @ self._term_doc
+
+        results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            doc_ids = scores.indices[start:end]
+            row_scores = scores.data[start:end]
+
+            if len(row_scores) > k:
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                doc_ids, row_scores = doc_ids[top], row_scores[top]
+
+            # Descending score, ties broken by corpus order
+            order = np.lexsort((doc_ids, -row_scores))
+            results.append((doc_ids[order], row_scores[order]))
+        return results
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score a single query and return its top-k (doc_indices, scores)."""
+        return self.search_batch([query], k)[0]
+
+
+class SparseBM25Retriever(BaseRetriever):
+    """LangChain retriever over a BM25Index; scores are set in metadata['bm25_score']."""
+
+    index: BM25Index
+    documents: list[Document]
+    k: int = 4
+
+    @classmethod
+    def from_documents(cls, documents: list[Document], k: int = 4) -> "SparseBM25Retriever":
+        index = BM25Index([doc.page_content for doc in documents])
+        return cls(index=index, documents=documents, k=k)
+
+    def updated(self, keep: list[int], added: list[Document]) -> "SparseBM25Retriever":
+        """A new retriever over documents[keep] followed by added; see BM25Index.updated()."""
+        return SparseBM25Retriever(
+            index=self.index.updated(keep, [doc.page_content for doc in added]),
+            documents=[self.documents[i] for i in keep] + added,
+            k=self.k,
+        )
+
+    def search_with_scores(self, query: str, k: Optional[int] = None) -> list[tuple[Document, float]]:
+        doc_ids, scores = self.index.search(query, k or self.k)
+        return [(self.documents[i], float(score)) for i, score in zip(doc_ids, scores)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "bm25_score": score},
+            )
+            for doc, score in self.search_with_scores(query)
+        ]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        # Scoring is a sub-millisecond in-memory product; no need for an executor
+        return self._get_relevant_documents(query, run_manager=run_manager.get_sync())
+
+
+def build_bm25_retriever(documents: list[Document], top_k: int = 1) -> SparseBM25Retriever:
+    """Tokenize and index documents for BM25 keyword search."""
+    return SparseBM25Retriever.from_documents(documents, k=top_k)
+
+
+def _vector_search_with_scores(
+    vector_store: VectorStore, embedding: list[float], k: int
+) -> list[tuple[Document, float]]:
+    """Vector search by embedding, returning (document, relevance) with higher = more similar."""
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.similarity_search_with_score_by_vector(embedding, k)
+
+    # Chroma returns distances; convert them with the collection's relevance function
+    relevance = vector_store._select_relevance_score_fn()
+    return [
+        (doc, relevance(distance))
+        for doc, distance in vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+    ]
+
+
+def fuse_results(
+    result_lists: list[list[tuple[Document, float]]],
+    weights: list[float],
+    method: FusionMethod = FusionMethod.RRF,
+    c: int = 60,
+) -> list[tuple[Document, float]]:
+    """
+    Fuse ranked (document, score) lists into one list sorted by fused score.
+
+    Documents are deduplicated by page_content. With RRF each list contributes
+    weight / (rank + c), which matches EnsembleRetriever. With SCORE each
+    list's scores are min-max normalized to [0, 1] and contribute
+    weight * normalized score; a list with a single distinct score counts as 1.
+    """
+    fused: dict[str, float] = defaultdict(float)
+    unique_docs: dict[str, Document] = {}
+
+    for results, weight in zip(result_lists, weights):
+        if method == FusionMethod.SCORE and results:
+            scores = [score for _, score in results]
+            low, high = min(scores), max(scores)
+            span = high - low
+
+        for rank, (doc, score) in enumerate(results, start=1):
+            if method == FusionMethod.RRF:
+                contribution = weight / (rank + c)
+            else:
+                contribution = weight * ((score - low) / span if span > 0 else 1.0)
+            fused[doc.page_content] += contribution
+            unique_docs.setdefault(doc.page_content, doc)
+
+    ranked = sorted(unique_docs.values(), key=lambda doc: fused[doc.page_content], reverse=True)
+    return [(doc, fused[doc.page_content]) for doc in ranked]
+
+
+# Runs the vector leg while the calling thread scores BM25
+_vector_leg_executor = ThreadPoolExecutor(max_workers=HYBRID_VECTOR_THREADS, thread_name_prefix="vector-leg")
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Hybrid BM25 + vector retriever with scored fusion.
+
+    The two legs run concurrently, so latency is the slower leg rather than
+    the sum. Each leg fetches ceil(k * fetch_multiplier) results, the lists
+    are fused with RRF or normalized-score fusion, and exactly k documents
+    are returned with their fused scores.
+    """
+
+    bm25_retriever: SparseBM25Retriever
+    vector_store: VectorStore
+    weights: list[float] = [BM25_WEIGHT, VECTOR_WEIGHT]
+    fusion: FusionMethod = FUSION_METHOD
+    fetch_multiplier: float = HYBRID_FETCH_MULTIPLIER
+    c: int = 60
+    k: int = 4
+
+    def _fetch_k(self, k: int) -> int:
+        return max(k, math.ceil(k * self.fetch_multiplier))
+
+    def _fuse(
+        self,
+        lexical: list[tuple[Document, float]],
+        vector: list[tuple[Document, float]],
+        k: int,
+    ) -> list[tuple[Document, float]]:
+        return fuse_results([lexical, vector], self.weights, self.fusion, self.c)[:k]
+
+    def search(self, query: str, k: Optional[int] = None) -> list[tuple[Document, float]]:
+        """Top-k (document, fused score) for query."""
+        k = k or self.k
+        fetch_k = self._fetch_k(k)
+        embeddings = self.vector_store.embeddings
+
+        def vector_leg():
+            with stage("embed"):
+                embedding = embeddings.embed_query(query)
+            with stage("vector"):
+                return _vector_search_with_scores(self.vector_store, embedding, fetch_k)
+
+        # Run in a copy of this context so the leg's timings reach the current request
+        vector_future = _vector_leg_executor.submit(contextvars.copy_context().run, vector_leg)
+        with stage("bm25"):
+            lexical = self.bm25_retriever.search_with_scores(query, fetch_k)
+        vector = vector_future.result()
+        with stage("fusion"):
+            return self._fuse(lexical, vector, k)
+
+    def search_lexical(self, query: str, k: Optional[int] = None) -> list[tuple[Document, float]]:
+        """search() with the BM25 leg only, for when the query cannot be embedded."""
+        k = k or self.k
+        with stage("bm25"):
+            lexical = self.bm25_retriever.search_with_scores(query, self._fetch_k(k))
+        with stage("fusion"):
+            return self._fuse(lexical, [], k)
+
+    async def asearch(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        query_embedding: Optional[list[float]] = None,
+    ) -> list[tuple[Document, float]]:
+        """Async search(); the query embedding is awaited unless one is passed in."""
+        k = k or self.k
+        fetch_k = self._fetch_k(k)
+        loop = asyncio.get_running_loop()
+
+        def vector_search(embedding: list[float]) -> list[tuple[Document, float]]:
+            with stage("vector"):
+                return _vector_search_with_scores(self.vector_store, embedding, fetch_k)
+
+        async def vector_leg():
+            embedding = query_embedding
+            if embedding is None:
+                with stage("embed"):
+                    embedding = await self.vector_store.embeddings.aembed_query(query)
+            return await loop.run_in_executor(
+                _vector_leg_executor, contextvars.copy_context().run, vector_search, embedding
+            )
+
+        vector_task = asyncio.ensure_future(vector_leg())
+        with stage("bm25"):
+            lexical = self.bm25_retriever.search_with_scores(query, fetch_k)
+        vector = await vector_task
+        with stage("fusion"):
+            return self._fuse(lexical, vector, k)
+
+    def search_batch(
+        self,
+        queries: list[str],
+        query_embeddings: Optional[list[list[float]]],
+        k: Optional[int] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        search() for many queries with precomputed query embeddings.
+
+        All queries are scored lexically in one sparse product; vector search
+        uses the given embeddings, so no embedding calls are made here. With
+        query_embeddings=None only the BM25 leg runs, as in search_lexical().
+        """
+        k = k or self.k
+        fetch_k = self._fetch_k(k)
+
+        def vector_leg():
+            if query_embeddings is None:
+                return [[] for _ in queries]
+            with stage("vector"):
+                if isinstance(self.vector_store, NumpyVectorStore):
+                    return self.vector_store.search_batch(query_embeddings, fetch_k)
+                return [
+                    _vector_search_with_scores(self.vector_store, embedding, fetch_k)
+                    for embedding in query_embeddings
+                ]
+
+        vector_future = _vector_leg_executor.submit(contextvars.copy_context().run, vector_leg)
+
+        documents = self.bm25_retriever.documents
+        with stage("bm25"):
+            lexical_results = [
+                [(documents[i], float(score)) for i, score in zip(doc_ids, scores)]
+                for doc_ids, scores in self.bm25_retriever.index.search_batch(queries, fetch_k)
+            ]
+        vector_results = vector_future.result()
+        with stage("fusion"):
+            return [
+                self._fuse(lexical, vector, k)
+                for lexical, vector in zip(lexical_results, vector_results)
+            ]
+
+    @staticmethod
+    def _with_scores(results: list[tuple[Document, float]]) -> list[Document]:
+        return [
+            Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+            for doc, score in results
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self._with_scores(self.search(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self._with_scores(await self.asearch(query))
+
+
 def build_hybrid_retriever(
     documents: list[Document],
-    vector_store: Chroma,
+    vector_store: VectorStore,
     top_k: int = 1,
-) -> EnsembleRetriever:
-    """Build a hybrid retriever combining BM25 and vector search."""
-    bm25_retriever = BM25Retriever.from_documents(documents, k=top_k)
+    bm25_retriever: Optional[SparseBM25Retriever] = None,
+) -> HybridRetriever:
+    """
+    Build a hybrid retriever combining BM25 and vector search.
 
-    vector_retriever = vector_store.as_retriever(
-        search_kwargs={"k": top_k},
-    )
+    If an existing BM25 retriever is passed, its index is shared instead of
+    re-tokenizing the corpus.
+    """
+    if bm25_retriever is None:
+        bm25_retriever = build_bm25_retriever(documents, top_k=top_k)
 
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[bm25_retriever, vector_retriever],
-        weights=[BM25_WEIGHT, VECTOR_WEIGHT],
+    return HybridRetriever(
+        bm25_retriever=bm25_retriever,
+        vector_store=vector_store,
+        k=top_k,
     )
-
-    return ensemble_retriever